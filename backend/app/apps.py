@@ -10,4 +10,6 @@ class AppConfig(AppConfig):
     def ready(self):
         # Importing the signals module from the app. This is typically where signal handlers are connected.
         # By doing this here, we ensure that our signal handlers are connected when the app is ready.
-        import app.signals
\ No newline at end of file
+        import app.signals
+        # Importing the db module connects the handler that configures new database connections.
+        import app.db
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""
+Moving past slots and their bookings out of the hot tables.
+
+Slots that ended more than ARCHIVE['RETENTION_DAYS'] ago are copied, with
+every booking pointing at them, into ArchivedSlot and ArchivedBooking under
+their original primary keys, then deleted from Slot and Booking. A slot and
+its bookings always move in the same transaction, so neither side of the
+foreign key is ever left dangling. Bookings without a slot have no date to
+age by and stay where they are.
+
+DailyAvailability rows are left alone, so availabilityCalendar still shows
+archived days as they were.
+"""
+import datetime
+import itertools
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedBooking, ArchivedSlot, Booking, Slot
+
+DEFAULTS = {
+    # Slots that ended more than this many days ago are archived
+    'RETENTION_DAYS': 365,
+    # Slots moved per transaction, bookings included
+    'BATCH_SIZE': 500,
+}
+
+
+def archive_options():
+    return {**DEFAULTS, **getattr(settings, 'ARCHIVE', {})}
+
+
+@dataclass
+class ArchiveResult:
+    slots: int = 0
+    bookings: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return (self.slots + self.bookings) / self.elapsed if self.elapsed else 0.0
+
+
+def archive_cutoff(retention_days=None, now=None):
+    """The end time before which slots are archived."""
+    if retention_days is None:
+        retention_days = archive_options()['RETENTION_DAYS']
+    return (now or timezone.now()) - datetime.timedelta(days=retention_days)
+
+
+def archive_slots(cutoff=None, batch_size=None):
+    """
+    Archive every slot that ended before ``cutoff``, with its bookings.
+
+    The candidates' keys come from one streaming cursor in primary key
+    order, so memory stays flat however much history there is, and each
+    ``batch_size`` of them is moved in its own short transaction, so live
+    bookings are never blocked for long.
+    """
+    cutoff = cutoff or archive_cutoff()
+    batch_size = batch_size or archive_options()['BATCH_SIZE']
+    result = ArchiveResult()
+    started = time.perf_counter()
+
+    pks = Slot.objects.filter(end_time__lt=cutoff).order_by('pk').values_list('pk', flat=True).iterator(
+        chunk_size=batch_size
+    )
+    while batch := list(itertools.islice(pks, batch_size)):
+        slots, bookings = _archive_batch(batch, cutoff)
+        result.slots += slots
+        result.bookings += bookings
+
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def _archive_batch(slot_pks, cutoff):
+    archived_at = timezone.now()
+    with transaction.atomic():
+        # Read again inside the transaction, locked, in case a slot was moved since the cursor saw it
+        slots = list(Slot.objects.select_for_update().filter(pk__in=slot_pks, end_time__lt=cutoff))
+        bookings = list(Booking.objects.filter(slot__in=slots))
+
+        ArchivedSlot.objects.bulk_create([_copy(slot, ArchivedSlot, archived_at) for slot in slots])
+        ArchivedBooking.objects.bulk_create([_copy(booking, ArchivedBooking, archived_at) for booking in bookings])
+
+        # Raw deletes skip the delete signals: archiving is not a cancellation
+        # that booking subscribers, the availability cache or the daily counts
+        # should hear about. Bookings go first, so no SET_NULL is needed.
+        Booking.objects.filter(pk__in=[booking.pk for booking in bookings])._raw_delete(Booking.objects.db)
+        Slot.objects.filter(pk__in=[slot.pk for slot in slots])._raw_delete(Slot.objects.db)
+    return len(slots), len(bookings)
+
+
+def _copy(instance, archive_model, archived_at):
+    values = {field.attname: getattr(instance, field.attname)
+              for field in archive_model._meta.concrete_fields if field.attname != 'archived_at'}
+    return archive_model(archived_at=archived_at, **values)
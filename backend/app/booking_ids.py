@@ -0,0 +1,206 @@
+"""
+Booking ID generators.
+
+The default SnowflakeIdGenerator issues ``BK-`` followed by 13 Crockford
+base32 characters encoding a 64-bit value::
+
+    41 bits  milliseconds since ID_EPOCH
+     5 bits  host id (BOOKING_IDS['HOST_ID'])
+     5 bits  process slot on that host
+    12 bits  sequence within the millisecond
+
+plus a leading format bit. IDs from one process are strictly increasing,
+and IDs from different processes differ in the node (host and process
+slot) bits, so they cannot collide and inserts need no retry loop.
+Process slots are leased by holding an exclusive lock on a file per slot,
+which the OS releases when the process exits; each host or container
+sharing the database needs its own HOST_ID.
+
+Existing ``BK-YYMMDDHHmm-xxxx`` IDs stay valid and are never rewritten,
+since customers already hold them. They cannot collide with new IDs, which
+have no second hyphen, and because the format bit makes new IDs start with
+a letter they sort after every BK-YYMMDDHHmm-xxxx ID, keeping the unique
+index in time order across the switch. LegacyIdGenerator restores the old
+scheme.
+"""
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+DEFAULTS = {
+    'GENERATOR': 'app.booking_ids.SnowflakeIdGenerator',
+    'HOST_ID': 0,
+    # Fixed node id (host and process bits together); None leases a process slot
+    'NODE_ID': None,
+    # Directory for the process slot lock files; None is the system temp directory
+    'LOCK_DIR': None,
+}
+
+PREFIX = 'BK-'
+ID_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+TIMESTAMP_BITS = 41
+HOST_BITS = 5
+PROCESS_BITS = 5
+SEQUENCE_BITS = 12
+NODE_BITS = HOST_BITS + PROCESS_BITS
+
+MAX_HOST_ID = (1 << HOST_BITS) - 1
+MAX_NODE_ID = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+FORMAT_BIT = 1 << (TIMESTAMP_BITS + NODE_BITS + SEQUENCE_BITS + 1)
+
+ENCODED_LENGTH = 13
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+# Every two-character string, indexed by the 10 bits it encodes
+PAIRS = [high + low for high in ALPHABET for low in ALPHABET]
+
+
+def encode(value):
+    # 65 bits: one leading character, then six pairs
+    return (ALPHABET[value >> 60] + PAIRS[value >> 50 & 1023] + PAIRS[value >> 40 & 1023]
+            + PAIRS[value >> 30 & 1023] + PAIRS[value >> 20 & 1023] + PAIRS[value >> 10 & 1023]
+            + PAIRS[value & 1023])
+
+
+def decode(encoded):
+    value = 0
+    for char in encoded:
+        value = (value << 5) | ALPHABET.index(char)
+    return value
+
+
+def parse_booking_id(booking_id):
+    """
+    Split a generated booking ID into ``(created, node_id, sequence)``.
+
+    Returns None for legacy and other IDs not produced by SnowflakeIdGenerator.
+    """
+    encoded = booking_id[len(PREFIX):]
+    if (not booking_id.startswith(PREFIX) or len(encoded) != ENCODED_LENGTH
+            or any(char not in ALPHABET for char in encoded)):
+        return None
+    value = decode(encoded)
+    if not value & FORMAT_BIT:
+        return None
+    value &= FORMAT_BIT - 1
+    millis = value >> (NODE_BITS + SEQUENCE_BITS)
+    created = datetime.fromtimestamp(ID_EPOCH.timestamp() + millis / 1000, timezone.utc)
+    return created, (value >> SEQUENCE_BITS) & MAX_NODE_ID, value & MAX_SEQUENCE
+
+
+class SnowflakeIdGenerator:
+    """
+    Time-ordered booking IDs that are unique across threads and processes.
+
+    When more than 4096 IDs are asked for within one millisecond, or the
+    clock steps backwards, the generator carries on from the last timestamp
+    it used instead of waiting, so it never blocks and never repeats.
+    """
+
+    def __init__(self, host_id=DEFAULTS['HOST_ID'], node_id=DEFAULTS['NODE_ID'], lock_dir=DEFAULTS['LOCK_DIR'],
+                 clock=time.time):
+        if not 0 <= host_id <= MAX_HOST_ID:
+            raise ImproperlyConfigured(f"BOOKING_IDS['HOST_ID'] must be between 0 and {MAX_HOST_ID}.")
+        if node_id is not None and not 0 <= node_id <= MAX_NODE_ID:
+            raise ImproperlyConfigured(f"BOOKING_IDS['NODE_ID'] must be between 0 and {MAX_NODE_ID}.")
+        self.host_id = host_id
+        self.fixed_node_id = node_id
+        self.lock_dir = lock_dir
+        self.clock = clock
+        self._epoch_millis = int(ID_EPOCH.timestamp() * 1000)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._node_id = None
+        self._node_lock_file = None
+        self._last_millis = -1
+        self._sequence = 0
+
+    @property
+    def node_id(self):
+        with self._lock:
+            return self._current_node_id()
+
+    def __call__(self):
+        with self._lock:
+            node_id = self._current_node_id()
+            millis = int(self.clock() * 1000) - self._epoch_millis
+            if millis > self._last_millis:
+                self._last_millis, self._sequence = millis, 0
+            elif self._sequence < MAX_SEQUENCE:
+                self._sequence += 1
+            else:
+                self._last_millis, self._sequence = self._last_millis + 1, 0
+            value = (FORMAT_BIT | self._last_millis << (NODE_BITS + SEQUENCE_BITS)
+                     | node_id << SEQUENCE_BITS | self._sequence)
+        return PREFIX + encode(value)
+
+    def _current_node_id(self):
+        # A forked child inherits the parent's node id and lock, so it leases its own
+        if self._pid != os.getpid():
+            self._node_id = self.fixed_node_id if self.fixed_node_id is not None else self._lease_process_slot()
+            self._pid = os.getpid()
+            self._last_millis, self._sequence = -1, 0
+        return self._node_id
+
+    def _lease_process_slot(self):
+        try:
+            import fcntl
+        except ImportError:
+            raise ImproperlyConfigured("Set BOOKING_IDS['NODE_ID'] on platforms without fcntl.")
+
+        lock_dir = self.lock_dir or tempfile.gettempdir()
+        for process_slot in range(1 << PROCESS_BITS):
+            node_id = self.host_id << PROCESS_BITS | process_slot
+            lock_file = open(os.path.join(lock_dir, f'booking-id-node-{node_id}.lock'), 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                continue
+            # Held for the life of the process; the OS releases it on exit
+            self._node_lock_file = lock_file
+            return node_id
+        raise ImproperlyConfigured(
+            f'All {1 << PROCESS_BITS} booking ID process slots for host {self.host_id} are in use; '
+            f"give some processes a different BOOKING_IDS['HOST_ID']."
+        )
+
+
+class LegacyIdGenerator:
+    """The original ``BK-YYMMDDHHmm-xxxx`` scheme: minute timestamp plus 16 random bits."""
+
+    def __init__(self, **options):
+        pass
+
+    def __call__(self):
+        return f"{PREFIX}{datetime.now().strftime('%y%m%d%H%M')}-{str(uuid.uuid4())[-4:]}"
+
+
+_booking_id_generator = None
+
+
+def get_booking_id_generator():
+    global _booking_id_generator
+    if _booking_id_generator is None:
+        options = {**DEFAULTS, **getattr(settings, 'BOOKING_IDS', {})}
+        _booking_id_generator = import_string(options['GENERATOR'])(
+            host_id=options['HOST_ID'], node_id=options['NODE_ID'], lock_dir=options['LOCK_DIR']
+        )
+    return _booking_id_generator
+
+
+@receiver(setting_changed)
+def reset_booking_id_generator(setting, **kwargs):
+    global _booking_id_generator
+    if setting == 'BOOKING_IDS':
+        _booking_id_generator = None
@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+
+DEFAULTS = {
+    'MAX_ENTRIES': 256,
+    'TIMEOUT': 300,
+    # Alias from CACHES used as a shared second tier, e.g. Redis in production
+    'BACKEND': None,
+}
+
+
+class AvailabilityCache:
+    """
+    Per-date cache for availableSlots results.
+
+    Entries live in a bounded in-process LRU and, when a Django cache alias is
+    configured, in that shared cache too. Shared entries are keyed by a per-date
+    version number, so invalidating a date in one process makes every other
+    process miss on its next read instead of serving its local copy.
+    """
+
+    def __init__(self, max_entries=DEFAULTS['MAX_ENTRIES'], timeout=DEFAULTS['TIMEOUT'], backend=None):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.shared = caches[backend] if backend else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, date, loader):
+        version = self._version(date)
+        key = (date, version)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        value = self.shared.get(self._shared_key(date, version)) if self.shared else None
+        if value is None:
+            value = list(loader())
+            if self.shared:
+                self.shared.set(self._shared_key(date, version), value, self.timeout)
+            with self._lock:
+                self.misses += 1
+        else:
+            with self._lock:
+                self.hits += 1
+
+        with self._lock:
+            self._entries[key] = (now + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, *dates):
+        dates = set(dates)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] in dates]:
+                del self._entries[key]
+        if self.shared:
+            for date in dates:
+                try:
+                    self.shared.incr(self._version_key(date))
+                except ValueError:
+                    self.shared.set(self._version_key(date), 1, None)
+
+    def clear(self):
+        # The shared alias is dedicated to availability, so clearing it is safe
+        if self.shared:
+            self.shared.clear()
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+    def _version(self, date):
+        return self.shared.get(self._version_key(date), 0) if self.shared else 0
+
+    @staticmethod
+    def _version_key(date):
+        return f'availability:version:{date.isoformat()}'
+
+    @staticmethod
+    def _shared_key(date, version):
+        return f'availability:{date.isoformat()}:{version}'
+
+
+_availability_cache = None
+
+
+def get_availability_cache():
+    global _availability_cache
+    if _availability_cache is None:
+        options = {**DEFAULTS, **getattr(settings, 'AVAILABILITY_CACHE', {})}
+        _availability_cache = AvailabilityCache(options['MAX_ENTRIES'], options['TIMEOUT'], options['BACKEND'])
+    return _availability_cache
+
+
+def invalidate_availability(*dates):
+    """
+    Drop cached availability for the given dates.
+
+    The entries are dropped right away and again once the surrounding
+    transaction commits, so a read that raced the write cannot leave
+    pre-commit results behind.
+    """
+    dates = [date for date in dates if date is not None]
+    if not dates:
+        return
+    cache = get_availability_cache()
+    cache.invalidate(*dates)
+    transaction.on_commit(lambda: cache.invalidate(*dates))
+
+
+@receiver(setting_changed)
+def reset_availability_cache(setting, **kwargs):
+    global _availability_cache
+    if setting in ('AVAILABILITY_CACHE', 'CACHES'):
+        _availability_cache = None
@@ -0,0 +1,80 @@
+import functools
+import json
+
+from asgiref.sync import async_to_sync
+from graphene_django.settings import graphene_settings
+from graphene_subscriptions.consumers import AttrDict, GraphqlSubscriptionConsumer
+from rx.subjects import Subject
+
+from .events import get_event_cache
+from .subscriptions import SubscriptionRoot
+
+
+class TopicSubscriptionConsumer(GraphqlSubscriptionConsumer):
+    """
+    graphql-ws consumer that joins one channel group per subscribed topic and
+    leaves it when the last subscription on it stops.
+
+    The stock consumer puts every connection in a single "subscriptions" group
+    and feeds every event through every subscription's filter. Here events
+    arrive only on the topics a subscription asked for, and each connection has
+    its own streams instead of sharing one process-wide Subject.
+    """
+
+    def websocket_connect(self, message):
+        self.topics = {}
+        self.subscriptions = {}
+        # {operation id: topics it joined}
+        self.operation_topics = {}
+        self.send({"type": "websocket.accept", "subprotocol": "graphql-ws"})
+
+    def websocket_disconnect(self, message):
+        for topic in self.topics:
+            async_to_sync(self.channel_layer.group_discard)(topic, self.channel_name)
+        super().websocket_disconnect(message)
+
+    def websocket_receive(self, message):
+        request = json.loads(message["text"])
+        id = request.get("id")
+
+        if request["type"] == "start":
+            payload = request["payload"]
+            root = SubscriptionRoot(self)
+            result = graphene_settings.SCHEMA.execute(
+                payload["query"],
+                operation_name=payload.get("operationName"),
+                variables=payload.get("variables"),
+                context=AttrDict(self.scope),
+                root=root,
+                allow_subscriptions=True,
+            )
+
+            if hasattr(result, "subscribe"):
+                self.operation_topics[id] = root.topics
+                self.subscriptions[id] = result.subscribe(functools.partial(self._send_result, id))
+            else:
+                self._send_result(id, result)
+
+        elif request["type"] == "stop":
+            subscription = self.subscriptions.pop(id, None)
+            if subscription is not None:
+                subscription.dispose()
+            self.leave_topics(self.operation_topics.pop(id, set()))
+
+    def join_topic(self, topic):
+        if topic not in self.topics:
+            self.topics[topic] = Subject()
+            async_to_sync(self.channel_layer.group_add)(topic, self.channel_name)
+        return self.topics[topic]
+
+    def leave_topics(self, topics):
+        # Topics another running operation still listens on are kept
+        for topic in topics.difference(*self.operation_topics.values()):
+            if self.topics.pop(topic, None) is not None:
+                async_to_sync(self.channel_layer.group_discard)(topic, self.channel_name)
+
+    def topic_event(self, message):
+        subject = self.topics.get(message["topic"])
+        if subject is not None:
+            # Every consumer in the process gets the same decoded event for a frame
+            subject.on_next(get_event_cache().decode(message["event"]))
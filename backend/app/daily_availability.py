@@ -0,0 +1,108 @@
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+from django.db.models.functions import TruncDate
+
+from .dates import local_day_range
+from .models import DailyAvailability, Slot
+
+# Longest range one availabilityCalendar query may cover
+MAX_CALENDAR_DAYS = 366
+
+
+def adjust_day_counts(changes):
+    """
+    Apply ``{date: (total, open)}`` deltas to the DailyAvailability rows.
+
+    The counts are changed with ``UPDATE ... SET open_slots = open_slots + n``,
+    so concurrent writers add up instead of overwriting each other. A single
+    date costs one UPDATE, creating its row if it has none; several dates
+    cost one INSERT of the missing rows and one UPDATE for all of them, so a
+    batch of writes does not pay per day.
+    """
+    changes = {date: deltas for date, deltas in changes.items() if deltas != (0, 0)}
+    if not changes:
+        return
+    if len(changes) > 1:
+        DailyAvailability.objects.bulk_create([DailyAvailability(date=date) for date in changes],
+                                              ignore_conflicts=True)
+        _add_to_counts(changes)
+        return
+
+    [(date, (total, open_))] = changes.items()
+    if _add_to_counts(changes):
+        return
+    try:
+        with transaction.atomic():
+            DailyAvailability.objects.create(date=date, total_slots=total, open_slots=open_)
+    except IntegrityError:
+        # Another writer created the row since the UPDATE
+        _add_to_counts(changes)
+
+
+def _add_to_counts(changes):
+    def delta(index):
+        return Case(*[When(date=date, then=Value(deltas[index])) for date, deltas in changes.items()],
+                    default=Value(0), output_field=IntegerField())
+
+    return DailyAvailability.objects.filter(date__in=list(changes)).update(
+        total_slots=F('total_slots') + delta(0), open_slots=F('open_slots') + delta(1)
+    )
+
+
+def count_slots_by_day(date_from=None, date_to=None):
+    """
+    Count total and open slots per local day with one grouped query.
+
+    Returns ``(date, total, open)`` rows in date order for the days that have
+    slots, limited to [date_from, date_to] when given.
+    """
+    slots = Slot.objects.all()
+    if date_from is not None:
+        slots = slots.filter(start_time__gte=local_day_range(date_from)[0])
+    if date_to is not None:
+        slots = slots.filter(start_time__lt=local_day_range(date_to)[1])
+    return slots.annotate(day=TruncDate('start_time')).values('day').annotate(
+        total=Count('pk'), open=Count('pk', filter=Q(is_booked=False))
+    ).order_by('day').values_list('day', 'total', 'open')
+
+
+def rebuild_day_counts(date_from=None, date_to=None):
+    """
+    Recount DailyAvailability from the slots, for all days or [date_from, date_to].
+
+    For backfills and repairs after writes that bypassed the ORM; returns the
+    number of days with slots.
+    """
+    with transaction.atomic():
+        rows = [DailyAvailability(date=day, total_slots=total, open_slots=open_)
+                for day, total, open_ in count_slots_by_day(date_from, date_to)]
+        stale = DailyAvailability.objects.all()
+        if date_from is not None:
+            stale = stale.filter(date__gte=date_from)
+        if date_to is not None:
+            stale = stale.filter(date__lte=date_to)
+        stale.delete()
+        DailyAvailability.objects.bulk_create(rows)
+    return len(rows)
+
+
+def calendar_days(date_from, date_to):
+    """
+    Return a DailyAvailability for every day in [date_from, date_to], in order.
+
+    The summary is read with one range query; days without slots come back
+    as unsaved rows with zero counts.
+    """
+    if date_to < date_from:
+        raise ValueError('The end of the range must not be before its start.')
+    if (date_to - date_from).days >= MAX_CALENDAR_DAYS:
+        raise ValueError(f'At most {MAX_CALENDAR_DAYS} days can be requested at once.')
+
+    summaries = {row.date: row for row in DailyAvailability.objects.filter(date__gte=date_from, date__lte=date_to)}
+    days = []
+    for offset in range((date_to - date_from).days + 1):
+        date = date_from + datetime.timedelta(days=offset)
+        days.append(summaries.get(date) or DailyAvailability(date=date))
+    return days
@@ -0,0 +1,26 @@
+import datetime
+
+from django.utils import timezone
+
+
+def parse_date(date):
+    """Parse a YYYY-MM-DD string as used by the GraphQL date arguments."""
+    try:
+        return datetime.datetime.strptime(date, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError("Invalid date format. Please provide the date in YYYY-MM-DD format.")
+
+
+def local_day_range(first_day, last_day=None):
+    """
+    Return the half-open [start, end) datetimes covering first_day through last_day.
+
+    Days are interpreted in the configured TIME_ZONE, so filtering with
+    ``start_time__gte=start, start_time__lt=end`` matches ``start_time__date``
+    while comparing the raw column, which an index can serve.
+    """
+    last_day = last_day or first_day
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.datetime.combine(first_day, datetime.time.min), tz)
+    end = timezone.make_aware(datetime.datetime.combine(last_day + datetime.timedelta(days=1), datetime.time.min), tz)
+    return start, end
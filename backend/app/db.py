@@ -0,0 +1,168 @@
+"""
+Database connection setup and primary/replica routing.
+
+With DATABASE_ROUTING['REPLICA'] naming a database alias, GraphQL query
+operations read from that replica and everything else uses the primary
+(``default``). The choice is made per request: CachedGraphQLView opens a
+Route for each request with route_request() and points its reads at the
+replica for query operations. Within a route:
+
+- writes always go to the primary, and so do reads after the first write
+  and reads inside a transaction on the primary;
+- a client that wrote within the last STICKY_SECONDS sends the COOKIE set
+  by its write, and reads from the primary too, so it sees its own writes
+  while the replica catches up.
+
+Signal handlers and services run in the route of the request that called
+them. Outside any route, in management commands and subscription
+consumers, the router has no opinion and every query goes to the primary
+as before. replicate() stands in for replication between two SQLite files.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DEFAULTS = {
+    # Alias GraphQL query operations read from; None reads everything from the primary
+    'REPLICA': None,
+    # Seconds after a write during which the same client keeps reading from the primary
+    'STICKY_SECONDS': 5,
+    # Cookie marking such a client
+    'COOKIE': 'primary_reads',
+}
+
+
+def routing_options():
+    return {**DEFAULTS, **getattr(settings, 'DATABASE_ROUTING', {})}
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    Run the SQLITE_PRAGMAS setting on every new SQLite connection.
+
+    Most pragmas are per connection, so they have to be set each time one is
+    opened; persistent connections (CONN_MAX_AGE) keep that to once per thread.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+class Route:
+    """
+    Where one request's queries go.
+
+    Reads go to ``read_alias``, the primary until read_from_replica() moves
+    them to ``replica``; after the first write, and inside a transaction on
+    the primary, they go to the primary. Writes always do.
+    """
+
+    def __init__(self, replica=None):
+        self.replica = replica
+        self.read_alias = DEFAULT_DB_ALIAS
+        self.wrote = False
+
+    def read_from_replica(self):
+        if self.replica is not None and not self.wrote:
+            self.read_alias = self.replica
+
+    def db_for_read(self):
+        if self.wrote or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return self.read_alias
+
+
+_route = contextvars.ContextVar('database_route', default=None)
+
+
+def current_route():
+    return _route.get()
+
+
+@contextmanager
+def use_route(route):
+    token = _route.set(route)
+    try:
+        yield route
+    finally:
+        _route.reset(token)
+
+
+def primary_reads():
+    """Read from the primary within the block, e.g. for results cached until the next write."""
+    return use_route(Route())
+
+
+@contextmanager
+def route_request(request):
+    """
+    The Route for one request, or None when no replica is configured.
+
+    A client holding the stickiness cookie gets a route without a replica,
+    so it keeps reading from the primary whatever the request does.
+    """
+    options = routing_options()
+    if options['REPLICA'] is None:
+        yield None
+        return
+    with use_route(Route(None if request.COOKIES.get(options['COOKIE']) else options['REPLICA'])) as route:
+        yield route
+
+
+def stick_to_primary(response, route):
+    """Set the stickiness cookie on the response of a request that wrote."""
+    if route is None or not route.wrote:
+        return
+    options = routing_options()
+    response.set_cookie(options['COOKIE'], '1', max_age=options['STICKY_SECONDS'], httponly=True, samesite='Lax')
+
+
+class PrimaryReplicaRouter:
+    """Database router applying the current Route; without one Django's defaults apply."""
+
+    def db_for_read(self, model, **hints):
+        route = _route.get()
+        return route.db_for_read() if route is not None else None
+
+    def db_for_write(self, model, **hints):
+        route = _route.get()
+        if route is None:
+            return None
+        route.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Rows read from the replica are the primary's rows
+        replica = routing_options()['REPLICA']
+        if replica is not None and {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, replica}:
+            return True
+        return None
+
+
+def replicate(source=DEFAULT_DB_ALIAS, target=None):
+    """
+    Copy a SQLite database over another with SQLite's online backup, returning the seconds it took.
+
+    The stand-in for replication when the replica is a second SQLite file:
+    run periodically, the replica lags the primary by up to the interval,
+    as a real one lags by its replication delay. ``target`` defaults to
+    DATABASE_ROUTING['REPLICA'].
+    """
+    target = target or routing_options()['REPLICA']
+    if target is None:
+        raise ValueError('No replica is configured in DATABASE_ROUTING.')
+    for alias in (source, target):
+        if connections[alias].vendor != 'sqlite':
+            raise ValueError(f'Database {alias!r} is not SQLite; replicate it with its own replication.')
+        connections[alias].ensure_connection()
+    started = time.perf_counter()
+    connections[source].connection.backup(connections[target].connection)
+    return time.perf_counter() - started
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from graphql import GraphQLError
+from graphql.backend.base import GraphQLBackend, GraphQLDocument
+from graphql.execution import ExecutionResult, execute
+from graphql.language.base import parse
+from graphql.validation import validate
+
+DEFAULTS = {
+    'MAX_ENTRIES': 500,
+    # Alias from CACHES holding persisted query text by hash, shared between processes
+    'PERSISTED_QUERIES': None,
+    'PERSISTED_QUERY_TIMEOUT': None,
+}
+
+PERSISTED_QUERY_VERSION = 1
+
+
+class PersistedQueryNotFound(GraphQLError):
+    """Raised for a hash-only request whose query has not been registered yet; clients retry with the text."""
+
+    def __init__(self):
+        super().__init__('PersistedQueryNotFound', extensions={'code': 'PERSISTED_QUERY_NOT_FOUND'})
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+def execute_validated(schema, document_ast, validation_errors, *args, **kwargs):
+    # Validation ran once when the document was cached
+    if validation_errors:
+        return ExecutionResult(errors=validation_errors, invalid=True)
+    return execute(schema, document_ast, *args, **kwargs)
+
+
+class DocumentCache(GraphQLBackend):
+    """
+    graphql-core backend that parses and validates each query once.
+
+    Documents are kept in a bounded LRU keyed by the sha256 of the query text,
+    the same hash automatic persisted queries use, so a hash-only request for
+    a hot query is served without touching the persisted query store.
+    Validation errors are cached with the document; syntax errors are not.
+    """
+
+    def __init__(self, max_entries=DEFAULTS['MAX_ENTRIES'], persisted_queries=None,
+                 persisted_query_timeout=DEFAULTS['PERSISTED_QUERY_TIMEOUT'], executor=None):
+        self.max_entries = max_entries
+        self.persisted_queries = caches[persisted_queries] if persisted_queries else None
+        self.persisted_query_timeout = persisted_query_timeout
+        self.execute_params = {'executor': executor}
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def document_from_string(self, schema, document_string):
+        key = (id(schema), query_hash(document_string))
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None and document.schema is schema:
+                self._documents.move_to_end(key)
+                self.hits += 1
+                return document
+
+        document_ast = parse(document_string)
+        document = GraphQLDocument(
+            schema=schema,
+            document_string=document_string,
+            document_ast=document_ast,
+            execute=partial(execute_validated, schema, document_ast, validate(schema, document_ast),
+                            **self.execute_params),
+        )
+        with self._lock:
+            self.misses += 1
+            self._documents[key] = document
+            while len(self._documents) > self.max_entries:
+                self._documents.popitem(last=False)
+        return document
+
+    def persisted_query(self, schema, sha256_hash, query=None):
+        """
+        Return the query text for an automatic persisted query request.
+
+        With query text the hash is checked and the text registered; without
+        it the text comes from the document LRU or the persisted query store.
+        """
+        if query:
+            if query_hash(query) != sha256_hash:
+                raise GraphQLError('provided sha does not match query')
+            if self.persisted_queries is not None:
+                self.persisted_queries.set(self._persisted_key(sha256_hash), query, self.persisted_query_timeout)
+            return query
+
+        with self._lock:
+            document = self._documents.get((id(schema), sha256_hash))
+        if document is not None:
+            return document.document_string
+        query = self.persisted_queries.get(self._persisted_key(sha256_hash)) if self.persisted_queries else None
+        if query is None:
+            raise PersistedQueryNotFound()
+        return query
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._documents)}
+
+    @staticmethod
+    def _persisted_key(sha256_hash):
+        return f'apq:{sha256_hash}'
+
+
+def persisted_query_hash(extensions):
+    """
+    The sha256Hash of an Apollo-style ``persistedQuery`` in the request extensions, if any.
+
+    GET requests carry the extensions as a JSON string.
+    """
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            raise GraphQLError('Extensions must be a JSON object.')
+    persisted = extensions.get('persistedQuery') if isinstance(extensions, dict) else None
+    if not persisted:
+        return None
+    if persisted.get('version') != PERSISTED_QUERY_VERSION:
+        raise GraphQLError('Unsupported persisted query version.')
+    sha256_hash = persisted.get('sha256Hash')
+    if not isinstance(sha256_hash, str) or len(sha256_hash) != 64:
+        raise GraphQLError('persistedQuery.sha256Hash must be a sha256 hex digest.')
+    return sha256_hash.lower()
+
+
+_document_cache = None
+
+
+def get_document_cache():
+    global _document_cache
+    if _document_cache is None:
+        options = {**DEFAULTS, **getattr(settings, 'GRAPHQL_DOCUMENTS', {})}
+        _document_cache = DocumentCache(
+            options['MAX_ENTRIES'], options['PERSISTED_QUERIES'], options['PERSISTED_QUERY_TIMEOUT']
+        )
+    return _document_cache
+
+
+@receiver(setting_changed)
+def reset_document_cache(setting, **kwargs):
+    global _document_cache
+    if setting in ('GRAPHQL_DOCUMENTS', 'CACHES'):
+        _document_cache = None
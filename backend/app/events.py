@@ -0,0 +1,150 @@
+"""
+Compact wire format for subscription events.
+
+A model event carries the model label, primary key, operation and only the
+fields the write changed, instead of the whole instance serialized as JSON;
+events without a model, such as availability deltas, carry their data as
+is. Each event is packed once per publish with msgpack's C extension:
+
+    [event id, label, pk, operation, data]
+
+Consumers decode frames through the process-wide EventCache, so every
+subscriber in a process that receives the same event shares one decoded
+instance: an update, whose frame lacks the unchanged fields, is read back
+from the database once per process rather than once per subscriber.
+Created and deleted events carry every field and never touch the database.
+"""
+import datetime
+import os
+import threading
+from collections import OrderedDict
+
+import msgpack
+from django.apps import apps
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from graphene_subscriptions.events import UPDATED, ModelSubscriptionEvent, SubscriptionEvent
+
+# Decoded events kept per process; a burst of events fanned out to many
+# subscribers only needs each one to stay cached until all have received it
+DEFAULT_EVENT_CACHE_SIZE = 1024
+
+
+class ModelChangeEvent(ModelSubscriptionEvent):
+    """A model event that sends only ``changed`` (attnames), or every loaded field when None."""
+
+    def __init__(self, operation=None, instance=None, changed=None):
+        super().__init__(operation, instance)
+        self.changed = changed
+
+
+def encode_event(event):
+    """Pack a SubscriptionEvent into one msgpack frame."""
+    if isinstance(event, ModelSubscriptionEvent):
+        instance = event.instance
+        frame = [os.urandom(8), instance._meta.label_lower, instance.pk, event.operation,
+                 field_values(instance, getattr(event, 'changed', None))]
+    else:
+        frame = [os.urandom(8), None, None, event.operation, event.instance]
+    # Timestamps pack aware datetimes into 4 to 12 bytes
+    return msgpack.packb(frame, datetime=True)
+
+
+def decode_event(frame):
+    """Rebuild the SubscriptionEvent for a frame from encode_event."""
+    _, label, pk, operation, data = msgpack.unpackb(frame, timestamp=3)
+    if label is None:
+        return SubscriptionEvent(operation, data)
+    return ModelSubscriptionEvent(operation, _rehydrate(apps.get_model(label), pk, operation, data))
+
+
+def loaded_values(instance):
+    """``{attname: value}`` of the instance's concrete fields that are not deferred."""
+    return {field.attname: instance.__dict__[field.attname]
+            for field in instance._meta.concrete_fields if field.attname in instance.__dict__}
+
+
+def field_values(instance, attnames=None):
+    """loaded_values, limited to ``attnames`` when given, as msgpack-friendly values."""
+    return {name: _plain(value) for name, value in loaded_values(instance).items()
+            if attnames is None or name in attnames}
+
+
+def changed_fields(instance, update_fields=None):
+    """
+    Attnames a save is writing: ``update_fields`` when given, else the fields
+    that differ from the values the instance was loaded with.
+
+    Instances that were not loaded from the database count every field as changed.
+    """
+    if update_fields is not None:
+        return [instance._meta.get_field(name).attname for name in update_fields]
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded is None:
+        return None
+    return [name for name, value in loaded.items() if getattr(instance, name) != value]
+
+
+def _plain(value):
+    if value is None or isinstance(value, (bool, int, float, str, datetime.datetime)):
+        return value
+    # Phone numbers and other rich values travel as their string form; to_python restores them
+    return str(value)
+
+
+def _rehydrate(model, pk, operation, data):
+    values = {name: model._meta.get_field(name).to_python(value) for name, value in data.items()}
+    if operation != UPDATED:
+        return model(**values)
+    # The frame has what changed; the rest is read back, and an instance
+    # deleted since keeps just what the event knows
+    instance = model._base_manager.filter(pk=pk).first() or model(pk=pk)
+    for name, value in values.items():
+        setattr(instance, name, value)
+    return instance
+
+
+class EventCache:
+    """Bounded LRU of decoded events keyed by their frame, shared by the consumers of a process."""
+
+    def __init__(self, max_entries=DEFAULT_EVENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._events = OrderedDict()
+        self._lock = threading.Lock()
+
+    def decode(self, frame):
+        with self._lock:
+            event = self._events.get(frame)
+            if event is not None:
+                self._events.move_to_end(frame)
+                return event
+        # Decoded outside the lock so a database read does not hold up other
+        # events; two consumers racing on a new frame both decode it once
+        event = decode_event(frame)
+        with self._lock:
+            self._events[frame] = event
+            while len(self._events) > self.max_entries:
+                self._events.popitem(last=False)
+        return event
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+
+_event_cache = None
+
+
+def get_event_cache():
+    global _event_cache
+    if _event_cache is None:
+        _event_cache = EventCache(getattr(settings, 'SUBSCRIPTION_EVENT_CACHE_SIZE', DEFAULT_EVENT_CACHE_SIZE))
+    return _event_cache
+
+
+@receiver(setting_changed)
+def reset_event_cache(setting, **kwargs):
+    global _event_cache
+    if setting == 'SUBSCRIPTION_EVENT_CACHE_SIZE':
+        _event_cache = None
@@ -0,0 +1,121 @@
+"""
+Streaming NDJSON and CSV exports of slots and bookings.
+
+Rows are read with ``values_list(...).iterator(chunk_size)``, which uses a
+server-side cursor where the database has one, and encoded one line at a
+time, so an export holds one chunk of rows in memory however large the
+table is. The same column names are what app.imports reads back.
+"""
+import csv
+import datetime
+import json
+
+from .dates import local_day_range
+from .models import Booking, Slot
+
+# Rows fetched from the database cursor at a time
+EXPORT_CHUNK_SIZE = 2000
+# Bytes of encoded lines handed to the server per write
+EXPORT_WRITE_SIZE = 64 * 1024
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+# Column name to model lookup, in output order
+SLOT_COLUMNS = {
+    'id': 'pk',
+    'start_time': 'start_time',
+    'end_time': 'end_time',
+    'capacity': 'capacity',
+    'booked_count': 'booked_count',
+    'is_booked': 'is_booked',
+}
+BOOKING_COLUMNS = {
+    'booking_id': 'booking_id',
+    'status': 'status',
+    'booker_first_name': 'booker_first_name',
+    'booker_last_name': 'booker_last_name',
+    'booker_email': 'booker_email',
+    'booker_phone': 'booker_phone',
+    'hold_expires_at': 'hold_expires_at',
+    'slot_id': 'slot_id',
+    'slot_start_time': 'slot__start_time',
+    'slot_end_time': 'slot__end_time',
+}
+
+EXPORTS = {
+    'slots': (Slot, SLOT_COLUMNS, 'start_time'),
+    'bookings': (Booking, BOOKING_COLUMNS, 'slot__start_time'),
+}
+
+
+def export_rows(kind, date_from=None, date_to=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the column names, then every row of ``kind`` as a tuple of values.
+
+    Rows come in primary key order, limited by start time to whole days in
+    [date_from, date_to] when given.
+    """
+    model, columns, start_field = EXPORTS[kind]
+    queryset = model.objects.all()
+    if date_from is not None:
+        queryset = queryset.filter(**{f'{start_field}__gte': local_day_range(date_from)[0]})
+    if date_to is not None:
+        queryset = queryset.filter(**{f'{start_field}__lt': local_day_range(date_to)[1]})
+    yield tuple(columns)
+    yield from queryset.order_by('pk').values_list(*columns.values()).iterator(chunk_size=chunk_size)
+
+
+def encode_rows(rows, format):
+    """Encode export_rows output as NDJSON or CSV lines."""
+    rows = iter(rows)
+    columns = next(rows)
+    if format == 'ndjson':
+        for row in rows:
+            yield json.dumps(dict(zip(columns, map(_plain, row))), separators=(',', ':')) + '\n'
+    else:
+        line = _Line()
+        writer = csv.writer(line)
+        writer.writerow(columns)
+        yield line.pop()
+        for row in rows:
+            writer.writerow(['' if value is None else _plain(value) for value in row])
+            yield line.pop()
+
+
+def stream_export(kind, format, date_from=None, date_to=None):
+    """Yield the export as bytes in pieces of about EXPORT_WRITE_SIZE, for StreamingHttpResponse."""
+    pending, size = [], 0
+    for line in encode_rows(export_rows(kind, date_from, date_to), format):
+        pending.append(line)
+        size += len(line)
+        if size >= EXPORT_WRITE_SIZE:
+            yield ''.join(pending).encode()
+            pending, size = [], 0
+    if pending:
+        yield ''.join(pending).encode()
+
+
+class _Line:
+    """File-like target for csv.writer that hands back each written line."""
+
+    def __init__(self):
+        self.value = ''
+
+    def write(self, value):
+        self.value += value
+
+    def pop(self):
+        value, self.value = self.value, ''
+        return value
+
+
+def _plain(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    # PhoneNumber and other field values export as their string form
+    return str(value)
@@ -0,0 +1,223 @@
+"""
+Bulk import of slots and bookings from NDJSON or CSV.
+
+Reads the columns app.exports writes. Input is parsed one line at a time
+and handled IMPORT_CHUNK_SIZE rows at a time: each chunk is checked against
+the database with one query for the rows it could collide with and written
+with batched bulk_create in its own transaction, so memory stays flat
+however long the input is. Rows that fail validation are reported with
+their line number and skipped; the rest of their chunk is still imported.
+
+Slots are imported open, whatever their exported booked_count: seats are
+taken by the active bookings imported for them. Rows that already exist, a
+slot with the same start and end time or a booking with the same
+booking_id, are skipped, so an import can be rerun after a partial failure.
+Imported bookings are not published to bookingCreated subscribers.
+"""
+import csv
+import itertools
+import json
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Booking, Slot
+from .services import ACTIVE_STATUSES, take_seats
+from .slot_generation import insert_slots
+
+# Input rows validated and written per transaction
+IMPORT_CHUNK_SIZE = 1000
+# Errors kept with their line numbers; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+KINDS = ('slots', 'bookings')
+FORMATS = ('ndjson', 'csv')
+
+BOOKER_FIELDS = ('booker_first_name', 'booker_last_name', 'booker_email', 'booker_phone')
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    skipped: int = 0
+    error_count: int = 0
+    # (line number, message) for the first MAX_REPORTED_ERRORS errors
+    errors: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def rows(self):
+        return self.created + self.skipped + self.error_count
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def read_rows(stream, format):
+    """
+    Yield ``(line number, row)`` for each record in a text stream.
+
+    ``row`` is a dict of column values, or the ValueError that the line
+    could not be parsed with.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError('Each line must be a JSON object.')
+        except ValueError as error:
+            yield number, error
+        else:
+            yield number, row
+
+
+def import_rows(kind, rows, chunk_size=IMPORT_CHUNK_SIZE):
+    """Import ``(line number, row)`` pairs from read_rows as ``kind``, chunk by chunk."""
+    import_chunk = {'slots': _import_slots, 'bookings': _import_bookings}[kind]
+    result = ImportResult()
+    started = time.perf_counter()
+    rows = iter(rows)
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        for line, row in chunk:
+            if isinstance(row, ValueError):
+                result.add_error(line, str(row))
+        import_chunk([(line, row) for line, row in chunk if not isinstance(row, ValueError)], result)
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def _import_slots(chunk, result):
+    slots = {}
+    for line, row in chunk:
+        try:
+            slot = Slot(start_time=_datetime(row, 'start_time', required=True),
+                        end_time=_datetime(row, 'end_time', required=True),
+                        capacity=_integer(row, 'capacity', default=1))
+            if slot.end_time <= slot.start_time:
+                raise ValidationError('end_time must be after start_time.')
+            slot.clean_fields(exclude=['booked_count', 'is_booked'])
+        except (ValueError, ValidationError) as error:
+            result.add_error(line, _message(error))
+            continue
+        key = (slot.start_time, slot.end_time)
+        if key in slots:
+            result.skipped += 1
+        else:
+            slots[key] = slot
+
+    if not slots:
+        return
+    existing = set(Slot.objects.filter(start_time__in={start for start, _ in slots})
+                   .values_list('start_time', 'end_time'))
+    new = [slot for key, slot in slots.items() if key not in existing]
+    created = insert_slots(new)
+    result.created += created
+    result.skipped += len(slots) - created
+
+
+def _import_bookings(chunk, result):
+    parsed = []
+    for line, row in chunk:
+        try:
+            booking = Booking(
+                booking_id=_text(row, 'booking_id'),
+                status=_text(row, 'status') or 'confirmed',
+                hold_expires_at=_datetime(row, 'hold_expires_at'),
+                **{name: _text(row, name) for name in BOOKER_FIELDS},
+            )
+            booking.clean_fields(exclude=['slot', 'booking_id'])
+            start_time, end_time = _datetime(row, 'slot_start_time'), _datetime(row, 'slot_end_time')
+            if (start_time is None) != (end_time is None):
+                raise ValidationError('slot_start_time and slot_end_time must be given together.')
+        except (ValueError, ValidationError) as error:
+            result.add_error(line, _message(error))
+            continue
+        parsed.append((line, booking, start_time and (start_time, end_time)))
+
+    if not parsed:
+        return
+    with transaction.atomic():
+        # The chunk's slots are locked so the seat check below holds until commit
+        slots = {(slot.start_time, slot.end_time): slot for slot in Slot.objects.select_for_update().filter(
+            start_time__in={key[0] for _, _, key in parsed if key}
+        )}
+        seen = set(Booking.objects.filter(
+            booking_id__in=[booking.booking_id for _, booking, _ in parsed if booking.booking_id]
+        ).values_list('booking_id', flat=True))
+
+        seats, new = Counter(), []
+        for line, booking, key in parsed:
+            slot = slots.get(key) if key else None
+            if booking.booking_id in seen:
+                result.skipped += 1
+                continue
+            if key and slot is None:
+                result.add_error(line, f'No slot from {key[0].isoformat()} to {key[1].isoformat()}.')
+                continue
+            if slot is not None and booking.status in ACTIVE_STATUSES:
+                if seats[slot.pk] >= slot.remaining_capacity:
+                    result.add_error(line, f'Slot {slot.pk} has no seats left.')
+                    continue
+                seats[slot.pk] += 1
+            booking.slot = slot
+            booking.booking_id = booking.booking_id or booking.generate_booking_id()
+            seen.add(booking.booking_id)
+            new.append(booking)
+
+        if seats:
+            take_seats({slot.pk: slot for slot in slots.values()}, seats)
+        Booking.objects.bulk_create(new)
+    result.created += len(new)
+
+
+def _text(row, name):
+    value = row.get(name)
+    return '' if value is None else str(value)
+
+
+def _datetime(row, name, required=False):
+    value = row.get(name)
+    if value in (None, ''):
+        if required:
+            raise ValidationError(f'{name} is required.')
+        return None
+    parsed = parse_datetime(str(value))
+    if parsed is None:
+        raise ValidationError(f'{name} is not a valid datetime: {value!r}.')
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+def _integer(row, name, default):
+    value = row.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError(f'{name} is not an integer: {value!r}.') from None
+
+
+def _message(error):
+    if isinstance(error, ValidationError):
+        if hasattr(error, 'error_dict'):
+            return '; '.join(f'{name}: {" ".join(messages)}' for name, messages in error.message_dict.items())
+        return ' '.join(error.messages)
+    return str(error)
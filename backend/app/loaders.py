@@ -0,0 +1,50 @@
+from collections import defaultdict
+
+from django.http import HttpRequest
+from promise import Promise
+from promise.dataloader import DataLoader
+
+from .models import Booking, Slot
+
+
+class SlotLoader(DataLoader):
+    """Loads slots by primary key, one query per batch."""
+
+    def batch_load_fn(self, slot_ids):
+        slots = Slot.objects.in_bulk(slot_ids)
+        return Promise.resolve([slots.get(slot_id) for slot_id in slot_ids])
+
+
+class BookingsBySlotLoader(DataLoader):
+    """Loads the bookings of each slot, one query per batch."""
+
+    def batch_load_fn(self, slot_ids):
+        bookings = defaultdict(list)
+        for booking in Booking.objects.filter(slot_id__in=slot_ids).order_by('pk'):
+            bookings[booking.slot_id].append(booking)
+        return Promise.resolve([bookings[slot_id] for slot_id in slot_ids])
+
+
+class Loaders:
+    def __init__(self):
+        self.slot = SlotLoader()
+        self.bookings_by_slot = BookingsBySlotLoader()
+
+
+def get_loaders(info):
+    """
+    Return the DataLoaders for the current request.
+
+    Loaders live on the HTTP request so their batches and caches are scoped to
+    one GraphQL execution. Subscriptions keep the same context for the whole
+    websocket lifetime, so they get fresh loaders instead of a cache that would
+    go stale between events.
+    """
+    context = info.context
+    if not isinstance(context, HttpRequest):
+        return Loaders()
+
+    loaders = getattr(context, 'loaders', None)
+    if loaders is None:
+        loaders = context.loaders = Loaders()
+    return loaders
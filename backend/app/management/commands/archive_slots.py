@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from app.archive import archive_cutoff, archive_options, archive_slots
+
+
+class Command(BaseCommand):
+    help = (
+        "Move slots that ended more than the retention window ago, with their bookings, into the archive "
+        "tables. With --loop it keeps running, archiving again every --interval seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, help="Days of past slots to keep live "
+                                                                "(default ARCHIVE['RETENTION_DAYS']).")
+        parser.add_argument('--batch-size', type=int, help="Slots moved per transaction "
+                                                           "(default ARCHIVE['BATCH_SIZE']).")
+        parser.add_argument('--loop', action='store_true', help="Keep archiving instead of exiting.")
+        parser.add_argument('--interval', type=float, default=3600.0, help="Seconds between runs with --loop.")
+
+    def handle(self, *args, **options):
+        retention_days = options['retention_days']
+        if retention_days is None:
+            retention_days = archive_options()['RETENTION_DAYS']
+        if retention_days < 0:
+            raise CommandError("--retention-days must not be negative.")
+
+        while True:
+            result = archive_slots(archive_cutoff(retention_days), batch_size=options['batch_size'])
+            if result.slots or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Archived {result.slots} slots and {result.bookings} bookings "
+                    f"in {result.elapsed:.2f}s, {result.rows_per_second:.0f} rows/s"
+                ))
+            if not options['loop']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
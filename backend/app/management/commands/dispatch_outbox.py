@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from app.outbox import dispatch_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Publish the subscription events waiting in the outbox, oldest first, in batches. With --loop it "
+        "keeps running, polling every --interval seconds while the outbox is empty and waiting the same "
+        "before the next run when the channel layer keeps failing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep dispatching instead of exiting.")
+        parser.add_argument('--interval', type=float, default=0.1, help="Seconds between polls with --loop.")
+        parser.add_argument('--batch-size', type=int, help="Events claimed and sent at a time "
+                                                           "(default SUBSCRIPTION_OUTBOX['BATCH_SIZE']).")
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                result = dispatch_outbox(batch_size=options['batch_size'])
+            except Exception as error:
+                if not options['loop']:
+                    raise CommandError(f"Publishing failed, the remaining events stay in the outbox: {error}")
+                self.stderr.write(f"Publishing failed, retrying in {options['interval']}s: {error}")
+            else:
+                if result.events or not options['loop']:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"Published {result.events} events as {result.messages} messages in {result.batches} "
+                        f"batches, {result.events_per_second:.0f} events/s"
+                    ))
+            if not options['loop']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
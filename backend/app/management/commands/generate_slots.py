@@ -0,0 +1,64 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from app.models import SlotConfiguration
+from app.slot_generation import DEFAULT_BATCH_SIZE, create_missing_slots, generate_slots_for_configs, range_slots
+
+WEEKDAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+
+def parse_date(value):
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}'. Please provide dates in YYYY-MM-DD format.")
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate slots between two dates. With --start-hour/--end-hour the hours are applied to every "
+        "matching day; otherwise every SlotConfiguration (including weekly repeats) in the range is used."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', required=True, help="First day (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='date_to', required=True, help="Last day, inclusive (YYYY-MM-DD).")
+        parser.add_argument('--start-hour', type=int, help="Start hour (0-23).")
+        parser.add_argument('--end-hour', type=int, help="End hour (must be greater than start hour).")
+        parser.add_argument('--slot-minutes', type=int, default=60, help="Slot length in minutes.")
+        parser.add_argument('--weekdays', help="Comma separated weekdays to generate for, e.g. mon,wed,fri.")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        date_from = parse_date(options['date_from'])
+        date_to = parse_date(options['date_to'])
+        if date_to < date_from:
+            raise CommandError("--to must not be before --from.")
+
+        start_hour, end_hour = options['start_hour'], options['end_hour']
+        if (start_hour is None) != (end_hour is None):
+            raise CommandError("--start-hour and --end-hour must be given together.")
+
+        if start_hour is None:
+            configs = SlotConfiguration.objects.filter(day__lte=date_to).filter(
+                Q(day__gte=date_from) | Q(repeat_weekly_until__gte=date_from)
+            )
+            result = generate_slots_for_configs(configs, date_from, date_to, batch_size=options['batch_size'])
+        else:
+            if not 0 <= start_hour < end_hour <= 23:
+                raise CommandError("Hours must satisfy 0 <= start hour < end hour <= 23.")
+            weekdays = None
+            if options['weekdays']:
+                try:
+                    weekdays = {WEEKDAYS.index(day.strip().lower()[:3]) for day in options['weekdays'].split(',')}
+                except ValueError:
+                    raise CommandError(f"Invalid --weekdays '{options['weekdays']}'.")
+            candidates = range_slots(date_from, date_to, start_hour, end_hour, options['slot_minutes'], weekdays)
+            result = create_missing_slots(candidates, batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result.created} slots ({result.skipped} already existed) "
+            f"in {result.elapsed:.2f}s, {result.rows_per_second:.0f} rows/s"
+        ))
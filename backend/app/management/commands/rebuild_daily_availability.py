@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.daily_availability import rebuild_day_counts
+from app.management.commands.generate_slots import parse_date
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the per-day slot totals behind availabilityCalendar from the slots themselves, for every day "
+        "or only --from/--to. Only needed after slots were written around the ORM, e.g. with raw SQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help="First day (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='date_to', help="Last day, inclusive (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        date_from = parse_date(options['date_from']) if options['date_from'] else None
+        date_to = parse_date(options['date_to']) if options['date_to'] else None
+        if date_from and date_to and date_to < date_from:
+            raise CommandError("--to must not be before --from.")
+
+        days = rebuild_day_counts(date_from, date_to)
+        self.stdout.write(self.style.SUCCESS(f"Recounted availability for {days} days"))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from app import services
+from app.services import HOLD_SWEEP_BATCH_SIZE, next_hold_expiry, release_expired_holds
+
+
+class Command(BaseCommand):
+    help = (
+        "Expire slot holds past their deadline and give their slots back. With --loop it keeps running, "
+        "sleeping until the earliest remaining hold is due or --interval seconds, whichever comes first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep sweeping instead of exiting.")
+        parser.add_argument('--interval', type=float, default=30.0, help="Longest sleep between sweeps in seconds.")
+        parser.add_argument('--batch-size', type=int, default=HOLD_SWEEP_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        while True:
+            released = 0
+            while True:
+                batch = release_expired_holds(batch_size=options['batch_size'])
+                released += batch
+                if batch < options['batch_size']:
+                    break
+            if released or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f"Released {released} expired holds"))
+            if not options['loop']:
+                return
+
+            next_expiry = next_hold_expiry()
+            close_old_connections()
+            delay = options['interval']
+            if next_expiry is not None:
+                delay = min(delay, max(0.0, (next_expiry - services.clock()).total_seconds()))
+            time.sleep(delay)
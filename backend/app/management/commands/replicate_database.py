@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from app.db import replicate
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database over the replica in DATABASE_ROUTING, standing in for "
+        "replication when both are local files. With --loop it copies every --interval seconds, "
+        "so the replica lags the primary by up to that long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep copying instead of exiting.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds between copies with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                elapsed = replicate()
+            except ValueError as error:
+                raise CommandError(str(error))
+            if not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f"Copied the primary to the replica in {elapsed:.3f}s"))
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,235 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models import QuerySet
+from django.dispatch import receiver
+from graphql.type import GraphQLEnumType, GraphQLScalarType
+from graphql.type.definition import get_named_type
+from promise import Promise, is_thenable
+
+DEFAULTS = {
+    # Distinct operation names tracked before the rest are folded into OVERFLOW_LABEL,
+    # since clients choose operation names and could otherwise grow memory without bound
+    'MAX_OPERATIONS': 100,
+    # Request header that asks for an extensions.timing block in the response
+    'TIMING_HEADER': 'X-GraphQL-Timing',
+}
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250)
+OVERFLOW_LABEL = '__other__'
+ANONYMOUS_OPERATION = 'anonymous'
+
+
+class Histogram:
+    """Prometheus-style histogram; memory is fixed by the number of buckets."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One counter per bucket plus +Inf; made cumulative when rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class HistogramFamily:
+    """Histograms of one metric, one per label value, with a cap on label values."""
+
+    def __init__(self, name, help, label, buckets, max_series=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self.max_series = max_series
+        self.series = {}
+
+    def observe(self, label_value, value):
+        histogram = self.series.get(label_value)
+        if histogram is None:
+            if self.max_series is not None and len(self.series) >= self.max_series:
+                label_value = OVERFLOW_LABEL
+                histogram = self.series.get(label_value)
+            if histogram is None:
+                histogram = self.series[label_value] = Histogram(self.buckets)
+        histogram.observe(value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for label_value, histogram in sorted(self.series.items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label}}} {histogram.sum}')
+            lines.append(f'{self.name}_count{{{label}}} {histogram.count}')
+        return lines
+
+
+class GraphQLMetrics:
+    """
+    Process-wide latency and SQL histograms per operation and per resolver.
+
+    Operations are labelled by operation name and resolvers by
+    ``ParentType.field``, which the schema bounds.
+    """
+
+    def __init__(self, max_operations=DEFAULTS['MAX_OPERATIONS']):
+        self._lock = threading.Lock()
+        self.operation_duration = HistogramFamily(
+            'graphql_operation_duration_seconds', 'Wall time of GraphQL operations.',
+            'operation', DURATION_BUCKETS, max_operations)
+        self.operation_sql_queries = HistogramFamily(
+            'graphql_operation_sql_queries', 'SQL queries per GraphQL operation.',
+            'operation', QUERY_COUNT_BUCKETS, max_operations)
+        self.operation_sql_duration = HistogramFamily(
+            'graphql_operation_sql_duration_seconds', 'SQL time per GraphQL operation.',
+            'operation', DURATION_BUCKETS, max_operations)
+        self.resolver_duration = HistogramFamily(
+            'graphql_resolver_duration_seconds', 'Wall time of GraphQL resolvers.',
+            'field', DURATION_BUCKETS)
+        self.resolver_sql_queries = HistogramFamily(
+            'graphql_resolver_sql_queries', 'SQL queries issued while a resolver ran.',
+            'field', QUERY_COUNT_BUCKETS)
+        self.resolver_sql_duration = HistogramFamily(
+            'graphql_resolver_sql_duration_seconds', 'SQL time spent while a resolver ran.',
+            'field', DURATION_BUCKETS)
+
+    def observe(self, operation_name, timing):
+        with self._lock:
+            self.operation_duration.observe(operation_name, timing.duration)
+            self.operation_sql_queries.observe(operation_name, timing.sql_queries)
+            self.operation_sql_duration.observe(operation_name, timing.sql_time)
+            for field, duration, sql_queries, sql_time in timing.resolver_calls:
+                self.resolver_duration.observe(field, duration)
+                self.resolver_sql_queries.observe(field, sql_queries)
+                self.resolver_sql_duration.observe(field, sql_time)
+
+    def render(self):
+        families = (
+            self.operation_duration, self.operation_sql_queries, self.operation_sql_duration,
+            self.resolver_duration, self.resolver_sql_queries, self.resolver_sql_duration,
+        )
+        with self._lock:
+            return '\n'.join(line for family in families for line in family.render()) + '\n'
+
+
+class OperationTiming:
+    """
+    Wall time and SQL of one GraphQL execution.
+
+    ``sql_wrapper`` is installed with ``connection.execute_wrapper`` for the
+    duration of the execution, and TimingMiddleware reads the running totals
+    before and after each resolver.
+    """
+
+    def __init__(self, operation_name=None):
+        self.operation_name = operation_name
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.sql_queries = 0
+        self.sql_time = 0.0
+        self.resolver_calls = []
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_queries += 1
+            self.sql_time += time.perf_counter() - started
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def as_dict(self):
+        # Resolvers are summed per field so the block stays small for long lists
+        resolvers = {}
+        for field, duration, sql_queries, sql_time in self.resolver_calls:
+            totals = resolvers.setdefault(field, {'calls': 0, 'duration': 0.0, 'sqlQueries': 0, 'sqlDuration': 0.0})
+            totals['calls'] += 1
+            totals['duration'] += duration
+            totals['sqlQueries'] += sql_queries
+            totals['sqlDuration'] += sql_time
+        return {
+            'duration': self.duration,
+            'sqlQueries': self.sql_queries,
+            'sqlDuration': self.sql_time,
+            'resolvers': resolvers,
+        }
+
+
+class TimingMiddleware:
+    """
+    Graphene middleware that times resolvers of the current OperationTiming.
+
+    Fields returning scalars or enums are plain attribute reads and are left
+    out, as are introspection fields. Resolvers returning a promise are timed
+    until it resolves, but only SQL issued during the call itself is counted
+    against them; DataLoader batches run later and count towards the operation.
+    """
+
+    def resolve(self, next, root, info, **args):
+        timing = getattr(info.context, 'graphql_timing', None)
+        if timing is None:
+            return next(root, info, **args)
+        if timing.operation_name is None and info.operation.name:
+            # Clients often send a named document without a separate operationName
+            timing.operation_name = info.operation.name.value
+        if (info.parent_type.name.startswith('__')
+                or isinstance(get_named_type(info.return_type), (GraphQLScalarType, GraphQLEnumType))):
+            return next(root, info, **args)
+
+        field = f'{info.parent_type.name}.{info.field_name}'
+        started = time.perf_counter()
+        sql_queries, sql_time = timing.sql_queries, timing.sql_time
+        result = next(root, info, **args)
+        if isinstance(result, Promise) and result.is_fulfilled:
+            # The executor wraps plain return values in already-resolved promises
+            result = result.get()
+        if isinstance(result, QuerySet):
+            # Querysets are lazy; evaluate here so their SQL counts against this
+            # field. The rows are cached on the queryset for the executor.
+            len(result)
+        sql_queries, sql_time = timing.sql_queries - sql_queries, timing.sql_time - sql_time
+
+        def record(value):
+            timing.resolver_calls.append((field, time.perf_counter() - started, sql_queries, sql_time))
+            return value
+
+        if is_thenable(result):
+            return Promise.resolve(result).then(record)
+        return record(result)
+
+
+def metrics_options():
+    return {**DEFAULTS, **getattr(settings, 'GRAPHQL_METRICS', {})}
+
+
+_graphql_metrics = None
+
+
+def get_graphql_metrics():
+    global _graphql_metrics
+    if _graphql_metrics is None:
+        _graphql_metrics = GraphQLMetrics(metrics_options()['MAX_OPERATIONS'])
+    return _graphql_metrics
+
+
+@receiver(setting_changed)
+def reset_graphql_metrics(setting, **kwargs):
+    global _graphql_metrics
+    if setting == 'GRAPHQL_METRICS':
+        _graphql_metrics = None
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
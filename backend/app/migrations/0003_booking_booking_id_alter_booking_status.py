@@ -0,0 +1,36 @@
+# Generated by Django 5.0.2 on 2026-10-18 17:02
+
+from django.db import migrations, models
+
+
+def populate_booking_ids(apps, schema_editor):
+    Booking = apps.get_model('app', 'Booking')
+    for booking in Booking.objects.filter(booking_id__isnull=True).only('pk'):
+        booking.booking_id = f'BK-LEGACY-{booking.pk:06d}'
+        booking.save(update_fields=['booking_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_slot_slotconfiguration_remove_booking_end_time_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='booking_id',
+            field=models.CharField(editable=False, max_length=50, null=True),
+        ),
+        migrations.RunPython(populate_booking_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='booking',
+            name='booking_id',
+            field=models.CharField(editable=False, max_length=50, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='status',
+            field=models.CharField(choices=[('confirmed', 'Confirmed'), ('pending', 'Pending'), ('cancelled', 'Cancelled'), ('denied', 'Denied')], default='confirmed', max_length=10),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.2 on 2026-10-18 17:10
+
+from django.db import migrations, models
+
+
+def deny_double_bookings(apps, schema_editor):
+    # Slots that were double booked before the constraint existed keep their
+    # earliest confirmed booking; the later ones are marked as denied.
+    Booking = apps.get_model('app', 'Booking')
+    Slot = apps.get_model('app', 'Slot')
+    seen = set()
+    for booking in Booking.objects.filter(slot__isnull=False, status='confirmed').order_by('slot_id', 'pk'):
+        if booking.slot_id in seen:
+            booking.status = 'denied'
+            booking.save(update_fields=['status'])
+        seen.add(booking.slot_id)
+    Slot.objects.filter(pk__in=seen).update(is_booked=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_booking_booking_id_alter_booking_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(deny_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'confirmed')), fields=('slot',), name='unique_confirmed_booking_per_slot'),
+        ),
+    ]
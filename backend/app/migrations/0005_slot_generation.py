@@ -0,0 +1,27 @@
+# Generated by Django 5.0.2 on 2026-10-18 17:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_booking_unique_confirmed_booking_per_slot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='slotconfiguration',
+            name='repeat_weekly_until',
+            field=models.DateField(blank=True, help_text='Repeat on the same weekday every week up to and including this date.', null=True),
+        ),
+        migrations.AddField(
+            model_name='slotconfiguration',
+            name='slot_minutes',
+            field=models.PositiveIntegerField(default=60, help_text='Length of each generated slot in minutes.'),
+        ),
+        migrations.AddConstraint(
+            model_name='slot',
+            constraint=models.UniqueConstraint(fields=('start_time', 'end_time'), name='unique_slot_time_range'),
+        ),
+    ]
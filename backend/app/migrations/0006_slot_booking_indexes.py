@@ -0,0 +1,21 @@
+# Generated by Django 5.0.2 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_slot_generation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'slot'], name='booking_status_slot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='slot',
+            index=models.Index(fields=['is_booked', 'start_time'], name='slot_booked_start_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:17
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+
+
+def count_existing_slots(apps, schema_editor):
+    Slot = apps.get_model('app', 'Slot')
+    DailyAvailability = apps.get_model('app', 'DailyAvailability')
+    days = Slot.objects.annotate(day=TruncDate('start_time')).values('day').annotate(
+        total=Count('pk'), open=Count('pk', filter=Q(is_booked=False))
+    ).order_by('day').values_list('day', 'total', 'open')
+    DailyAvailability.objects.bulk_create([
+        DailyAvailability(date=day, total_slots=total, open_slots=open_) for day, total, open_ in days
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_booking_holds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAvailability',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('total_slots', models.IntegerField(default=0)),
+                ('open_slots', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'daily availability',
+            },
+        ),
+        migrations.RunPython(count_existing_slots, migrations.RunPython.noop),
+    ]
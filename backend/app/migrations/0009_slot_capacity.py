@@ -0,0 +1,55 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:21
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def count_booked_seats(apps, schema_editor):
+    # Every active booking holds a seat; a slot that somehow has more of them
+    # than one seat gets the capacity to cover them instead of failing the check
+    Slot = apps.get_model('app', 'Slot')
+    slots = Slot.objects.annotate(
+        active=Count('bookings', filter=Q(bookings__status__in=['confirmed', 'pending']))
+    ).filter(active__gt=0)
+    for slot in slots:
+        slot.booked_count = slot.active
+        slot.capacity = max(slot.capacity, slot.active)
+        slot.is_booked = True
+        slot.save(update_fields=['booked_count', 'capacity', 'is_booked'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_daily_availability'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='booking',
+            name='unique_confirmed_booking_per_slot',
+        ),
+        migrations.RemoveIndex(
+            model_name='slot',
+            name='slot_booked_start_idx',
+        ),
+        migrations.AddField(
+            model_name='slot',
+            name='booked_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='slot',
+            name='capacity',
+            field=models.PositiveIntegerField(default=1, help_text='Number of bookings the slot can take.'),
+        ),
+        migrations.RunPython(count_booked_seats, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='slot',
+            index=models.Index(condition=models.Q(('booked_count__lt', models.F('capacity')), ('is_booked', False)), fields=['start_time'], name='slot_open_start_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='slot',
+            constraint=models.CheckConstraint(check=models.Q(('booked_count__lte', models.F('capacity'))), name='slot_booked_count_within_capacity'),
+        ),
+    ]
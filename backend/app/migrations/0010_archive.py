@@ -0,0 +1,45 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:24
+
+import django.db.models.deletion
+import phonenumber_field.modelfields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_slot_capacity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedSlot',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('capacity', models.PositiveIntegerField(default=1)),
+                ('booked_count', models.PositiveIntegerField(default=0)),
+                ('is_booked', models.BooleanField(default=False)),
+                ('archived_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['start_time'], name='archived_slot_start_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('booking_id', models.CharField(max_length=50, unique=True)),
+                ('booker_first_name', models.CharField(max_length=100)),
+                ('booker_last_name', models.CharField(max_length=100)),
+                ('booker_email', models.CharField(max_length=200)),
+                ('booker_phone', phonenumber_field.modelfields.PhoneNumberField(max_length=128, region=None)),
+                ('status', models.CharField(choices=[('confirmed', 'Confirmed'), ('pending', 'Pending'), ('cancelled', 'Cancelled'), ('denied', 'Denied'), ('expired', 'Expired')], max_length=10)),
+                ('hold_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField()),
+                ('slot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='app.archivedslot')),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxevent',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='outboxevent',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+    ]
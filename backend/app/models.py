@@ -1,15 +1,15 @@
 from django.db import models
 from phonenumber_field.modelfields import PhoneNumberField
-from django.db.models.signals import post_save, post_delete
-from django.core.exceptions import ValidationError
-from django.dispatch import receiver
-import uuid
-from datetime import datetime
+from django.utils import timezone
+
+from .booking_ids import get_booking_id_generator
 
 class SlotConfiguration(models.Model):
     day = models.DateField(help_text="The day for which to generate slots.")
     start_hour = models.IntegerField(help_text="Start hour (0-23).")
     end_hour = models.IntegerField(help_text="End hour (must be greater than start hour).")
+    slot_minutes = models.PositiveIntegerField(default=60, help_text="Length of each generated slot in minutes.")
+    repeat_weekly_until = models.DateField(null=True, blank=True, help_text="Repeat on the same weekday every week up to and including this date.")
 
     def __str__(self):
         return f"Configuration for {self.day}: {self.start_hour} to {self.end_hour}"
@@ -17,11 +17,86 @@ class SlotConfiguration(models.Model):
 class Slot(models.Model):
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
+    capacity = models.PositiveIntegerField(default=1, help_text="Number of bookings the slot can take.")
+    # Active (confirmed or pending) bookings holding a seat; only app.services
+    # changes it, with conditional UPDATEs, so saving a stale Slot must not
+    booked_count = models.PositiveIntegerField(default=0, editable=False)
+    # True once every seat is taken, set by the same UPDATEs as booked_count
     is_booked = models.BooleanField(default=False)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['start_time', 'end_time'], name='unique_slot_time_range'),
+            # The database has the last word on overselling, whatever the writer
+            models.CheckConstraint(check=models.Q(booked_count__lte=models.F('capacity')),
+                                   name='slot_booked_count_within_capacity'),
+        ]
+        indexes = [
+            # Serves availability lookups: seats left AND start_time in [day start, next day start),
+            # holding only the slots that can still be booked
+            models.Index(fields=['start_time'], name='slot_open_start_idx',
+                         condition=models.Q(is_booked=False, booked_count__lt=models.F('capacity'))),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember where the slot was loaded from so a move invalidates the old date too
+        instance._loaded_start_time = instance.__dict__.get('start_time')
+        # ...and where it was counted in the daily availability summary
+        instance._loaded_is_booked = instance.__dict__.get('is_booked')
+        return instance
+
+    @staticmethod
+    def local_date(start_time):
+        return timezone.localtime(start_time).date()
+
+    def availability_dates(self):
+        start_times = {self.start_time, getattr(self, '_loaded_start_time', None)}
+        return {self.local_date(start_time) for start_time in start_times if start_time is not None}
+
+    def day_count_changes(self, deleted=False):
+        """
+        Return ``{date: (total, open)}`` deltas that move this slot's
+        DailyAvailability counts from the state it was loaded in to its
+        current one, or out of the summary when ``deleted``.
+        """
+        changes = {}
+        loaded_start_time = getattr(self, '_loaded_start_time', None)
+        if loaded_start_time is not None:
+            date = self.local_date(loaded_start_time)
+            total, open_ = changes.get(date, (0, 0))
+            changes[date] = (total - 1, open_ - (not self._loaded_is_booked))
+        if not deleted:
+            date = self.local_date(self.start_time)
+            total, open_ = changes.get(date, (0, 0))
+            changes[date] = (total + 1, open_ + (not self.is_booked))
+        return {date: counts for date, counts in changes.items() if counts != (0, 0)}
+
+    @property
+    def remaining_capacity(self):
+        return max(self.capacity - self.booked_count, 0)
+
     def __str__(self):
         return f"{self.start_time} to {self.end_time} - {'Booked' if self.is_booked else 'Open'}"
 
+class DailyAvailability(models.Model):
+    """
+    Slot counts per day in the configured timezone, behind availabilityCalendar.
+
+    Kept current by the slot signals and app.services as slots are written and
+    booked; ``manage.py rebuild_daily_availability`` recounts it from the slots.
+    """
+    date = models.DateField(primary_key=True)
+    total_slots = models.IntegerField(default=0)
+    open_slots = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'daily availability'
+
+    def __str__(self):
+        return f"{self.date}: {self.open_slots} of {self.total_slots} slots open"
+
 class Booking(models.Model):
     booking_id = models.CharField(max_length=50, unique=True, editable=False)
     booker_first_name = models.CharField(max_length=100)
@@ -34,17 +109,39 @@ class Booking(models.Model):
         ('pending', 'Pending'),
         ('cancelled', 'Cancelled'),
         ('denied', 'Denied'),
+        ('expired', 'Expired'),
     ], default='confirmed')
+    # Deadline of a pending hold from holdSlot; null for every other booking
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Listing a customer's or a day's bookings filters by status first
+            models.Index(fields=['status', 'slot'], name='booking_status_slot_idx'),
+            # The sweeper reads pending holds in expiry order; other bookings stay out of the index
+            models.Index(fields=['status', 'hold_expires_at'], name='booking_hold_expiry_idx',
+                         condition=models.Q(status='pending')),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What the row held when loaded, so a save publishes only the fields it changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
     def generate_booking_id(self):
-        # Generate a timestamp component (YYMMDDHHmm)
-        timestamp = datetime.now().strftime('%y%m%d%H%M')
-        
-        # Generate a random component (last 4 characters of UUID)
-        random_component = str(uuid.uuid4())[-4:]
-        
-        # Combine with a prefix
-        return f'BK-{timestamp}-{random_component}'
+        # Time-ordered and unique across processes; see app.booking_ids and the BOOKING_IDS setting
+        return get_booking_id_generator()()
+
+    def slot_date(self):
+        # Avoids loading the whole slot when only its date is needed
+        if Booking.slot.is_cached(self):
+            return Slot.local_date(self.slot.start_time) if self.slot else None
+        if not self.slot_id:
+            return None
+        start_time = Slot.objects.filter(pk=self.slot_id).values_list('start_time', flat=True).first()
+        return Slot.local_date(start_time) if start_time else None
 
     def __str__(self):
         slot_str = f"from {self.slot.start_time} to {self.slot.end_time}" if self.slot else "No slot assigned"
@@ -54,23 +151,60 @@ class Booking(models.Model):
         # Generate booking_id if it doesn't exist
         if not self.booking_id:
             self.booking_id = self.generate_booking_id()
-            
-        if self.slot and Booking.objects.filter(slot=self.slot, status='confirmed').exists():
-            raise ValidationError('This slot is already booked.')
         super().save(*args, **kwargs)
 
-# Correctly defined outside the Booking class
-@receiver(post_save, sender=Booking)
-def update_slot_status_on_booking_save(sender, instance, created, **kwargs):
-    if created and instance.slot:
-        instance.slot.is_booked = True
-        instance.slot.save()
-
-@receiver(post_delete, sender=Booking)
-def update_slot_status_on_booking_delete(sender, instance, **kwargs):
-    # Check if the deleted booking's slot still exists and update its status
-    if instance.slot:
-        # Check if there are no other confirmed bookings for this slot
-        if not Booking.objects.filter(slot=instance.slot, status='confirmed').exists():
-            instance.slot.is_booked = False
-            instance.slot.save()
\ No newline at end of file
+class ArchivedSlot(models.Model):
+    """
+    A past Slot moved out of the hot table by app.archive.
+
+    Keeps the slot's original primary key, so IDs handed out while it was
+    live still identify it.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    capacity = models.PositiveIntegerField(default=1)
+    booked_count = models.PositiveIntegerField(default=0)
+    is_booked = models.BooleanField(default=False)
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['start_time'], name='archived_slot_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.start_time} to {self.end_time} (archived)"
+
+class ArchivedBooking(models.Model):
+    """A Booking archived together with its slot, under its original primary key and booking_id."""
+    id = models.BigIntegerField(primary_key=True)
+    booking_id = models.CharField(max_length=50, unique=True)
+    booker_first_name = models.CharField(max_length=100)
+    booker_last_name = models.CharField(max_length=100)
+    booker_email = models.CharField(max_length=200)
+    booker_phone = PhoneNumberField()
+    slot = models.ForeignKey(ArchivedSlot, on_delete=models.CASCADE, related_name="bookings")
+    status = models.CharField(max_length=10, choices=Booking._meta.get_field('status').choices)
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Archived booking {self.booking_id}"
+
+class OutboxEvent(models.Model):
+    """
+    A subscription event written in the same transaction as the change it
+    describes, waiting for app.outbox's dispatcher; deleted once published.
+    """
+    # Primary key order is publish order
+    topics = models.JSONField()
+    # app.events frame
+    frame = models.BinaryField()
+    created_at = models.DateTimeField(default=timezone.now)
+    # The dispatcher sending the event, and since when; None while it waits for one
+    claimed_by = models.CharField(max_length=32, null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Outbox event {self.pk} for {', '.join(self.topics)}"
@@ -0,0 +1,159 @@
+"""
+Transactional outbox for subscription events.
+
+With SUBSCRIPTION_OUTBOX['ENABLED'], app.subscriptions.publish_many writes
+each event's topics and app.events frame to OutboxEvent in the transaction
+of the write it describes: a rolled back booking leaves no event behind,
+and a slow channel layer no longer adds to the request. ``manage.py
+dispatch_outbox`` drains the table oldest first, BATCH_SIZE events at a
+time, and has to be running for subscribers to hear anything.
+
+A batch is claimed before it is sent: one UPDATE stamps the dispatcher's
+token on the oldest unclaimed events, which on SQLite waits up to
+busy_timeout for the write lock like any other single write. The claimed
+events are sent outside any transaction and deleted once all of them were.
+A failed send is retried MAX_ATTEMPTS times with exponential backoff
+before the dispatcher gives up and releases the claim, leaving the batch in
+place, in order, for the next run. A dispatcher that dies holding a claim
+leaves it to expire after CLAIM_TIMEOUT seconds, when another one sends
+the batch again. Delivery is at least once: a batch that failed part way is
+sent again from its first event.
+
+Within a batch, availability events for the same date are merged into one
+message carrying each slot's latest state, the way AvailabilityCoalescer
+merges them without the outbox. Several dispatchers never claim the same
+event, but only one keeps the events in order.
+"""
+import datetime
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+
+import msgpack
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from graphene_subscriptions.events import SubscriptionEvent
+
+from .events import encode_event
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Record events in the outbox; False sends them from on_commit hooks instead
+    'ENABLED': False,
+    # Events claimed, sent and deleted at a time
+    'BATCH_SIZE': 200,
+    # Sends of one batch before the dispatcher gives up on it
+    'MAX_ATTEMPTS': 5,
+    # Seconds before the first retry, doubling after every further failure
+    'RETRY_DELAY': 0.5,
+    # Seconds after which another dispatcher may take over a batch whose dispatcher stopped
+    'CLAIM_TIMEOUT': 60,
+}
+
+
+def outbox_options():
+    return {**DEFAULTS, **getattr(settings, 'SUBSCRIPTION_OUTBOX', {})}
+
+
+def record(entries):
+    """Write ``(topics, frame)`` pairs to the outbox with one INSERT, in the current transaction."""
+    OutboxEvent.objects.bulk_create([OutboxEvent(topics=topics, frame=frame) for topics, frame in entries])
+
+
+@dataclass
+class DispatchResult:
+    events: int = 0
+    messages: int = 0
+    batches: int = 0
+    retries: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def events_per_second(self):
+        return self.events / self.elapsed if self.elapsed else 0.0
+
+
+def dispatch_outbox(batch_size=None, max_attempts=None, retry_delay=None, sleep=time.sleep):
+    """
+    Publish everything in the outbox, oldest first, and return what was sent.
+
+    Raises the channel layer's error once a batch has failed ``max_attempts``
+    times; the batch and everything after it stay in the outbox.
+    """
+    # app.subscriptions records into the outbox, so it is imported here rather than at the top
+    from .subscriptions import send
+
+    options = outbox_options()
+    batch_size = batch_size or options['BATCH_SIZE']
+    max_attempts = max_attempts or options['MAX_ATTEMPTS']
+    retry_delay = options['RETRY_DELAY'] if retry_delay is None else retry_delay
+    result = DispatchResult()
+    started = time.perf_counter()
+
+    while True:
+        batch, token = _claim_batch(batch_size, options['CLAIM_TIMEOUT'])
+        if not batch:
+            break
+        entries = coalesce([(event.topics, bytes(event.frame)) for event in batch])
+        for attempt in range(1, max_attempts + 1):
+            try:
+                send(entries)
+                break
+            except Exception:
+                if attempt == max_attempts:
+                    OutboxEvent.objects.filter(claimed_by=token).update(claimed_by=None, claimed_at=None)
+                    raise
+                result.retries += 1
+                delay = retry_delay * 2 ** (attempt - 1)
+                logger.warning('Publishing outbox events failed, retrying in %.1fs', delay, exc_info=True)
+                sleep(delay)
+        OutboxEvent.objects.filter(claimed_by=token)._raw_delete(OutboxEvent.objects.db)
+        result.events += len(batch)
+        result.messages += len(entries)
+        result.batches += 1
+
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def _claim_batch(batch_size, claim_timeout):
+    """Claim the oldest ``batch_size`` unclaimed events, returning them in order with the claim's token."""
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    claimable = Q(claimed_by__isnull=True) | Q(claimed_at__lt=now - datetime.timedelta(seconds=claim_timeout))
+    oldest = OutboxEvent.objects.filter(claimable).order_by('pk').values('pk')[:batch_size]
+    # Written before anything is sent; checking claimable again keeps a dispatcher that
+    # waited on another one's row locks from taking the rows it just claimed
+    if not OutboxEvent.objects.filter(claimable, pk__in=oldest).update(claimed_by=token, claimed_at=now):
+        return [], token
+    return list(OutboxEvent.objects.filter(claimed_by=token).order_by('pk')), token
+
+
+def coalesce(entries):
+    """
+    Merge a batch's availability events for the same topics into the first of them.
+
+    Model events pass through untouched and in order; the merged event keeps
+    each slot's latest state, as the later events would have left it.
+    """
+    from .subscriptions import AVAILABILITY_CHANGED
+
+    merged, availability = [], {}
+    for topics, frame in entries:
+        operation, data = msgpack.unpackb(frame, timestamp=3)[3:]
+        if operation != AVAILABILITY_CHANGED:
+            merged.append((topics, frame))
+            continue
+        key = tuple(topics)
+        if key not in availability:
+            availability[key] = (len(merged), {})
+            merged.append(None)
+        availability[key][1].update((slot_id, is_booked) for slot_id, is_booked in data)
+    for topics, (index, deltas) in availability.items():
+        event = SubscriptionEvent(AVAILABILITY_CHANGED, sorted(map(list, deltas.items())))
+        merged[index] = (list(topics), encode_event(event))
+    return merged
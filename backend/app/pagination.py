@@ -0,0 +1,80 @@
+import base64
+import datetime
+
+from django.db.models import F, Q
+from graphene.relay import PageInfo
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(start_time, pk):
+    value = f"{start_time.isoformat() if start_time else ''}|{pk}"
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        start_time, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return (datetime.datetime.fromisoformat(start_time) if start_time else None), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor '{cursor}'.")
+
+
+def keyset_filter(field, start_time, pk, forward):
+    """
+    Match rows strictly after (forward) or before the (field, pk) key.
+
+    Rows are ordered by field with NULLs first, which is where bookings
+    without a slot end up.
+    """
+    op = 'gt' if forward else 'lt'
+    is_null = Q(**{f'{field}__isnull': True})
+    if start_time is None:
+        same_key = is_null & Q(**{f'pk__{op}': pk})
+        return same_key | ~is_null if forward else same_key
+    keyset = Q(**{f'{field}__{op}': start_time}) | Q(**{field: start_time, f'pk__{op}': pk})
+    return keyset if forward else keyset | is_null
+
+
+def paginate(queryset, connection_type, field, first=None, after=None, last=None, before=None):
+    """
+    Slice a queryset into a Relay connection using keyset pagination on (field, pk).
+
+    Each page is a range scan that starts from the cursor key, so the cost of a
+    page does not grow with how deep into the table it is.
+    """
+    if first is not None and last is not None:
+        raise ValueError("Pass either 'first' or 'last', not both.")
+    for name, value in (('first', first), ('last', last)):
+        if value is not None and value < 0:
+            raise ValueError(f"'{name}' must not be negative.")
+
+    forward = last is None
+    requested = first if forward else last
+    limit = DEFAULT_PAGE_SIZE if requested is None else min(requested, MAX_PAGE_SIZE)
+
+    if after:
+        queryset = queryset.filter(keyset_filter(field, *decode_cursor(after), forward=True))
+    if before:
+        queryset = queryset.filter(keyset_filter(field, *decode_cursor(before), forward=False))
+
+    if forward:
+        ordering = (F(field).asc(nulls_first=True), 'pk')
+    else:
+        ordering = (F(field).desc(nulls_last=True), '-pk')
+    rows = list(queryset.annotate(cursor_key=F(field)).order_by(*ordering)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not forward:
+        rows.reverse()
+
+    edges = [connection_type.Edge(node=row, cursor=encode_cursor(row.cursor_key, row.pk)) for row in rows]
+    page_info = PageInfo(
+        start_cursor=edges[0].cursor if edges else None,
+        end_cursor=edges[-1].cursor if edges else None,
+        has_next_page=has_more if forward else bool(before),
+        has_previous_page=bool(after) if forward else has_more,
+    )
+    return connection_type(edges=edges, page_info=page_info)
+
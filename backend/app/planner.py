@@ -0,0 +1,180 @@
+"""
+Querysets shaped by what a GraphQL query selects.
+
+plan_queryset() walks the selection set below a resolver's field (through
+fragments, honouring @skip and @include) and applies it to the resolver's
+queryset:
+
+- only() the columns behind the selected fields, so ``allBookings {
+  bookingId status }`` leaves the booker's name, email and phone unread;
+- select_related() the selected forward foreign keys, such as a booking's
+  slot, one JOIN instead of a DataLoader batch;
+- prefetch_related() the selected reverse relations, such as a slot's
+  bookings, one query per relation, projected by its own selection.
+
+Fields without a model field behind them take their columns from
+COMPUTED_FIELDS; a field missing from both loads every column of its model,
+as without planning.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_camel_case
+from graphql.language import ast
+from graphql.type import GraphQLBoolean
+from graphql.type.definition import get_named_type
+from graphql.utils.value_from_ast import value_from_ast
+
+# Columns read by resolvers and properties that are not model fields, by model label and field name
+COMPUTED_FIELDS = {
+    'app.Slot': {'remaining_capacity': ('capacity', 'booked_count')},
+}
+
+
+class Plan:
+    """The columns and relations of one model that a selection needs; ``columns`` None means all."""
+
+    def __init__(self, model):
+        self.model = model
+        self.columns = {model._meta.pk.name}
+        self.joined = {}
+        self.prefetched = {}
+
+    def add(self, *names):
+        if self.columns is not None:
+            self.columns.update(names)
+
+    def merge(self, other):
+        if self.columns is None or other.columns is None:
+            self.columns = None
+        else:
+            self.columns |= other.columns
+        for plans, others in ((self.joined, other.joined), (self.prefetched, other.prefetched)):
+            for name, plan in others.items():
+                plans.setdefault(name, Plan(plan.model)).merge(plan)
+
+    def field_names(self):
+        if self.columns is None:
+            return [field.name for field in self.model._meta.concrete_fields]
+        return sorted(self.columns)
+
+
+def plan_queryset(queryset, info, *path):
+    """
+    Apply the selection of the field being resolved to ``queryset``.
+
+    ``path`` names the fields between that field and the model's type, such
+    as ``'edges', 'node'`` for a Relay connection.
+    """
+    nodes, graphql_type = info.field_asts, get_named_type(info.return_type)
+    for name in path:
+        nodes = [child for node in nodes for child in _selected_fields(info, node) if child.name.value == name]
+        graphql_type = get_named_type(graphql_type.fields[name].type)
+    return apply_plan(queryset, _plan(info, queryset.model, graphql_type, nodes))
+
+
+def apply_plan(queryset, plan):
+    only, related, prefetches = _lookups(plan)
+    if related:
+        queryset = queryset.select_related(*related)
+    queryset = queryset.only(*only)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    return queryset
+
+
+def _lookups(plan, prefix=''):
+    only = [prefix + name for name in plan.field_names()]
+    related, prefetches = [], []
+    for name, joined in plan.joined.items():
+        related.append(prefix + name)
+        more_only, more_related, more_prefetches = _lookups(joined, f'{prefix}{name}__')
+        only += more_only
+        related += more_related
+        prefetches += more_prefetches
+    for name, prefetched in plan.prefetched.items():
+        # In primary key order, as the DataLoaders return them
+        queryset = apply_plan(prefetched.model.objects.order_by('pk'), prefetched)
+        prefetches.append(Prefetch(prefix + name, queryset=queryset))
+    return only, related, prefetches
+
+
+def _plan(info, model, graphql_type, nodes):
+    plan = Plan(model)
+    names = _python_names(graphql_type.graphene_type)
+    computed = COMPUTED_FIELDS.get(model._meta.label, {})
+    for node in nodes:
+        for child in _selected_fields(info, node):
+            graphql_name = child.name.value
+            if graphql_name.startswith('__'):
+                continue
+            name = names.get(graphql_name)
+            try:
+                field = model._meta.get_field(name) if name else None
+            except FieldDoesNotExist:
+                field = None
+
+            if field is None:
+                if name in computed:
+                    plan.add(*computed[name])
+                else:
+                    plan.columns = None
+            elif field.many_to_one:
+                plan.add(field.name)
+                joined = _plan(info, field.related_model, get_named_type(graphql_type.fields[graphql_name].type),
+                               [child])
+                plan.joined.setdefault(field.name, Plan(field.related_model)).merge(joined)
+            elif field.one_to_many:
+                prefetched = _plan(info, field.related_model, get_named_type(graphql_type.fields[graphql_name].type),
+                                   [child])
+                # Prefetching matches rows on the foreign key and points it back at the parent,
+                # so what is selected through it is read from the parent row
+                prefetched.add(field.field.name)
+                parent = prefetched.joined.pop(field.field.name, None)
+                if parent is not None:
+                    plan.merge(parent)
+                plan.prefetched.setdefault(field.get_accessor_name(), Plan(field.related_model)).merge(prefetched)
+            elif field.concrete:
+                plan.add(field.name)
+            else:
+                plan.columns = None
+    return plan
+
+
+def _selected_fields(info, node):
+    """The Field nodes selected below ``node``, with fragments expanded and skipped fields left out."""
+    if node.selection_set is None:
+        return
+    for selection in node.selection_set.selections:
+        if not _included(info, selection):
+            continue
+        if isinstance(selection, ast.Field):
+            yield selection
+        elif isinstance(selection, ast.FragmentSpread):
+            yield from _selected_fields(info, info.fragments[selection.name.value])
+        else:
+            yield from _selected_fields(info, selection)
+
+
+def _included(info, selection):
+    for directive in selection.directives or ():
+        if directive.name.value not in ('skip', 'include'):
+            continue
+        condition = next(argument.value for argument in directive.arguments if argument.name.value == 'if')
+        if value_from_ast(condition, GraphQLBoolean, info.variable_values) == (directive.name.value == 'skip'):
+            return False
+    return True
+
+
+_python_name_maps = {}
+
+
+def _python_names(graphene_type):
+    # {GraphQL field name: graphene attribute name}, the reverse of graphene's auto camel-casing
+    names = _python_name_maps.get(graphene_type)
+    if names is None:
+        names = _python_name_maps[graphene_type] = {
+            # graphene-django's relation fields are Dynamic, which take no explicit name
+            getattr(field, 'name', None) or to_camel_case(name): name
+            for name, field in graphene_type._meta.fields.items()
+        }
+    return names
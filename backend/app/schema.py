@@ -1,80 +1,233 @@
 import graphene
-import datetime
 from graphene_django.types import DjangoObjectType
-from .models import Booking, Slot
+from .models import ArchivedBooking, ArchivedSlot, Booking, DailyAvailability, Slot
+from .services import (
+    cancel_booking, confirm_booking, delete_booking, hold_slot, lock_for_write, reserve_slot, reserve_slots,
+)
+from .loaders import get_loaders
+from .pagination import paginate
+from .planner import plan_queryset
+from .dates import local_day_range, parse_date
+from .cache import get_availability_cache
+from .daily_availability import calendar_days
+from .db import primary_reads
+from .subscriptions import availability_topic, booking_topic
 from graphene_subscriptions.events import CREATED, UPDATED, DELETED
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import F
+from graphql import GraphQLError
 
 
 class SlotType(DjangoObjectType):
+    remaining_capacity = graphene.Int(required=True)
+
     class Meta:
         model = Slot
+
+    def resolve_bookings(self, info):
+        # Prefetched when the slot came from a planned queryset (see app.planner)
+        if 'bookings' in getattr(self, '_prefetched_objects_cache', {}):
+            return self.bookings.all()
+        # Batched per request so a list of slots costs one bookings query
+        return get_loaders(info).bookings_by_slot.load(self.pk)
+
 # Define the BookingType which is a representation of the Booking model in GraphQL
 class BookingType(DjangoObjectType):
     class Meta:
         model = Booking
 
+    def resolve_slot(self, info):
+        # Batched per request so a list of bookings costs one slot query
+        if self.slot_id is None:
+            return None
+        # Mutations and planned querysets return bookings with their slot already attached
+        if Booking.slot.is_cached(self):
+            return self.slot
+        return get_loaders(info).slot.load(self.slot_id)
+
+class SlotConnection(graphene.relay.Connection):
+    class Meta:
+        node = SlotType
+
+class BookingConnection(graphene.relay.Connection):
+    class Meta:
+        node = BookingType
+
+# Past slots and bookings moved out of the hot tables by app.archive; their
+# primary keys are plain integer columns, exposed as IDs like the live types'
+class ArchivedSlotType(DjangoObjectType):
+    id = graphene.ID(required=True)
+
+    class Meta:
+        model = ArchivedSlot
+
+class ArchivedBookingType(DjangoObjectType):
+    id = graphene.ID(required=True)
+
+    class Meta:
+        model = ArchivedBooking
+
+class ArchivedBookingConnection(graphene.relay.Connection):
+    class Meta:
+        node = ArchivedBookingType
+
 # Subscription for when a booking is created
 class BookingCreatedSubscription(graphene.ObjectType):
-    booking_created = graphene.Field(BookingType)
+    booking_created = graphene.Field(BookingType, date=graphene.String())
 
-    def resolve_booking_created(root, info):
-        return root.filter(
-            lambda event:
-                event.operation == CREATED and
-                isinstance(event.instance, Booking)
-        ).map(lambda event: event.instance)
+    def resolve_booking_created(root, info, date=None):
+        # Only the topic's channel group is joined, so no per-event filtering is needed
+        topic = booking_topic(CREATED, date=parse_date(date) if date else None)
+        return root.topic(topic).map(lambda event: event.instance)
 
 # Subscription for when a booking is updated
 class BookingUpdatedSubscription(graphene.ObjectType):
-    booking_updated = graphene.Field(BookingType)
+    booking_updated = graphene.Field(BookingType, date=graphene.String(), booking_id=graphene.ID())
 
-    def resolve_booking_updated(root, info):
-        return root.filter(
-            lambda event: 
-                event.operation == UPDATED and
-                isinstance(event.instance, Booking)
-        ).map(lambda event: event.instance)
+    def resolve_booking_updated(root, info, date=None, booking_id=None):
+        topic = booking_topic(UPDATED, date=parse_date(date) if date else None, booking_id=booking_id)
+        return root.topic(topic).map(lambda event: event.instance)
 
 # Subscription for when a booking is deleted
 class BookingDeletedSubscription(graphene.ObjectType):
-    booking_deleted = graphene.Field(BookingType)
-
-    def resolve_booking_deleted(root, info):
-        return root.filter(
-            lambda event: 
-                event.operation == DELETED and
-                isinstance(event.instance, Booking)
-        ).map(lambda event: event.instance)
+    booking_deleted = graphene.Field(BookingType, date=graphene.String(), booking_id=graphene.ID())
+
+    def resolve_booking_deleted(root, info, date=None, booking_id=None):
+        topic = booking_topic(DELETED, date=parse_date(date) if date else None, booking_id=booking_id)
+        return root.topic(topic).map(lambda event: event.instance)
+
+# A single slot's new state in a slotAvailabilityChanged message
+class SlotAvailabilityDelta(graphene.ObjectType):
+    slot_id = graphene.ID(required=True)
+    is_booked = graphene.Boolean(required=True)
+
+# Subscription for availability changes on one day, coalesced into batches of deltas
+class SlotAvailabilityChangedSubscription(graphene.ObjectType):
+    slot_availability_changed = graphene.List(
+        graphene.NonNull(SlotAvailabilityDelta), date=graphene.String(required=True)
+    )
+
+    def resolve_slot_availability_changed(root, info, date):
+        topic = availability_topic(parse_date(date))
+        return root.topic(topic).map(lambda event: [
+            SlotAvailabilityDelta(slot_id=slot_id, is_booked=is_booked) for slot_id, is_booked in event.instance
+        ])
+
+# Slot counts for one day of availabilityCalendar
+class DayAvailability(DjangoObjectType):
+    class Meta:
+        model = DailyAvailability
+        fields = ('date', 'total_slots', 'open_slots')
+
+class AvailabilityCalendar(graphene.ObjectType):
+    days = graphene.List(graphene.NonNull(DayAvailability), required=True)
+    day = graphene.Date(description="The day passed to availabilityCalendar, if any.")
+    open_slots = graphene.List(graphene.NonNull(SlotType), description="Open slots on `day`, in start order.")
+
+    def resolve_open_slots(self, info):
+        # Only queried when the client asks for the chosen day's slots
+        return available_slots(self.day) if self.day else None
+
+def available_slots(date):
+    # Compare start_time against the day's bounds in the configured timezone
+    # instead of start_time__date, which converts every row and cannot use an index
+    day_start, day_end = local_day_range(date)
+    # The seats-left condition matches slot_open_start_idx, which holds only bookable slots
+    def load():
+        # Cached until the next write to the day, so read from the primary that write went to;
+        # a lagging replica could otherwise be cached as the state after it
+        with primary_reads():
+            return list(Slot.objects.filter(
+                is_booked=False, booked_count__lt=F('capacity'), start_time__gte=day_start, start_time__lt=day_end
+            ).order_by('start_time'))
+    return get_availability_cache().get_or_load(date, load)
+
+def filter_by_start_time(queryset, field, date_from=None, date_to=None):
+    # Date bounds are whole days in the configured timezone, both inclusive
+    if date_from is not None:
+        queryset = queryset.filter(**{f'{field}__gte': local_day_range(date_from)[0]})
+    if date_to is not None:
+        queryset = queryset.filter(**{f'{field}__lt': local_day_range(date_to)[1]})
+    return queryset
 
 # GraphQL query to fetch all bookings
 class Query(graphene.ObjectType):
     all_bookings = graphene.List(BookingType)
     all_slots = graphene.List(SlotType)
+    # Keyset-paginated alternatives to the unbounded lists above
+    bookings = graphene.relay.ConnectionField(
+        BookingConnection,
+        date_from=graphene.Date(),
+        date_to=graphene.Date(),
+        status=graphene.String(),
+    )
+    slots = graphene.relay.ConnectionField(
+        SlotConnection,
+        date_from=graphene.Date(),
+        date_to=graphene.Date(),
+        is_booked=graphene.Boolean(),
+    )
+    # Bookings archived with their slots, kept out of every query above
+    archived_bookings = graphene.relay.ConnectionField(
+        ArchivedBookingConnection,
+        date_from=graphene.Date(),
+        date_to=graphene.Date(),
+        booking_id=graphene.ID(),
+    )
     available_slots = graphene.List(SlotType, date=graphene.String(required=True))
+    # Per-day counts for a date range in one query, plus optionally one day's open slots
+    availability_calendar = graphene.Field(
+        AvailabilityCalendar,
+        required=True,
+        date_from=graphene.Date(required=True, name='from'),
+        date_to=graphene.Date(required=True, name='to'),
+        day=graphene.Date(),
+    )
     booking_by_id = graphene.Field(BookingType, booking_id=graphene.ID(required=True))
 
+    # Booking and Slot querysets read only the columns and relations the query selects
     def resolve_all_bookings(self, info, **kwargs):
-        return Booking.objects.all()
+        return plan_queryset(Booking.objects.all(), info)
 
     def resolve_all_slots(self, info, **kwargs):
-        return Slot.objects.all()
+        return plan_queryset(Slot.objects.all(), info)
+
+    def resolve_bookings(self, info, date_from=None, date_to=None, status=None, **kwargs):
+        queryset = filter_by_start_time(Booking.objects.all(), 'slot__start_time', date_from, date_to)
+        if status is not None:
+            queryset = queryset.filter(status=status.lower())
+        return paginate(plan_queryset(queryset, info, 'edges', 'node'), BookingConnection, 'slot__start_time', **kwargs)
+
+    def resolve_slots(self, info, date_from=None, date_to=None, is_booked=None, **kwargs):
+        queryset = filter_by_start_time(Slot.objects.all(), 'start_time', date_from, date_to)
+        if is_booked is not None:
+            queryset = queryset.filter(is_booked=is_booked)
+        return paginate(plan_queryset(queryset, info, 'edges', 'node'), SlotConnection, 'start_time', **kwargs)
 
-    def resolve_booking_by_booking_id(self, info, booking_id):
+    def resolve_archived_bookings(self, info, date_from=None, date_to=None, booking_id=None, **kwargs):
+        queryset = filter_by_start_time(ArchivedBooking.objects.select_related('slot'), 'slot__start_time',
+                                        date_from, date_to)
+        if booking_id is not None:
+            queryset = queryset.filter(booking_id=booking_id)
+        return paginate(queryset, ArchivedBookingConnection, 'slot__start_time', **kwargs)
+
+    def resolve_booking_by_id(self, info, booking_id):
         try:
-            return Booking.objects.get(booking_id=booking_id)
+            return plan_queryset(Booking.objects.all(), info).get(booking_id=booking_id)
         except ObjectDoesNotExist:
             return None
 
     def resolve_available_slots(self, info, date, **kwargs):
         # Convert the provided date string to a datetime object
-        try:
-            date_obj = datetime.datetime.strptime(date, "%Y-%m-%d").date()
-        except ValueError:
-            raise ValueError("Invalid date format. Please provide the date in YYYY-MM-DD format.")
+        return available_slots(parse_date(date))
 
-        # Filter slots based on the provided date and whether they are booked or not
-        return Slot.objects.filter(start_time__date=date_obj, is_booked=False)
+    def resolve_availability_calendar(self, info, date_from, date_to, day=None):
+        try:
+            days = calendar_days(date_from, date_to)
+        except ValueError as error:
+            raise GraphQLError(str(error))
+        return AvailabilityCalendar(days=days, day=day)
 
 
 # GraphQL mutation to create a booking
@@ -91,18 +244,89 @@ class CreateBooking(graphene.Mutation):
 
     @staticmethod
     def mutate(root, info, booker_first_name, booker_last_name, booker_email, booker_phone, slot_id, status):
-        slot = Slot.objects.get(pk=slot_id)
-        booking = Booking(
+        # The slot is claimed atomically, so concurrent requests for the same
+        # slot cannot both succeed
+        booking = reserve_slot(
+            slot_id,
             booker_first_name=booker_first_name,
             booker_last_name=booker_last_name,
             booker_email=booker_email,
             booker_phone=booker_phone,
-            slot=slot,
             status=status
         )
-        booking.save()
         return CreateBooking(booking=booking)
 
+# One booking in a createBookings batch
+class BookingInput(graphene.InputObjectType):
+    booker_first_name = graphene.String(required=True)
+    booker_last_name = graphene.String(required=True)
+    booker_email = graphene.String(required=True)
+    booker_phone = graphene.String(required=True)
+    slot_id = graphene.ID(required=True)
+    status = graphene.String(required=True)
+
+# Outcome of one input item; exactly one of booking and error is set
+class BookingResult(graphene.ObjectType):
+    index = graphene.Int(required=True)
+    booking = graphene.Field(BookingType)
+    error = graphene.String()
+
+# GraphQL mutation to create several bookings in one transaction
+class CreateBookings(graphene.Mutation):
+    results = graphene.List(graphene.NonNull(BookingResult))
+    success = graphene.Boolean()
+
+    class Arguments:
+        input = graphene.List(graphene.NonNull(BookingInput), required=True)
+        # When false, valid items are booked even if others in the batch fail
+        all_or_nothing = graphene.Boolean(default_value=True)
+
+    @staticmethod
+    def mutate(root, info, input, all_or_nothing):
+        results = reserve_slots([dict(item) for item in input], all_or_nothing=all_or_nothing)
+        return CreateBookings(
+            results=[BookingResult(index=index, booking=result.booking, error=result.error)
+                     for index, result in enumerate(results)],
+            success=all(result.error is None for result in results),
+        )
+
+# GraphQL mutation to hold a slot for SLOT_HOLD_TTL seconds while the booker fills in their details
+class HoldSlot(graphene.Mutation):
+    booking = graphene.Field(BookingType)
+
+    class Arguments:
+        slot_id = graphene.ID(required=True)
+
+    @staticmethod
+    def mutate(root, info, slot_id):
+        # The pending booking's bookingId is what confirmBooking takes
+        return HoldSlot(booking=hold_slot(slot_id))
+
+# GraphQL mutation to turn a hold into a confirmed booking before it expires
+class ConfirmBooking(graphene.Mutation):
+    booking = graphene.Field(BookingType)
+
+    class Arguments:
+        booking_id = graphene.ID(required=True)
+        booker_first_name = graphene.String(required=True)
+        booker_last_name = graphene.String(required=True)
+        booker_email = graphene.String(required=True)
+        booker_phone = graphene.String(required=True)
+
+    @staticmethod
+    def mutate(root, info, booking_id, booker_first_name, booker_last_name, booker_email, booker_phone):
+        try:
+            booking = confirm_booking(
+                booking_id,
+                booker_first_name=booker_first_name,
+                booker_last_name=booker_last_name,
+                booker_email=booker_email,
+                booker_phone=booker_phone,
+            )
+        except Booking.DoesNotExist:
+            raise GraphQLError('Booking not found')
+        return ConfirmBooking(booking=booking)
+
 # GraphQL mutation to delete a booking
 class DeleteBooking(graphene.Mutation):
     class Arguments:
@@ -113,8 +337,7 @@ class DeleteBooking(graphene.Mutation):
     @staticmethod
     def mutate(root, info, id):
         try:
-            booking = Booking.objects.get(pk=id)
-            booking.delete()
+            delete_booking(id)
             return DeleteBooking(success=True)
         except Booking.DoesNotExist:
             raise GraphQLError('Booking not found')
@@ -123,12 +346,15 @@ class CreateSlot(graphene.Mutation):
     class Arguments:
         start_time = graphene.DateTime(required=True)
         end_time = graphene.DateTime(required=True)
+        capacity = graphene.Int(default_value=1)
 
     slot = graphene.Field(SlotType)
 
     @staticmethod
-    def mutate(root, info, start_time, end_time):
-        slot = Slot(start_time=start_time, end_time=end_time)
+    def mutate(root, info, start_time, end_time, capacity):
+        if capacity < 1:
+            raise GraphQLError('Capacity must be at least 1.')
+        slot = Slot(start_time=start_time, end_time=end_time, capacity=capacity)
         slot.save()
         return CreateSlot(slot=slot)
 
@@ -138,19 +364,34 @@ class UpdateSlot(graphene.Mutation):
         start_time = graphene.DateTime()
         end_time = graphene.DateTime()
         is_booked = graphene.Boolean()
+        capacity = graphene.Int()
 
     slot = graphene.Field(SlotType)
 
     @staticmethod
-    def mutate(root, info, id, start_time=None, end_time=None, is_booked=None):
-        slot = Slot.objects.get(pk=id)
-        if start_time:
-            slot.start_time = start_time
-        if end_time:
-            slot.end_time = end_time
-        if is_booked is not None:
-            slot.is_booked = is_booked
-        slot.save()
+    def mutate(root, info, id, start_time=None, end_time=None, is_booked=None, capacity=None):
+        with transaction.atomic():
+            # Locked so the booked_count this save writes back is the current one
+            lock_for_write(Slot.objects.filter(pk=id), 'capacity')
+            slot = Slot.objects.get(pk=id)
+            if start_time:
+                slot.start_time = start_time
+            if end_time:
+                slot.end_time = end_time
+            if capacity is not None:
+                if capacity < max(slot.booked_count, 1):
+                    raise GraphQLError(f'Capacity must be at least 1 and cover the {slot.booked_count} booked seats.')
+                slot.capacity = capacity
+                slot.is_booked = slot.booked_count >= capacity
+            # is_booked follows the seats taken, as app.services keeps it; a
+            # value disagreeing with them would make the daily counts and
+            # availableSlots disagree about the slot
+            if is_booked is not None and is_booked != slot.is_booked:
+                raise GraphQLError(
+                    f'The slot is {"full" if slot.is_booked else "not full"} with {slot.booked_count} of '
+                    f'{slot.capacity} seats booked; change its capacity or bookings instead.'
+                )
+            slot.save()
         return UpdateSlot(slot=slot)
 
 class DeleteSlot(graphene.Mutation):
@@ -178,15 +419,8 @@ class CancelBooking(graphene.Mutation):
     @staticmethod
     def mutate(root, info, id):
         try:
-            booking = Booking.objects.get(pk=id)
-            booking.status = 'cancelled'
-            booking.save()
-            
-            # Free up the slot
-            if booking.slot:
-                booking.slot.is_booked = False
-                booking.slot.save()
-                
+            # The slot is freed by the same transaction, unless another booking holds it
+            booking = cancel_booking(id)
             return CancelBooking(success=True, booking=booking)
         except Booking.DoesNotExist:
             return CancelBooking(success=False, booking=None)
@@ -194,6 +428,9 @@ class CancelBooking(graphene.Mutation):
 # Aggregating all mutations
 class Mutation(graphene.ObjectType):
     create_booking = CreateBooking.Field()
+    create_bookings = CreateBookings.Field()
+    hold_slot = HoldSlot.Field()
+    confirm_booking = ConfirmBooking.Field()
     delete_booking = DeleteBooking.Field()
     cancel_booking = CancelBooking.Field()
     create_slot = CreateSlot.Field()
@@ -202,7 +439,8 @@ class Mutation(graphene.ObjectType):
 
 
 # Aggregating all subscriptions
-class Subscription(BookingCreatedSubscription, BookingUpdatedSubscription, BookingDeletedSubscription, graphene.ObjectType):
+class Subscription(BookingCreatedSubscription, BookingUpdatedSubscription, BookingDeletedSubscription,
+                   SlotAvailabilityChangedSubscription, graphene.ObjectType):
     pass
 
 # Creating the overall schema for GraphQL
@@ -0,0 +1,363 @@
+import datetime
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import BooleanField, Case, ExpressionWrapper, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from graphene_subscriptions.events import CREATED, UPDATED
+
+from .cache import invalidate_availability
+from .daily_availability import adjust_day_counts
+from .models import Booking, Slot
+from .subscriptions import booking_event, notify_availability_changes, publish_booking_saved, publish_many
+
+# Upper bound on one reserve_slots call, so a single request cannot lock the whole calendar
+MAX_BATCH_SIZE = 100
+
+# Bookings that hold a seat; cancelled, denied and expired ones give it back
+ACTIVE_STATUSES = ('confirmed', 'pending')
+
+# Expired holds released per release_expired_holds transaction
+HOLD_SWEEP_BATCH_SIZE = 500
+
+# Current time for holds; tests swap in a controllable clock
+clock = timezone.now
+
+
+class SlotUnavailable(ValidationError):
+    """Raised when a slot has already been claimed by another booking."""
+
+
+class HoldExpired(ValidationError):
+    """Raised when confirming a hold whose time ran out."""
+
+
+@dataclass
+class ReservationResult:
+    booking: Booking = None
+    error: str = None
+
+
+def reserve_slot(slot_id, **booking_fields):
+    """
+    Take a seat on a slot and create its booking in one transaction.
+
+    The seat is taken with a compare-and-set ``UPDATE ... SET booked_count =
+    booked_count + 1 WHERE booked_count < capacity``, so concurrent callers
+    cannot take more seats than there are: once the slot is full every
+    further UPDATE matches no row. The check constraint on booked_count backs
+    this up at the database level.
+    """
+    _check_status(booking_fields.get('status'))
+    # Validated like each item of reserve_slots, before a seat is taken; a hold
+    # leaves the booker's details to confirm_booking, so only given fields are checked
+    booking = Booking(**booking_fields)
+    booking.clean_fields(exclude=[field.name for field in Booking._meta.fields if field.name not in booking_fields])
+    with transaction.atomic():
+        claimed = _take_seat(slot_id)
+        # A hold that ran out but has not been swept yet does not block the slot
+        if not claimed and release_expired_holds(slot_ids=[slot_id]):
+            claimed = _take_seat(slot_id)
+        if not claimed:
+            # Only the losing path pays for telling "missing" apart from "taken"
+            if not Slot.objects.filter(pk=slot_id).exists():
+                raise Slot.DoesNotExist('Slot not found')
+            raise SlotUnavailable('This slot is already booked.')
+
+        # Loaded after the claim so the booking carries the slot's current state
+        # and neither the events nor the response query it again
+        slot = Slot.objects.get(pk=slot_id)
+        # The claim only matches slots that had a seat left
+        slot._loaded_is_booked = False
+        booking.slot = slot
+        booking.save()
+        _slots_changed([slot])
+    return booking
+
+
+def hold_slot(slot_id, ttl=None, **booking_fields):
+    """
+    Claim a slot for a pending booking that expires after ``ttl`` seconds.
+
+    The claim is the same compare-and-set as reserve_slot. Until the hold is
+    confirmed with confirm_booking or runs out, nobody else can book the slot;
+    after that release_expired_holds gives it back.
+    """
+    ttl = settings.SLOT_HOLD_TTL if ttl is None else ttl
+    return reserve_slot(slot_id, status='pending', hold_expires_at=clock() + datetime.timedelta(seconds=ttl),
+                        **booking_fields)
+
+
+def confirm_booking(booking_id, **booking_fields):
+    """
+    Turn an unexpired hold into a confirmed booking, filling in the booker's details.
+
+    The status change is one conditional UPDATE on the hold still being
+    pending and unexpired, so it cannot interleave with the sweeper.
+    """
+    booking = Booking.objects.select_related('slot').get(booking_id=booking_id)
+    for field, value in booking_fields.items():
+        setattr(booking, field, value)
+    booking.clean_fields(exclude=['slot'])
+
+    fields = {field: getattr(booking, field) for field in booking_fields}
+    with transaction.atomic():
+        # Pending bookings without a deadline predate holds and never expire
+        confirmed = Booking.objects.filter(
+            Q(hold_expires_at__isnull=True) | Q(hold_expires_at__gt=clock()), pk=booking.pk, status='pending'
+        ).update(status='confirmed', hold_expires_at=None, **fields)
+        if not confirmed:
+            if booking.status in ('pending', 'expired'):
+                raise HoldExpired('This hold has expired.')
+            raise ValidationError('Only pending bookings can be confirmed.')
+        booking.status, booking.hold_expires_at = 'confirmed', None
+        # update() skips post_save, so bookingUpdated subscribers are told here
+        publish_booking_saved(Booking, booking, created=False)
+    return booking
+
+
+def release_expired_holds(now=None, slot_ids=None, batch_size=HOLD_SWEEP_BATCH_SIZE):
+    """
+    Expire holds past their deadline and give their slots back.
+
+    Holds are found oldest first through the partial index on pending
+    bookings' hold_expires_at, so each call reads only what it expires. Up to
+    ``batch_size`` holds are handled per call; returns how many expired.
+    """
+    now = now or clock()
+    with transaction.atomic():
+        holds = Booking.objects.filter(status='pending', hold_expires_at__lte=now)
+        if slot_ids is not None:
+            holds = holds.filter(slot_id__in=slot_ids)
+        # Locked, skipping rows another sweeper has, so each hold gives its seat back once
+        pks = list(holds.select_for_update(skip_locked=True).order_by('hold_expires_at')
+                   .values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return 0
+        # Conditional again, so a hold confirmed since the SELECT is left alone
+        Booking.objects.filter(pk__in=pks, status='pending', hold_expires_at__lte=now).update(status='expired')
+        expired = list(Booking.objects.select_related('slot').filter(pk__in=pks, status='expired'))
+        _release_seats(Counter(booking.slot_id for booking in expired if booking.slot_id), expired)
+        # Loaded after the UPDATE, so the status change is named explicitly
+        publish_many([booking_event(UPDATED, booking, changed=['status']) for booking in expired])
+    return len(expired)
+
+
+def next_hold_expiry():
+    """When the earliest pending hold runs out, or None without holds."""
+    return Booking.objects.filter(status='pending', hold_expires_at__isnull=False).order_by(
+        'hold_expires_at').values_list('hold_expires_at', flat=True).first()
+
+
+def lock_for_write(queryset, field):
+    """
+    Lock ``queryset``'s rows for the rest of the transaction with an UPDATE
+    setting ``field`` to itself.
+
+    Elsewhere this locks the rows like select_for_update(). SQLite has no row
+    locks, and a transaction there that reads before its first write fails at
+    once with "database is locked" when another writer commits in between;
+    writing first takes the database's write lock, waiting up to busy_timeout
+    for it, as reserve_slot's claim does.
+    """
+    return queryset.update(**{field: F(field)})
+
+
+def cancel_booking(booking_pk):
+    """Mark a booking cancelled and give back the seat it held."""
+    with transaction.atomic():
+        # Locked so two concurrent cancellations cannot both give the seat back
+        lock_for_write(Booking.objects.filter(pk=booking_pk), 'status')
+        booking = Booking.objects.select_related('slot').get(pk=booking_pk)
+        held_seat = booking.slot_id and booking.status in ACTIVE_STATUSES
+        booking.status = 'cancelled'
+        booking.save(update_fields=['status'])
+        if held_seat:
+            _release_seats({booking.slot_id: 1}, [booking])
+    return booking
+
+
+def delete_booking(booking_pk):
+    """Delete a booking and give back the seat it held."""
+    with transaction.atomic():
+        lock_for_write(Booking.objects.filter(pk=booking_pk), 'status')
+        booking = Booking.objects.select_related('slot').get(pk=booking_pk)
+        held_seat = booking.slot_id and booking.status in ACTIVE_STATUSES
+        booking.delete()
+        if held_seat:
+            _release_seats({booking.slot_id: 1}, [booking])
+    return booking
+
+
+def reserve_slots(items, all_or_nothing=True):
+    """
+    Create a batch of bookings in one transaction.
+
+    Each item holds a ``slot_id`` plus the Booking fields; items may share a
+    slot while it has seats left. The slots are locked with one ``SELECT ...
+    FOR UPDATE``, every item is validated in memory, the seats are taken with
+    one conditional UPDATE and the bookings are written with one bulk_create,
+    so the query count does not grow with the batch.
+
+    With ``all_or_nothing`` a single invalid item means nothing is written;
+    otherwise the valid items are booked and the rest report their error.
+    Returns one ReservationResult per item, in input order.
+    """
+    if len(items) > MAX_BATCH_SIZE:
+        raise ValidationError(f'At most {MAX_BATCH_SIZE} bookings can be created at once.')
+
+    results = [ReservationResult() for _ in items]
+    with transaction.atomic():
+        slot_ids = [_slot_pk(item['slot_id']) for item in items]
+        slots = Slot.objects.select_for_update().in_bulk([pk for pk in slot_ids if pk is not None])
+
+        bookings = []
+        seats = Counter()
+        for index, (item, slot_id) in enumerate(zip(items, slot_ids)):
+            slot = slots.get(slot_id)
+            if slot is None:
+                results[index].error = 'Slot not found'
+            elif slot.is_booked or slot.booked_count + seats[slot_id] >= slot.capacity:
+                results[index].error = 'This slot is already booked.'
+            else:
+                fields = {key: value for key, value in item.items() if key != 'slot_id'}
+                booking = Booking(slot=slot, **fields)
+                booking.booking_id = booking.generate_booking_id()
+                try:
+                    _check_status(booking.status)
+                    booking.clean_fields(exclude=['slot'])
+                except ValidationError as error:
+                    results[index].error = '; '.join(
+                        f'{field}: {message}' for field, messages in error.message_dict.items() for message in messages
+                    )
+                else:
+                    bookings.append((index, booking))
+                    seats[slot_id] += 1
+
+        if not bookings or (all_or_nothing and len(bookings) < len(items)):
+            if all_or_nothing:
+                for index, _ in bookings:
+                    results[index].error = 'Not created because another booking in the batch failed.'
+            return results
+
+        take_seats(slots, seats)
+        created = Booking.objects.bulk_create([booking for _, booking in bookings])
+        for (index, _), booking in zip(bookings, created):
+            results[index].booking = booking
+
+        # bulk_create skips post_save, so booking subscriptions are fed here instead
+        publish_many([booking_event(CREATED, booking) for booking in created])
+    return results
+
+
+def take_seats(slots, seats):
+    """
+    Take ``{slot_pk: count}`` seats with one conditional UPDATE per distinct count.
+
+    ``slots`` maps the same keys to the Slot rows, which the caller has
+    locked in this transaction and which are brought up to date. Raises
+    SlotUnavailable, leaving the transaction to be rolled back, unless every
+    slot still had room for all of its seats.
+    """
+    # Slots taking the same number of seats share one UPDATE, which keeps the
+    # statement small however many slots a batch touches
+    by_count = defaultdict(list)
+    for slot_id, count in seats.items():
+        by_count[count].append(slot_id)
+    for count, slot_ids in by_count.items():
+        # Each slot must still have room for all of this call's seats on it
+        claimed = Slot.objects.filter(
+            pk__in=slot_ids, is_booked=False, booked_count__lte=F('capacity') - count
+        ).update(**_take_seats_update(Value(count)))
+        if claimed != len(slot_ids):
+            # Only reachable on backends without row locks, e.g. SQLite
+            raise SlotUnavailable('A slot in the batch was booked concurrently, please retry.')
+    for slot_id, count in seats.items():
+        slot = slots[slot_id]
+        slot.booked_count += count
+        slot.is_booked = slot.booked_count >= slot.capacity
+    _slots_changed([slots[slot_id] for slot_id in seats])
+
+
+def _check_status(status):
+    # Every new booking takes a seat, so it has to start out holding one
+    if status is not None and status not in ACTIVE_STATUSES:
+        raise ValidationError({'status': [f"New bookings must be {' or '.join(ACTIVE_STATUSES)}."]})
+
+
+def _per_slot(counts):
+    """An expression that is each slot's count from ``{slot_pk: count}``."""
+    if len(counts) == 1:
+        return Value(next(iter(counts.values())))
+    return Case(*[When(pk=pk, then=Value(count)) for pk, count in counts.items()],
+                default=Value(0), output_field=IntegerField())
+
+
+def _take_seats_update(seats):
+    # The slot fills up when the seats taken reach its capacity; the UPDATE
+    # computes both from the row's values before it
+    return {
+        'booked_count': F('booked_count') + seats,
+        'is_booked': ExpressionWrapper(Q(booked_count__gte=F('capacity') - seats), output_field=BooleanField()),
+    }
+
+
+def _take_seat(slot_id):
+    return Slot.objects.filter(pk=slot_id, is_booked=False, booked_count__lt=F('capacity')).update(
+        **_take_seats_update(Value(1))
+    )
+
+
+def _release_seats(seats, bookings=()):
+    """
+    Give back ``{slot_pk: count}`` seats with one UPDATE.
+
+    The slots are locked first, so the state each one moves from is known
+    exactly and the daily counts only change for slots that stop being full.
+    ``bookings`` get their slot swapped for the updated one.
+    """
+    if not seats:
+        return
+    slots = Slot.objects.select_for_update().in_bulk(list(seats))
+    released = _per_slot(seats)
+    # Floored at zero for bookings written around this module, e.g. in the
+    # admin, which never took a seat. The slot stays full only if the seats
+    # left still reach its capacity, computed from the row's values before
+    # the UPDATE like _take_seats_update
+    Slot.objects.filter(pk__in=list(slots)).update(
+        booked_count=Greatest(F('booked_count') - released, Value(0)),
+        is_booked=ExpressionWrapper(Q(booked_count__gte=F('capacity') + released), output_field=BooleanField()),
+    )
+    for slot_id, slot in slots.items():
+        slot.booked_count = max(slot.booked_count - seats[slot_id], 0)
+        slot.is_booked = slot.booked_count >= slot.capacity
+    for booking in bookings:
+        if booking.slot_id in slots:
+            booking.slot = slots[booking.slot_id]
+    _slots_changed(list(slots.values()))
+
+
+def _slots_changed(slots):
+    # update() skips the Slot signals, so the daily counts, the cached dates and
+    # availability subscribers are fed here, with one counts UPDATE per date;
+    # each slot's _loaded_is_booked holds the state it moved from
+    dates = {slot.pk: Slot.local_date(slot.start_time) for slot in slots}
+    opened = Counter()
+    for slot in slots:
+        if slot.is_booked != slot._loaded_is_booked:
+            opened[dates[slot.pk]] += -1 if slot.is_booked else 1
+        slot._loaded_is_booked = slot.is_booked
+    adjust_day_counts({date: (0, count) for date, count in opened.items()})
+    invalidate_availability(*set(dates.values()))
+    notify_availability_changes([(slot.pk, slot.is_booked, dates[slot.pk]) for slot in slots])
+
+
+def _slot_pk(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
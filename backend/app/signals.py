@@ -1,33 +1,38 @@
 # Importing necessary modules for Django model signals and Graphene subscriptions
 from django.db.models.signals import post_save, post_delete
-from graphene_subscriptions.signals import post_save_subscription, post_delete_subscription
 from django.dispatch import receiver
 from .models import Booking, Slot
+from .cache import invalidate_availability
+from .daily_availability import adjust_day_counts
+from .subscriptions import publish_booking_saved, publish_booking_deleted, notify_availability_changed
 
-def booking_saved(sender, instance, **kwargs):
-    # Check if the booking has an associated slot
-    if instance.slot:
-        # Access the start_time and end_time from the related Slot instance
-        start_time = instance.slot.start_time
-        end_time = instance.slot.end_time
-        print(f"Booking by {instance.booker_first_name} {instance.booker_last_name} for slot starting at {start_time} and ending at {end_time} has been saved!")
-    else:
-        print(f"Booking by {instance.booker_first_name} {instance.booker_last_name} has been saved without a specific slot!")
+# Slot state follows the booking lifecycle in app.services (reserve, cancel, delete);
+# the receivers here only publish events and keep the availability cache and daily counts fresh.
 
-## Connecting the custom callback function to the post_save signal for the Booking model.
-# This ensures the booking_saved function is called whenever a Booking instance is saved.
-post_save.connect(booking_saved, sender=Booking, dispatch_uid="booking_saved_custom")
+# Publishing Booking saves to the subscription topics (per operation, per slot date and per booking).
+# This will inform only the subscribers listening on those topics that a Booking instance has been saved.
+post_save.connect(publish_booking_saved, sender=Booking, dispatch_uid="booking_post_save")
 
-# Connecting the Graphene subscription's post_save_subscription function to the post_save signal for the Booking model.
-# This will inform any subscribers that a Booking instance has been saved.
-post_save.connect(post_save_subscription, sender=Booking, dispatch_uid="booking_post_save")
+# Publishing Booking deletes to the subscription topics.
+# This will inform only the subscribers listening on those topics that a Booking instance has been deleted.
+post_delete.connect(publish_booking_deleted, sender=Booking, dispatch_uid="booking_post_delete")
 
-# Connecting the Graphene subscription's post_delete_subscription function to the post_delete signal for the Booking model.
-# This will inform any subscribers that a Booking instance has been deleted.
-post_delete.connect(post_delete_subscription, sender=Booking, dispatch_uid="booking_post_delete")
+@receiver(post_save, sender=Slot)
+@receiver(post_delete, sender=Slot)
+def invalidate_slot_availability(sender, instance, signal, **kwargs):
+    deleted = signal is post_delete
+    # The per-day counts follow the slot from its loaded state to the written one
+    adjust_day_counts(instance.day_count_changes(deleted=deleted))
 
-@receiver(post_delete, sender=Booking)
-def update_slot_availability(sender, instance, **kwargs):
-    if instance.slot:
-        instance.slot.is_booked = False
-        instance.slot.save()
\ No newline at end of file
+    # Only the dates this slot was on before and after the write go stale
+    dates = instance.availability_dates()
+    invalidate_availability(*dates)
+
+    # A deleted slot, or one moved to another day, is no longer bookable on its old date
+    current_date = None if deleted else Slot.local_date(instance.start_time)
+    for date in dates:
+        notify_availability_changed(instance.pk, instance.is_booked if date == current_date else True, date)
+
+    # The written state is what the next save moves from; a deleted slot is no longer counted
+    instance._loaded_start_time = None if deleted else instance.start_time
+    instance._loaded_is_booked = None if deleted else instance.is_booked
@@ -0,0 +1,143 @@
+import datetime
+import time
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.utils.timezone import make_aware
+
+from .cache import invalidate_availability
+from .daily_availability import adjust_day_counts, count_slots_by_day
+from .models import Slot
+
+DEFAULT_BATCH_SIZE = 500
+
+
+@dataclass
+class GenerationResult:
+    created: int = 0
+    skipped: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.created / self.elapsed if self.elapsed else 0.0
+
+
+def occurrence_dates(config, date_from=None, date_to=None):
+    """Yield the days a configuration applies to, expanding weekly recurrence."""
+    last_day = config.repeat_weekly_until or config.day
+    if date_to and date_to < last_day:
+        last_day = date_to
+
+    day = config.day
+    if date_from and date_from > day:
+        # Jump straight to the first weekly occurrence on or after date_from
+        weeks = -(-(date_from - day).days // 7)
+        day += datetime.timedelta(weeks=weeks)
+
+    while day <= last_day:
+        yield day
+        if not config.repeat_weekly_until:
+            break
+        day += datetime.timedelta(weeks=1)
+
+
+def day_slots(day, start_hour, end_hour, slot_minutes=60):
+    """Return the (start_time, end_time) pairs that fit between start_hour and end_hour on day."""
+    start_time = make_aware(datetime.datetime.combine(day, datetime.time(hour=start_hour)))
+    end_time = make_aware(datetime.datetime.combine(day, datetime.time(hour=end_hour)))
+    length = datetime.timedelta(minutes=slot_minutes)
+
+    slots = []
+    current_time = start_time
+    while current_time + length <= end_time:
+        slots.append((current_time, current_time + length))
+        current_time += length
+    return slots
+
+
+def config_slots(config, date_from=None, date_to=None):
+    """Return every candidate slot for a SlotConfiguration within an optional date range."""
+    slots = []
+    for day in occurrence_dates(config, date_from, date_to):
+        slots.extend(day_slots(day, config.start_hour, config.end_hour, config.slot_minutes))
+    return slots
+
+
+def range_slots(date_from, date_to, start_hour, end_hour, slot_minutes=60, weekdays=None):
+    """Return candidate slots for every day in [date_from, date_to], optionally limited to weekdays (0 = Monday)."""
+    slots = []
+    day = date_from
+    while day <= date_to:
+        if weekdays is None or day.weekday() in weekdays:
+            slots.extend(day_slots(day, start_hour, end_hour, slot_minutes))
+        day += datetime.timedelta(days=1)
+    return slots
+
+
+def create_missing_slots(candidates, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Insert the candidate slots that do not exist yet.
+
+    Existing slots are fetched with a single range query over the candidates'
+    time span and diffed in memory, then the remainder is written with batched
+    bulk_create. The unique constraint on (start_time, end_time) keeps a
+    concurrent run from creating duplicates, and only the slots this run
+    inserted count as created.
+    """
+    started = time.perf_counter()
+    candidates = set(candidates)
+    if not candidates:
+        return GenerationResult()
+
+    existing = set(
+        Slot.objects.filter(
+            start_time__gte=min(start for start, _ in candidates),
+            start_time__lte=max(start for start, _ in candidates),
+        ).values_list('start_time', 'end_time')
+    )
+    missing = sorted(candidates - existing)
+
+    # A concurrent run may have inserted some of them since; those are skipped too
+    created = insert_slots([Slot(start_time=start, end_time=end) for start, end in missing], batch_size=batch_size)
+    return GenerationResult(
+        created=created,
+        skipped=len(candidates) - created,
+        elapsed=time.perf_counter() - started,
+    )
+
+
+def insert_slots(slots, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Write new, unbooked Slot instances with batched bulk_create in one transaction.
+
+    Returns how many were inserted: slots that collide with an existing
+    (start_time, end_time) are skipped by the unique constraint, e.g. when a
+    concurrent run got there first. The touched days are counted with one
+    grouped query before the insert and one after, and the daily availability
+    grows by what each day actually gained.
+    """
+    days = {Slot.local_date(slot.start_time) for slot in slots}
+    if not days:
+        return 0
+    with transaction.atomic():
+        before = _day_totals(min(days), max(days))
+        Slot.objects.bulk_create(slots, batch_size=batch_size, ignore_conflicts=True)
+        after = _day_totals(min(days), max(days))
+        gained = {day: after.get(day, 0) - before.get(day, 0) for day in days}
+        # bulk_create skips the Slot signals, so the new slots are counted and
+        # their days' cached availability dropped here
+        adjust_day_counts({day: (count, count) for day, count in gained.items()})
+        invalidate_availability(*days)
+    return sum(gained.values())
+
+
+def _day_totals(date_from, date_to):
+    return {day: total for day, total, _ in count_slots_by_day(date_from, date_to)}
+
+
+def generate_slots_for_configs(configs, date_from=None, date_to=None, batch_size=DEFAULT_BATCH_SIZE):
+    candidates = []
+    for config in configs:
+        candidates.extend(config_slots(config, date_from, date_to))
+    return create_missing_slots(candidates, batch_size=batch_size)
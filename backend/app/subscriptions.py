@@ -0,0 +1,215 @@
+import re
+import threading
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from graphene_subscriptions.events import CREATED, UPDATED, DELETED, SubscriptionEvent
+
+from .events import ModelChangeEvent, changed_fields, encode_event, loaded_values
+from .outbox import outbox_options, record
+
+AVAILABILITY_CHANGED = "availability_changed"
+
+# Channel layer group names only allow ASCII alphanumerics, hyphens, underscores and periods
+TOPIC_PART = re.compile(r'^[a-zA-Z\d\-_]{1,60}$')
+
+
+def booking_topic(operation, date=None, booking_id=None):
+    """
+    Name of the channel group carrying booking events for one operation.
+
+    Without a date or booking_id this is the topic for every booking event of
+    that operation; with one, only events for that slot date or booking are
+    published to it.
+    """
+    if booking_id is not None:
+        return f'booking.{_topic_part(booking_id)}.{operation}'
+    if date is not None:
+        return f'bookings.{operation}.{date.isoformat()}'
+    return f'bookings.{operation}'
+
+
+def availability_topic(date):
+    return f'slots.{AVAILABILITY_CHANGED}.{date.isoformat()}'
+
+
+def booking_topics(operation, booking, date=None):
+    return [
+        booking_topic(operation),
+        booking_topic(operation, booking_id=booking.booking_id),
+    ] + ([booking_topic(operation, date=date)] if date else [])
+
+
+def publish(topics, event):
+    """Publish one event to each topic group; see publish_many."""
+    publish_many([(topics, event)])
+
+
+def publish_many(events):
+    """
+    Publish ``(topics, event)`` pairs once the current transaction commits.
+
+    Each event is encoded once for all of its topics (see app.events), at
+    the time of the call. With SUBSCRIPTION_OUTBOX['ENABLED'] the frames are
+    written to the outbox with one INSERT in the caller's transaction and
+    app.outbox's dispatcher sends them; otherwise they are sent from an
+    on_commit hook. Either way nothing goes out for a rolled back write.
+    """
+    entries = [(topics, encode_event(event)) for topics, event in events]
+    if not entries:
+        return
+    if outbox_options()['ENABLED']:
+        record(entries)
+    else:
+        transaction.on_commit(lambda: send(entries))
+
+
+def send(entries):
+    """Send ``(topics, frame)`` pairs to the channel layer in order, in one pass through the event loop."""
+    async_to_sync(_send)(get_channel_layer(), entries)
+
+
+async def _send(channel_layer, entries):
+    for topics, frame in entries:
+        message = {'type': 'topic.event', 'event': frame}
+        for topic in topics:
+            await channel_layer.group_send(topic, {**message, 'topic': topic})
+
+
+def booking_event(operation, instance, changed=None):
+    """The ``(topics, event)`` pair for a booking write, for publish_many."""
+    return booking_topics(operation, instance, instance.slot_date()), ModelChangeEvent(operation, instance, changed)
+
+
+def publish_booking_saved(sender, instance, created, update_fields=None, **kwargs):
+    operation = CREATED if created else UPDATED
+    # A new booking sends every field, an update only the ones it wrote
+    changed = None if created else changed_fields(instance, update_fields)
+    publish(*booking_event(operation, instance, changed))
+    # The saved state is what the next save's changes are measured against
+    instance._loaded_values = loaded_values(instance)
+
+
+def publish_booking_deleted(sender, instance, **kwargs):
+    publish(*booking_event(DELETED, instance))
+
+
+class AvailabilityEvent(SubscriptionEvent):
+    """Availability changes for one date; instance is a list of [slot_id, is_booked] pairs."""
+
+
+class AvailabilityCoalescer:
+    """
+    Collects slot availability changes and publishes them once per window.
+
+    Changes are keyed by date and slot, so a burst of writes to the same slots
+    collapses into one message per date carrying each slot's latest state.
+    With a window of 0 every change is published immediately.
+    """
+
+    def __init__(self, window, publish=publish):
+        self.window = window
+        self.publish = publish
+        self._pending = {}
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def add(self, date, slot_id, is_booked):
+        with self._lock:
+            self._pending.setdefault(date, {})[slot_id] = is_booked
+            if self.window > 0 and self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if self.window <= 0:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        for date, changes in pending.items():
+            deltas = [[slot_id, is_booked] for slot_id, is_booked in sorted(changes.items())]
+            self.publish([availability_topic(date)], AvailabilityEvent(AVAILABILITY_CHANGED, deltas))
+
+
+_availability_coalescer = None
+
+
+def get_availability_coalescer():
+    global _availability_coalescer
+    if _availability_coalescer is None:
+        _availability_coalescer = AvailabilityCoalescer(getattr(settings, 'SLOT_AVAILABILITY_COALESCE_WINDOW', 0.25))
+    return _availability_coalescer
+
+
+def notify_availability_changed(slot_id, is_booked, *dates):
+    """Queue an availability delta for each date; see notify_availability_changes."""
+    notify_availability_changes([(slot_id, is_booked, date) for date in dates])
+
+
+def notify_availability_changes(changes):
+    """
+    Queue ``(slot_id, is_booked, date)`` deltas to go out once the current transaction commits.
+
+    Through the outbox, each date's deltas become one event and all of them
+    are recorded with one INSERT; the dispatcher merges a date's events in a
+    batch the way the coalescer would. Without it they are handed to the
+    coalescer after commit.
+    """
+    changes = [(slot_id, is_booked, date) for slot_id, is_booked, date in changes if date is not None]
+    if not changes:
+        return
+    if outbox_options()['ENABLED']:
+        per_date = {}
+        for slot_id, is_booked, date in changes:
+            per_date.setdefault(date, {})[slot_id] = is_booked
+        publish_many([
+            ([availability_topic(date)], AvailabilityEvent(AVAILABILITY_CHANGED, sorted(map(list, deltas.items()))))
+            for date, deltas in per_date.items()
+        ])
+        return
+
+    def queue():
+        coalescer = get_availability_coalescer()
+        for slot_id, is_booked, date in changes:
+            coalescer.add(date, slot_id, is_booked)
+    transaction.on_commit(queue)
+
+
+@receiver(setting_changed)
+def reset_availability_coalescer(setting, **kwargs):
+    global _availability_coalescer
+    if setting == 'SLOT_AVAILABILITY_COALESCE_WINDOW':
+        _availability_coalescer = None
+
+
+class SubscriptionRoot:
+    """
+    Root value for subscription resolvers.
+
+    Resolvers ask for the topics they need and the consumer joins those groups,
+    so each connection only receives the events its subscriptions care about.
+    """
+
+    def __init__(self, consumer):
+        self.consumer = consumer
+        # Every topic this operation joined, for the consumer to leave when it stops
+        self.topics = set()
+
+    def topic(self, name):
+        self.topics.add(name)
+        return self.consumer.join_topic(name)
+
+
+def _topic_part(value):
+    value = str(value)
+    if not TOPIC_PART.match(value):
+        raise ValueError(f"Invalid subscription argument '{value}'.")
+    return value
@@ -1,10 +1,95 @@
-from django.test import TestCase
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.db import IntegrityError, connection, connections, transaction
+from django.core.exceptions import ValidationError
 from graphene.test import Client
-from .models import Slot, Booking
+from django.core.management import call_command
+from django.core.cache import caches
+from django.test.utils import CaptureQueriesContext
+from django.db.models import F
+from .models import ArchivedBooking, ArchivedSlot, Slot, Booking, DailyAvailability, OutboxEvent, SlotConfiguration
+from .slot_generation import create_missing_slots, generate_slots_for_configs, insert_slots, range_slots
+from io import StringIO
 from .schema import schema
+from . import views
+from .services import (cancel_booking, delete_booking, hold_slot, next_hold_expiry, release_expired_holds,
+                       reserve_slot, reserve_slots, SlotUnavailable)
+from .archive import archive_cutoff, archive_slots
+from .imports import import_rows, read_rows
+from .cache import AvailabilityCache, get_availability_cache
+from .dates import local_day_range
+from .db import Route, use_route
+from .daily_availability import count_slots_by_day
 from django.utils import timezone
+from django.contrib.auth import get_user_model
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.testing import HttpCommunicator, WebsocketCommunicator
+from .consumers import TopicSubscriptionConsumer
+from .subscriptions import AvailabilityCoalescer, availability_topic, booking_topic
+from .outbox import dispatch_outbox
+from channels.layers import get_channel_layer
+from django.core.management.base import CommandError
+from django.conf import settings
+from .events import EventCache, decode_event, encode_event
+from graphene_subscriptions.events import SubscriptionEvent
+from .documents import DocumentCache, get_document_cache, query_hash
+from .metrics import OVERFLOW_LABEL, GraphQLMetrics, HistogramFamily, OperationTiming
+from .booking_ids import MAX_SEQUENCE, SnowflakeIdGenerator, parse_booking_id
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import threading
 import datetime
+import heapq
+import json
+import msgpack
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
 
+# Subscription signals publish to the channel layer on every booking write;
+# tests use the in-memory layer instead of the Redis service from docker-compose.
+# Tests that commit set SLOT_AVAILABILITY_COALESCE_WINDOW=0 so no flush timer
+# outlives them and publishes into a later test's event loop.
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+# Tests following events to subscribers send them from on_commit hooks rather
+# than through the outbox, which OutboxTestCase drives with the dispatcher.
+DIRECT_PUBLISHING = {'ENABLED': False}
+
+
+def write_in_thread(fn):
+    # Writes made from async tests run on a worker thread rather than the
+    # thread-sensitive executor, which the consumers under test also use
+    return sync_to_async(fn, thread_sensitive=False)
+
+
+async def open_subscription(query):
+    communicator = WebsocketCommunicator(TopicSubscriptionConsumer, '/graphql/')
+    connected, _ = await communicator.connect()
+    assert connected
+    await communicator.send_json_to({'id': '1', 'type': 'start', 'payload': {'query': query}})
+    # Give the consumer time to handle the start message and join its topic group
+    await communicator.receive_nothing()
+    return communicator
+
+
+def make_slot(start_time, hours=1, **kwargs):
+    return Slot.objects.create(start_time=start_time, end_time=start_time + datetime.timedelta(hours=hours), **kwargs)
+
+
+def booking_fields(**overrides):
+    fields = {
+        'booker_first_name': "Test",
+        'booker_last_name': "User",
+        'booker_email': "test@example.com",
+        'booker_phone': "+12125552368",
+        'status': "confirmed",
+    }
+    fields.update(overrides)
+    return fields
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
 class BookingSlotGraphQLTestCase(TestCase):
     def setUp(self):
         # Specify the date and time for the slot
@@ -22,6 +107,7 @@ class BookingSlotGraphQLTestCase(TestCase):
             end_time=end_time,
             is_booked=False
         )
+        get_availability_cache().clear()
         self.client = Client(schema)
 
     def test_create_booking(self):
@@ -31,7 +117,7 @@ class BookingSlotGraphQLTestCase(TestCase):
                     bookerFirstName: "Test",
                     bookerLastName: "User",
                     bookerEmail: "test@example.com",
-                    bookerPhone: "+123456789",
+                    bookerPhone: "+12125552368",
                     slotId: "%s",
                     status: "confirmed"
                 ) {
@@ -119,3 +205,1679 @@ class BookingSlotGraphQLTestCase(TestCase):
         else:
             # Handle the scenario where no available slots are returned
             print("No available slots for the specified date.")
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class SlotReservationTestCase(TestCase):
+    def setUp(self):
+        self.slot = make_slot(timezone.make_aware(datetime.datetime(2024, 2, 21, 10, 0)))
+
+    def test_reserve_slot_claims_slot(self):
+        booking = reserve_slot(self.slot.id, **booking_fields())
+        self.slot.refresh_from_db()
+        self.assertTrue(self.slot.is_booked)
+        self.assertEqual(booking.slot_id, self.slot.id)
+        self.assertTrue(booking.booking_id.startswith('BK-'))
+
+    def test_second_reservation_is_rejected(self):
+        reserve_slot(self.slot.id, **booking_fields())
+        with self.assertRaises(SlotUnavailable):
+            reserve_slot(self.slot.id, **booking_fields(booker_first_name="Late"))
+        self.assertEqual(Booking.objects.filter(slot=self.slot).count(), 1)
+
+    def test_missing_slot(self):
+        with self.assertRaises(Slot.DoesNotExist):
+            reserve_slot(self.slot.id + 1000, **booking_fields())
+
+    def test_check_constraint_backs_the_seat_counter(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Slot.objects.filter(pk=self.slot.pk).update(booked_count=2)
+
+    def test_create_booking_mutation_reports_taken_slot(self):
+        reserve_slot(self.slot.id, **booking_fields())
+        response = Client(schema).execute('''
+            mutation {
+                createBooking(
+                    bookerFirstName: "Late",
+                    bookerLastName: "User",
+                    bookerEmail: "late@example.com",
+                    bookerPhone: "+12125552368",
+                    slotId: "%s",
+                    status: "confirmed"
+                ) {
+                    booking { bookingId }
+                }
+            }
+        ''' % self.slot.id)
+        self.assertIn('already booked', str(response.get('errors')))
+
+    def test_invalid_booking_takes_no_seat(self):
+        response = Client(schema).execute('''
+            mutation {
+                createBooking(bookerFirstName: "Test", bookerLastName: "User", bookerEmail: "test@example.com",
+                              bookerPhone: "bad", slotId: "%s", status: "confirmed") {
+                    booking { bookingId }
+                }
+            }
+        ''' % self.slot.id)
+        self.assertIn('booker_phone', str(response.get('errors')))
+        self.slot.refresh_from_db()
+        self.assertEqual((self.slot.booked_count, self.slot.is_booked), (0, False))
+        self.assertFalse(Booking.objects.exists())
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class SlotCapacityTestCase(TestCase):
+    def setUp(self):
+        get_availability_cache().clear()
+        self.slot = make_slot(timezone.make_aware(datetime.datetime(2024, 2, 21, 10, 0)), capacity=3)
+        self.client = Client(schema)
+
+    def available(self):
+        response = self.client.execute('query { availableSlots(date: "2024-02-21") { id remainingCapacity } }')
+        return response['data']['availableSlots']
+
+    def test_seats_fill_up_then_free(self):
+        bookings = [reserve_slot(self.slot.id, **booking_fields(booker_first_name=f"Guest{i}")) for i in range(2)]
+        self.assertEqual(self.available(), [{'id': str(self.slot.id), 'remainingCapacity': 1}])
+        self.assertFalse(bookings[-1].slot.is_booked)
+
+        last = reserve_slot(self.slot.id, **booking_fields())
+        self.assertTrue(last.slot.is_booked)
+        self.assertEqual(self.available(), [])
+        self.assertEqual(DailyAvailability.objects.get(date=datetime.date(2024, 2, 21)).open_slots, 0)
+        with self.assertRaises(SlotUnavailable):
+            reserve_slot(self.slot.id, **booking_fields())
+
+        cancel_booking(bookings[0].pk)
+        # Cancelling twice gives the seat back once
+        cancel_booking(bookings[0].pk)
+        self.slot.refresh_from_db()
+        self.assertEqual((self.slot.booked_count, self.slot.is_booked), (2, False))
+        self.assertEqual(self.available(), [{'id': str(self.slot.id), 'remainingCapacity': 1}])
+        self.assertEqual(DailyAvailability.objects.get(date=datetime.date(2024, 2, 21)).open_slots, 1)
+
+    def test_batch_books_several_seats_on_one_slot(self):
+        results = reserve_slots([{'slot_id': self.slot.id, **booking_fields()} for _ in range(3)])
+        self.assertTrue(all(result.booking for result in results))
+        self.slot.refresh_from_db()
+        self.assertEqual((self.slot.booked_count, self.slot.is_booked), (3, True))
+
+        results = reserve_slots([{'slot_id': self.slot.id, **booking_fields()}])
+        self.assertEqual(results[0].error, 'This slot is already booked.')
+
+    def test_expired_holds_give_their_seats_back(self):
+        with mock.patch('app.services.clock', FakeClock(timezone.now())) as clock:
+            for _ in range(3):
+                hold_slot(self.slot.id, ttl=60)
+            clock.advance(minutes=2)
+            self.assertEqual(release_expired_holds(), 3)
+        self.slot.refresh_from_db()
+        self.assertEqual((self.slot.booked_count, self.slot.is_booked), (0, False))
+
+    def test_availability_lookup_uses_partial_index(self):
+        day_start, day_end = local_day_range(datetime.date(2024, 2, 21))
+        plan = Slot.objects.filter(
+            is_booked=False, booked_count__lt=F('capacity'), start_time__gte=day_start, start_time__lt=day_end
+        ).order_by('start_time').explain()
+        self.assertIn('slot_open_start_idx', plan)
+
+    def test_capacity_cannot_drop_below_booked_seats(self):
+        for _ in range(2):
+            reserve_slot(self.slot.id, **booking_fields())
+        mutation = 'mutation { updateSlot(id: "%s", capacity: %d) { slot { capacity isBooked } } }'
+        response = self.client.execute(mutation % (self.slot.id, 1))
+        self.assertIn('cover the 2 booked seats', str(response['errors']))
+
+        response = self.client.execute(mutation % (self.slot.id, 2))
+        self.assertEqual(response['data']['updateSlot']['slot'], {'capacity': 2, 'isBooked': True})
+
+    def test_is_booked_follows_the_booked_seats(self):
+        mutation = 'mutation { updateSlot(id: "%s", isBooked: %s) { slot { isBooked } } }'
+        reserve_slot(self.slot.id, **booking_fields())
+        response = self.client.execute(mutation % (self.slot.id, 'true'))
+        self.assertIn('not full with 1 of 3 seats booked', str(response['errors']))
+
+        for _ in range(2):
+            reserve_slot(self.slot.id, **booking_fields())
+        response = self.client.execute(mutation % (self.slot.id, 'false'))
+        self.assertIn('full with 3 of 3 seats booked', str(response['errors']))
+        self.slot.refresh_from_db()
+        self.assertTrue(self.slot.is_booked)
+        self.assertEqual(DailyAvailability.objects.get(date=datetime.date(2024, 2, 21)).open_slots, 0)
+
+        response = self.client.execute(mutation % (self.slot.id, 'true'))
+        self.assertEqual(response['data']['updateSlot']['slot'], {'isBooked': True})
+
+    def test_new_bookings_must_hold_a_seat(self):
+        with self.assertRaises(ValidationError):
+            reserve_slot(self.slot.id, **booking_fields(status='cancelled'))
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.booked_count, 0)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class BatchReservationTestCase(TestCase):
+    def setUp(self):
+        first = timezone.make_aware(datetime.datetime(2024, 2, 21, 9, 0))
+        self.slots = [make_slot(first + datetime.timedelta(hours=i)) for i in range(10)]
+
+    def items(self, slots):
+        return [dict(slot_id=str(slot.id), **booking_fields(booker_first_name=f"Guest{i}")) for i, slot in enumerate(slots)]
+
+    def test_batch_books_every_slot(self):
+        results = reserve_slots(self.items(self.slots[:3]))
+        self.assertEqual([result.error for result in results], [None] * 3)
+        self.assertEqual(Slot.objects.filter(is_booked=True).count(), 3)
+        self.assertEqual(len({result.booking.booking_id for result in results}), 3)
+        self.assertTrue(all(result.booking.pk for result in results))
+
+    def test_all_or_nothing_writes_nothing_on_failure(self):
+        reserve_slot(self.slots[1].id, **booking_fields())
+        results = reserve_slots(self.items(self.slots[:3]))
+        self.assertEqual(results[1].error, 'This slot is already booked.')
+        self.assertIn('another booking', results[0].error)
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(Slot.objects.filter(is_booked=True).count(), 1)
+
+    def test_best_effort_books_valid_items(self):
+        items = self.items(self.slots[:2]) + [dict(slot_id=str(self.slots[0].id), **booking_fields())]
+        items.append(dict(slot_id="999999", **booking_fields()))
+        items.append(dict(slot_id=str(self.slots[2].id), **booking_fields(booker_phone="not a phone")))
+        results = reserve_slots(items, all_or_nothing=False)
+        self.assertIsNotNone(results[0].booking)
+        self.assertIsNotNone(results[1].booking)
+        self.assertEqual(results[2].error, 'This slot is already booked.')
+        self.assertEqual(results[3].error, 'Slot not found')
+        self.assertTrue(results[4].error.startswith('booker_phone:'))
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_query_count_does_not_grow_with_batch(self):
+        with CaptureQueriesContext(connection) as small:
+            reserve_slots(self.items(self.slots[:2]))
+        with CaptureQueriesContext(connection) as large:
+            reserve_slots(self.items(self.slots[2:]))
+        self.assertEqual(len(small), len(large))
+
+    def test_events_fire_for_each_booking(self):
+        with mock.patch('app.services.publish_many') as publish:
+            results = reserve_slots(self.items(self.slots[:3]))
+        [[events]] = [call.args for call in publish.call_args_list]
+        self.assertEqual([event.instance for _, event in events], [result.booking for result in results])
+        self.assertTrue(all(event.operation == 'created' for _, event in events))
+
+    def test_create_bookings_mutation(self):
+        reserve_slot(self.slots[1].id, **booking_fields())
+        response = Client(schema).execute('''
+            mutation ($input: [BookingInput!]!) {
+                createBookings(input: $input, allOrNothing: false) {
+                    success
+                    results { index error booking { bookerFirstName slot { id } } }
+                }
+            }
+        ''', variables={'input': [
+            {'bookerFirstName': f"Guest{i}", 'bookerLastName': "User", 'bookerEmail': "test@example.com",
+             'bookerPhone': "+12125552368", 'slotId': str(slot.id), 'status': "confirmed"}
+            for i, slot in enumerate(self.slots[:2])
+        ]})
+        self.assertNotIn('errors', response)
+        data = response['data']['createBookings']
+        self.assertFalse(data['success'])
+        self.assertEqual(data['results'], [
+            {'index': 0, 'error': None, 'booking': {'bookerFirstName': "Guest0", 'slot': {'id': str(self.slots[0].id)}}},
+            {'index': 1, 'error': 'This slot is already booked.', 'booking': None},
+        ])
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class BookingLifecycleTestCase(TestCase):
+    def setUp(self):
+        self.slot = make_slot(timezone.make_aware(datetime.datetime(2024, 2, 21, 10, 0)))
+        self.booking = reserve_slot(self.slot.id, **booking_fields())
+
+    def test_cancel_frees_slot(self):
+        booking = cancel_booking(self.booking.pk)
+        self.assertEqual(booking.status, 'cancelled')
+        self.slot.refresh_from_db()
+        self.assertFalse(self.slot.is_booked)
+
+    def test_delete_frees_slot(self):
+        delete_booking(self.booking.pk)
+        self.assertFalse(Booking.objects.exists())
+        self.slot.refresh_from_db()
+        self.assertFalse(self.slot.is_booked)
+
+    def test_slot_held_by_another_booking_stays_booked(self):
+        cancel_booking(self.booking.pk)
+        other = reserve_slot(self.slot.id, **booking_fields(booker_first_name="Other"))
+        # Deleting the already-cancelled booking must not free the slot the new one holds
+        delete_booking(self.booking.pk)
+        self.slot.refresh_from_db()
+        self.assertTrue(self.slot.is_booked)
+        self.assertEqual(list(Booking.objects.all()), [other])
+
+    def test_missing_booking(self):
+        with self.assertRaises(Booking.DoesNotExist):
+            cancel_booking(self.booking.pk + 1000)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, SUBSCRIPTION_OUTBOX={'ENABLED': True})
+class MutationQueryCountTestCase(TestCase):
+    """
+    Pins the SQL issued by each booking mutation, savepoints included, with
+    events recorded in the outbox as deployed.
+
+    A change here means a mutation gained or lost a round trip; update the
+    number only together with the reason.
+    """
+
+    def setUp(self):
+        first = timezone.make_aware(datetime.datetime(2024, 2, 21, 9, 0))
+        self.slots = [make_slot(first + datetime.timedelta(hours=i)) for i in range(3)]
+        self.client = Client(schema)
+
+    def execute(self, query, num_queries, **kwargs):
+        with self.assertNumQueries(num_queries):
+            response = self.client.execute(query, **kwargs)
+        self.assertNotIn('errors', response)
+        return response['data']
+
+    def test_create_booking(self):
+        # savepoint, seat UPDATE, slot SELECT, INSERT, booking event outbox INSERT, daily counts UPDATE,
+        # availability outbox INSERT, release
+        self.execute('''
+            mutation {
+                createBooking(bookerFirstName: "Test", bookerLastName: "User", bookerEmail: "test@example.com",
+                              bookerPhone: "+12125552368", slotId: "%s", status: "confirmed") {
+                    booking { bookingId slot { id isBooked } }
+                }
+            }
+        ''' % self.slots[0].id, 8)
+
+    def test_create_bookings(self):
+        # savepoint, slots SELECT, claim UPDATE, daily counts UPDATE, availability outbox INSERT, bulk INSERT,
+        # booking events outbox INSERT, release
+        self.execute('''
+            mutation ($input: [BookingInput!]!) {
+                createBookings(input: $input) { success results { booking { bookingId slot { id } } } }
+            }
+        ''', 8, variables={'input': [
+            {'bookerFirstName': "Test", 'bookerLastName': "User", 'bookerEmail': "test@example.com",
+             'bookerPhone': "+12125552368", 'slotId': str(slot.id), 'status': "confirmed"}
+            for slot in self.slots
+        ]})
+
+    def test_cancel_booking(self):
+        booking = reserve_slot(self.slots[0].id, **booking_fields())
+        # savepoint, booking lock UPDATE, booking SELECT, status UPDATE, booking event outbox INSERT, slot SELECT,
+        # seat UPDATE, daily counts UPDATE, availability outbox INSERT, release
+        data = self.execute('''
+            mutation { cancelBooking(id: "%s") { success booking { status slot { isBooked } } } }
+        ''' % booking.pk, 10)
+        self.assertEqual(data['cancelBooking']['booking'], {'status': "CANCELLED", 'slot': {'isBooked': False}})
+
+    def test_delete_booking(self):
+        booking = reserve_slot(self.slots[0].id, **booking_fields())
+        # savepoint, booking lock UPDATE, booking SELECT, DELETE, booking event outbox INSERT, slot SELECT,
+        # seat UPDATE, daily counts UPDATE, availability outbox INSERT, release
+        self.execute('mutation { deleteBooking(id: "%s") { success } }' % booking.pk, 10)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, SLOT_AVAILABILITY_COALESCE_WINDOW=0)
+class SlotReservationConcurrencyTestCase(TransactionTestCase):
+    workers = 8
+    attempts = 32
+
+    def book_in_parallel(self, slot):
+        """Reserve ``slot`` from ``attempts`` calls over ``workers`` threads, returning whether each won a seat."""
+        start = threading.Barrier(self.workers)
+
+        def attempt(i):
+            if i < self.workers:
+                start.wait()
+            try:
+                # SQLite reports lock contention as an error rather than waiting,
+                # so retry until the attempt either wins or sees the slot taken
+                while True:
+                    try:
+                        reserve_slot(slot.id, **booking_fields(booker_first_name=f"Client{i}"))
+                        return True
+                    except SlotUnavailable:
+                        return False
+                    except Exception as exc:
+                        if 'locked' not in str(exc):
+                            raise
+                        time.sleep(0.001)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(attempt, range(self.attempts)))
+
+    def test_parallel_bookings_for_one_slot_have_one_winner(self):
+        slot = make_slot(timezone.make_aware(datetime.datetime(2024, 2, 21, 10, 0)))
+        results = self.book_in_parallel(slot)
+
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(Booking.objects.filter(slot=slot, status='confirmed').count(), 1)
+        slot.refresh_from_db()
+        self.assertTrue(slot.is_booked)
+
+    def test_parallel_bookings_never_oversell_capacity(self):
+        slot = make_slot(timezone.make_aware(datetime.datetime(2024, 2, 21, 10, 0)), capacity=5)
+        results = self.book_in_parallel(slot)
+
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(Booking.objects.filter(slot=slot, status='confirmed').count(), 5)
+        slot.refresh_from_db()
+        self.assertEqual((slot.booked_count, slot.is_booked), (5, True))
+
+
+class SlotGenerationTestCase(TestCase):
+    def test_configuration_generates_hourly_slots(self):
+        config = SlotConfiguration.objects.create(day=datetime.date(2024, 3, 4), start_hour=9, end_hour=12)
+        result = generate_slots_for_configs([config])
+        self.assertEqual(result.created, 3)
+        self.assertEqual(Slot.objects.count(), 3)
+
+    def test_slot_minutes_and_weekly_recurrence(self):
+        config = SlotConfiguration.objects.create(
+            day=datetime.date(2024, 3, 4), start_hour=9, end_hour=11,
+            slot_minutes=30, repeat_weekly_until=datetime.date(2024, 3, 25),
+        )
+        result = generate_slots_for_configs([config])
+        self.assertEqual(result.created, 4 * 4)
+        days = {slot.start_time.astimezone(timezone.get_current_timezone()).date() for slot in Slot.objects.all()}
+        self.assertEqual(days, {datetime.date(2024, 3, d) for d in (4, 11, 18, 25)})
+
+    def test_recurrence_respects_date_range(self):
+        config = SlotConfiguration.objects.create(
+            day=datetime.date(2024, 3, 4), start_hour=9, end_hour=10,
+            repeat_weekly_until=datetime.date(2024, 3, 25),
+        )
+        result = generate_slots_for_configs([config], datetime.date(2024, 3, 10), datetime.date(2024, 3, 20))
+        self.assertEqual(result.created, 2)
+
+    def test_existing_slots_are_skipped(self):
+        candidates = range_slots(datetime.date(2024, 3, 4), datetime.date(2024, 3, 4), 9, 12)
+        make_slot(candidates[0][0])
+        result = create_missing_slots(candidates)
+        self.assertEqual((result.created, result.skipped), (2, 1))
+        self.assertEqual(create_missing_slots(candidates).created, 0)
+
+    def test_slots_a_concurrent_run_inserted_are_skipped(self):
+        candidates = range_slots(datetime.date(2024, 3, 4), datetime.date(2024, 3, 4), 9, 12)
+
+        def concurrent_insert(slots, batch_size):
+            # The other run commits one of the slots after this one looked for existing ones
+            make_slot(candidates[1][0])
+            return insert_slots(slots, batch_size)
+
+        with mock.patch('app.slot_generation.insert_slots', side_effect=concurrent_insert):
+            result = create_missing_slots(candidates)
+        self.assertEqual((result.created, result.skipped), (2, 1))
+        self.assertEqual(Slot.objects.count(), 3)
+
+    def test_queries_are_batched(self):
+        candidates = range_slots(datetime.date(2024, 3, 1), datetime.date(2024, 5, 31), 8, 20)
+        with CaptureQueriesContext(connection) as queries:
+            result = create_missing_slots(candidates)
+        self.assertEqual(result.created, len(candidates))
+        # One range query for existing slots, the day totals before and after, plus a handful of batched inserts
+        self.assertLess(len(queries), len(candidates) / 100 + 2)
+
+    def test_management_command(self):
+        out = StringIO()
+        call_command(
+            'generate_slots', '--from', '2024-03-04', '--to', '2024-03-10',
+            '--start-hour', '9', '--end-hour', '17', '--weekdays', 'mon,wed', stdout=out,
+        )
+        self.assertEqual(Slot.objects.count(), 2 * 8)
+        self.assertIn('rows/s', out.getvalue())
+
+    def test_management_command_uses_configurations(self):
+        SlotConfiguration.objects.create(
+            day=datetime.date(2024, 3, 4), start_hour=9, end_hour=10,
+            repeat_weekly_until=datetime.date(2024, 4, 1),
+        )
+        call_command('generate_slots', '--from', '2024-03-01', '--to', '2024-03-31', stdout=StringIO())
+        self.assertEqual(Slot.objects.count(), 4)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class DataLoaderQueryCountTestCase(TestCase):
+    def setUp(self):
+        self.client = Client(schema)
+        self.next_start = timezone.make_aware(datetime.datetime(2024, 3, 4, 9, 0))
+
+    def add_booked_slots(self, count):
+        for _ in range(count):
+            slot = make_slot(self.next_start)
+            Booking.objects.create(slot=slot, **booking_fields())
+            self.next_start += datetime.timedelta(hours=1)
+
+    def count_queries(self, query):
+        # Loaders are scoped to the request passed as context, like GraphQLView does
+        context = RequestFactory().post('/graphql/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.execute(query, context_value=context)
+        self.assertIsNone(response.get('errors'), msg=str(response.get('errors')))
+        return len(queries), response['data']
+
+    def test_all_bookings_with_slot_is_batched(self):
+        query = 'query { allBookings { bookingId slot { startTime } } }'
+        self.add_booked_slots(2)
+        small, _ = self.count_queries(query)
+        self.add_booked_slots(20)
+        large, data = self.count_queries(query)
+        self.assertEqual(small, large)
+        self.assertEqual(len(data['allBookings']), 22)
+        self.assertTrue(all(booking['slot'] for booking in data['allBookings']))
+
+    def test_all_slots_with_bookings_is_batched(self):
+        query = 'query { allSlots { id bookings { bookingId slot { id } } } }'
+        self.add_booked_slots(2)
+        small, _ = self.count_queries(query)
+        self.add_booked_slots(20)
+        make_slot(self.next_start)
+        large, data = self.count_queries(query)
+        self.assertEqual(small, large)
+        self.assertEqual(sum(len(slot['bookings']) for slot in data['allSlots']), 22)
+        self.assertEqual(data['allSlots'][-1]['bookings'], [])
+
+
+class QueryPlannerTestCase(TestCase):
+    def setUp(self):
+        self.client = Client(schema)
+        start = timezone.make_aware(datetime.datetime(2024, 3, 4, 9, 0))
+        self.slots = [make_slot(start + datetime.timedelta(hours=hour), capacity=2) for hour in range(2)]
+        self.bookings = [reserve_slot(slot.pk, **booking_fields()) for slot in self.slots]
+
+    def execute(self, query, **variables):
+        context = RequestFactory().post('/graphql/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.execute(query, context_value=context, variables=variables)
+        self.assertIsNone(response.get('errors'), msg=str(response.get('errors')))
+        return [query['sql'] for query in queries], response['data']
+
+    def test_bookings_read_only_the_selected_columns(self):
+        [sql], data = self.execute('{ allBookings { bookingId status } }')
+        self.assertEqual(len(data['allBookings']), 2)
+        self.assertIn('"app_booking"."booking_id"', sql)
+        self.assertIn('"app_booking"."status"', sql)
+        for column in ('booker_first_name', 'booker_email', 'booker_phone', 'slot_id'):
+            self.assertNotIn(column, sql)
+        self.assertNotIn('JOIN', sql)
+
+    def test_selected_slot_is_joined(self):
+        [sql], data = self.execute('{ allBookings { bookingId slot { startTime } } }')
+        self.assertTrue(all(booking['slot']['startTime'] for booking in data['allBookings']))
+        self.assertIn('JOIN "app_slot"', sql)
+        self.assertIn('"app_slot"."start_time"', sql)
+        self.assertNotIn('"app_slot"."capacity"', sql)
+        self.assertNotIn('booker_email', sql)
+
+    def test_slot_bookings_are_prefetched_with_their_own_columns(self):
+        (slots_sql, bookings_sql), data = self.execute(
+            '{ allSlots { remainingCapacity bookings { bookingId slot { startTime } } } }'
+        )
+        self.assertEqual([slot['remainingCapacity'] for slot in data['allSlots']], [1, 1])
+        self.assertEqual([slot['bookings'][0]['bookingId'] for slot in data['allSlots']],
+                         [booking.booking_id for booking in self.bookings])
+        # The bookings' slot is the slot they were prefetched for, so its columns come from the slots query
+        for column in ('capacity', 'booked_count', 'start_time'):
+            self.assertIn(f'"app_slot"."{column}"', slots_sql)
+        self.assertNotIn('"app_slot"."end_time"', slots_sql)
+        self.assertIn('"app_booking"."slot_id"', bookings_sql)
+        self.assertNotIn('booker_email', bookings_sql)
+        self.assertNotIn('JOIN', bookings_sql)
+
+    def test_connections_follow_fragments_and_directives(self):
+        query = '''
+            query ($withBookings: Boolean!) {
+                slots(first: 5) { edges { node { ...SlotFields bookings @include(if: $withBookings) { status } } } }
+            }
+            fragment SlotFields on SlotType { startTime }
+        '''
+        [sql], _ = self.execute(query, withBookings=False)
+        self.assertIn('"app_slot"."start_time"', sql)
+        self.assertNotIn('"app_slot"."end_time"', sql)
+        queries, data = self.execute(query, withBookings=True)
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(data['slots']['edges'][0]['node']['bookings'], [{'status': 'CONFIRMED'}])
+
+    def test_booking_by_id(self):
+        booking = self.bookings[0]
+        [sql], data = self.execute('query ($id: ID!) { bookingById(bookingId: $id) { bookingId } }',
+                                   id=booking.booking_id)
+        self.assertEqual(data, {'bookingById': {'bookingId': booking.booking_id}})
+        self.assertNotIn('booker_email', sql)
+        self.assertEqual(self.execute('{ bookingById(bookingId: "missing") { bookingId } }')[1],
+                         {'bookingById': None})
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class ConnectionPaginationTestCase(TestCase):
+    def setUp(self):
+        self.client = Client(schema)
+        start = timezone.make_aware(datetime.datetime(2024, 3, 4, 9, 0))
+        # Two slots share each start time so the id tie-breaker is exercised
+        self.slots = []
+        for hour in range(5):
+            for minutes in (30, 60):
+                self.slots.append(make_slot(start + datetime.timedelta(hours=hour), hours=minutes / 60))
+        self.slots.sort(key=lambda slot: (slot.start_time, slot.pk))
+        for slot in self.slots[::3]:
+            Booking.objects.create(slot=slot, **booking_fields())
+            Slot.objects.filter(pk=slot.pk).update(is_booked=True)
+        Booking.objects.create(slot=None, **booking_fields(status='pending'))
+
+    def execute(self, query):
+        response = self.client.execute(query)
+        self.assertIsNone(response.get('errors'), msg=str(response.get('errors')))
+        return response['data']
+
+    def collect(self, field, page_size, arguments=''):
+        ids, after = [], ''
+        while True:
+            data = self.execute('''
+                query {
+                    %s(first: %d, after: "%s"%s) {
+                        edges { node { id } }
+                        pageInfo { hasNextPage endCursor }
+                    }
+                }
+            ''' % (field, page_size, after, arguments))[field]
+            ids.extend(int(edge['node']['id']) for edge in data['edges'])
+            if not data['pageInfo']['hasNextPage']:
+                return ids
+            after = data['pageInfo']['endCursor']
+
+    def test_slots_pages_follow_start_time_then_id(self):
+        self.assertEqual(self.collect('slots', 3), [slot.pk for slot in self.slots])
+
+    def test_backward_pagination(self):
+        data = self.execute('query { slots(last: 4) { edges { node { id } cursor } pageInfo { hasPreviousPage } } }')['slots']
+        self.assertEqual([int(edge['node']['id']) for edge in data['edges']], [slot.pk for slot in self.slots[-4:]])
+        self.assertTrue(data['pageInfo']['hasPreviousPage'])
+
+        before = data['edges'][0]['cursor']
+        data = self.execute('query { slots(last: 2, before: "%s") { edges { node { id } } } }' % before)['slots']
+        self.assertEqual([int(edge['node']['id']) for edge in data['edges']], [slot.pk for slot in self.slots[-6:-4]])
+
+    def test_slot_filters(self):
+        open_ids = self.collect('slots', 2, ', isBooked: false')
+        self.assertEqual(open_ids, [slot.pk for slot in self.slots if slot not in self.slots[::3]])
+        self.assertEqual(self.collect('slots', 50, ', dateFrom: "2024-03-05"'), [])
+        self.assertEqual(len(self.collect('slots', 50, ', dateFrom: "2024-03-04", dateTo: "2024-03-04"')), 10)
+
+    def test_bookings_include_unassigned_and_filter_status(self):
+        ids = self.collect('bookings', 2)
+        expected = list(Booking.objects.filter(slot=None).values_list('pk', flat=True))
+        expected += [slot.bookings.get().pk for slot in self.slots[::3]]
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(self.collect('bookings', 2, ', status: "CONFIRMED"')), 4)
+
+    def test_page_size_is_capped(self):
+        # Below the ten slots seeded, so a missing cap would return all of them
+        with mock.patch('app.pagination.MAX_PAGE_SIZE', 4):
+            data = self.execute('query { slots(first: 1000) { edges { cursor } pageInfo { hasNextPage } } }')['slots']
+        self.assertEqual(len(data['edges']), 4)
+        self.assertTrue(data['pageInfo']['hasNextPage'])
+
+    def test_invalid_cursor(self):
+        response = self.client.execute('query { slots(after: "not-a-cursor") { edges { cursor } } }')
+        self.assertIn('Invalid cursor', str(response.get('errors')))
+
+
+class AvailableSlotsRangeTestCase(TestCase):
+    def setUp(self):
+        get_availability_cache().clear()
+        self.client = Client(schema)
+
+    def available_ids(self, date):
+        response = self.client.execute('query { availableSlots(date: "%s") { id } }' % date)
+        self.assertIsNone(response.get('errors'), msg=str(response.get('errors')))
+        return [int(slot['id']) for slot in response['data']['availableSlots']]
+
+    def test_day_boundaries_follow_configured_timezone(self):
+        # 23:30 local on the 21st is already the 22nd in UTC
+        late = make_slot(timezone.make_aware(datetime.datetime(2024, 2, 21, 23, 30)), hours=0.5)
+        early = make_slot(timezone.make_aware(datetime.datetime(2024, 2, 22, 0, 0)))
+        make_slot(timezone.make_aware(datetime.datetime(2024, 2, 21, 9, 0)), is_booked=True)
+        morning = make_slot(timezone.make_aware(datetime.datetime(2024, 2, 21, 8, 0)))
+        self.assertEqual(self.available_ids("2024-02-21"), [morning.pk, late.pk])
+        self.assertEqual(self.available_ids("2024-02-22"), [early.pk])
+
+    def test_lookup_compares_raw_start_time(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.available_ids("2024-02-21")
+        sql = queries[-1]['sql']
+        self.assertNotIn('django_datetime_cast_date', sql)
+        self.assertIn('"app_slot"."start_time" >=', sql)
+
+    def test_invalid_date(self):
+        response = self.client.execute('query { availableSlots(date: "21/02/2024") { id } }')
+        self.assertIn('YYYY-MM-DD', str(response.get('errors')))
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class AvailabilityCacheTestCase(TestCase):
+    def setUp(self):
+        self.cache = get_availability_cache()
+        self.cache.clear()
+        self.client = Client(schema)
+        self.slot = make_slot(timezone.make_aware(datetime.datetime(2024, 2, 21, 10, 0)))
+        self.other_day = make_slot(timezone.make_aware(datetime.datetime(2024, 2, 22, 10, 0)))
+
+    def available_ids(self, date):
+        response = self.client.execute('query { availableSlots(date: "%s") { id } }' % date)
+        self.assertIsNone(response.get('errors'), msg=str(response.get('errors')))
+        return [int(slot['id']) for slot in response['data']['availableSlots']]
+
+    def test_repeated_lookups_hit_the_cache(self):
+        self.available_ids("2024-02-21")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.available_ids("2024-02-21"), [self.slot.pk])
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_booking_makes_cached_date_stale_immediately(self):
+        self.available_ids("2024-02-21")
+        self.available_ids("2024-02-22")
+        reserve_slot(self.slot.id, **booking_fields())
+        self.assertEqual(self.available_ids("2024-02-21"), [])
+        # Other dates keep their entries
+        hits = self.cache.stats()['hits']
+        self.assertEqual(self.available_ids("2024-02-22"), [self.other_day.pk])
+        self.assertEqual(self.cache.stats()['hits'], hits + 1)
+
+    def test_booking_delete_frees_cached_date(self):
+        booking = reserve_slot(self.slot.id, **booking_fields())
+        self.assertEqual(self.available_ids("2024-02-21"), [])
+        delete_booking(booking.pk)
+        self.assertEqual(self.available_ids("2024-02-21"), [self.slot.pk])
+
+    def test_moving_a_slot_invalidates_both_dates(self):
+        self.available_ids("2024-02-21")
+        self.available_ids("2024-02-23")
+        slot = Slot.objects.get(pk=self.slot.pk)
+        slot.start_time += datetime.timedelta(days=2)
+        slot.end_time += datetime.timedelta(days=2)
+        slot.save()
+        self.assertEqual(self.available_ids("2024-02-21"), [])
+        self.assertEqual(self.available_ids("2024-02-23"), [self.slot.pk])
+
+    def test_lru_is_bounded(self):
+        cache = AvailabilityCache(max_entries=2)
+        for day in range(1, 4):
+            cache.get_or_load(datetime.date(2024, 2, day), list)
+        self.assertEqual(cache.stats()['entries'], 2)
+        cache.get_or_load(datetime.date(2024, 2, 1), list)
+        self.assertEqual(cache.stats()['misses'], 4)
+
+    @override_settings(CACHES={'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared-test'}})
+    def test_shared_tier_invalidates_other_processes(self):
+        writer = AvailabilityCache(backend='shared')
+        reader = AvailabilityCache(backend='shared')
+        day = datetime.date(2024, 2, 21)
+        self.assertEqual(reader.get_or_load(day, lambda: ['before']), ['before'])
+        writer.invalidate(day)
+        self.assertEqual(reader.get_or_load(day, lambda: ['after']), ['after'])
+        self.assertEqual(writer.get_or_load(day, lambda: ['unused']), ['after'])
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, SLOT_AVAILABILITY_COALESCE_WINDOW=0,
+                   SUBSCRIPTION_OUTBOX=DIRECT_PUBLISHING)
+class TopicSubscriptionTestCase(TransactionTestCase):
+    def setUp(self):
+        self.slot = make_slot(timezone.make_aware(datetime.datetime(2024, 2, 21, 10, 0)))
+
+    def test_events_reach_only_matching_topics(self):
+        async_to_sync(self._test_events_reach_only_matching_topics)()
+
+    async def _test_events_reach_only_matching_topics(self):
+        everything = await open_subscription('subscription { bookingCreated { bookerFirstName } }')
+        same_day = await open_subscription('subscription { bookingCreated(date: "2024-02-21") { bookerFirstName } }')
+        other_day = await open_subscription('subscription { bookingCreated(date: "2024-02-22") { bookerFirstName } }')
+
+        booking = await write_in_thread(reserve_slot)(self.slot.id, **booking_fields(booker_first_name="Topic"))
+
+        for communicator in (everything, same_day):
+            message = await communicator.receive_json_from()
+            self.assertEqual(message['payload']['data'], {'bookingCreated': {'bookerFirstName': "Topic"}})
+        self.assertTrue(await other_day.receive_nothing())
+
+        by_id = await open_subscription('subscription { bookingUpdated(bookingId: "%s") { status } }' % booking.booking_id)
+        booking.status = 'cancelled'
+        await write_in_thread(booking.save)()
+        message = await by_id.receive_json_from()
+        self.assertEqual(message['payload']['data'], {'bookingUpdated': {'status': "CANCELLED"}})
+        self.assertTrue(await same_day.receive_nothing())
+
+        for communicator in (everything, same_day, other_day, by_id):
+            await communicator.disconnect()
+
+    def test_stop_leaves_the_operations_topics(self):
+        async_to_sync(self._test_stop_leaves_the_operations_topics)()
+
+    async def _test_stop_leaves_the_operations_topics(self):
+        query = 'subscription { bookingCreated(date: "2024-02-21") { bookerFirstName } }'
+        communicator = await open_subscription(query)
+        await communicator.send_json_to({'id': '2', 'type': 'start', 'payload': {
+            'query': 'subscription { bookingCreated { bookerFirstName } }'}})
+        await communicator.send_json_to({'id': '1', 'type': 'stop'})
+        await communicator.receive_nothing()
+        joined = {topic for topic, channels in get_channel_layer().groups.items() if channels}
+        # Operation 2 still listens on the topic without a date
+        self.assertIn(booking_topic('created'), joined)
+        self.assertNotIn(booking_topic('created', date=datetime.date(2024, 2, 21)), joined)
+
+        await communicator.send_json_to({'id': '2', 'type': 'stop'})
+        await communicator.send_json_to({'id': '3', 'type': 'start', 'payload': {'query': query}})
+        await communicator.receive_nothing()
+        await write_in_thread(reserve_slot)(self.slot.id, **booking_fields(booker_first_name="Again"))
+        message = await communicator.receive_json_from()
+        self.assertEqual((message['id'], message['payload']['data']), ('3', {'bookingCreated': {'bookerFirstName': "Again"}}))
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+
+class AvailabilityCoalescerTestCase(TestCase):
+    def test_burst_is_coalesced_per_date(self):
+        published = []
+        coalescer = AvailabilityCoalescer(60, publish=lambda topics, event: published.append((topics, event.instance)))
+        day, other_day = datetime.date(2024, 2, 21), datetime.date(2024, 2, 22)
+        for slot_id in (3, 1, 2, 1):
+            coalescer.add(day, slot_id, True)
+        coalescer.add(day, 1, False)
+        coalescer.add(other_day, 7, True)
+        self.assertEqual(published, [])
+
+        coalescer.flush()
+        self.assertEqual(published, [
+            ([availability_topic(day)], [[1, False], [2, True], [3, True]]),
+            ([availability_topic(other_day)], [[7, True]]),
+        ])
+
+    def test_zero_window_publishes_immediately(self):
+        published = []
+        coalescer = AvailabilityCoalescer(0, publish=lambda topics, event: published.append(event.instance))
+        coalescer.add(datetime.date(2024, 2, 21), 1, True)
+        self.assertEqual(published, [[[1, True]]])
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class SubscriptionEventCodecTestCase(TestCase):
+    def setUp(self):
+        self.slot = make_slot(timezone.make_aware(datetime.datetime(2024, 2, 21, 10, 0)), capacity=2)
+        self.booking = reserve_slot(self.slot.id, **booking_fields(booker_first_name="Codec"))
+
+    def published_frames(self, write):
+        # The booking events, leaving out availability deltas
+        with mock.patch('app.subscriptions.encode_event', wraps=encode_event) as encode:
+            write()
+        return [encode_event(call.args[0]) for call in encode.call_args_list if call.args[0].operation != 'availability_changed']
+
+    def test_updates_carry_only_changed_fields(self):
+        booking = Booking.objects.get(pk=self.booking.pk)
+        booking.status = 'cancelled'
+        [frame] = self.published_frames(booking.save)
+        _, label, pk, operation, data = msgpack.unpackb(frame, timestamp=3)
+        self.assertEqual((label, pk, operation, data), ('app.booking', booking.pk, 'updated', {'status': 'cancelled'}))
+
+        # The saved state is the new baseline
+        booking.booker_first_name = "Renamed"
+        [frame] = self.published_frames(booking.save)
+        self.assertEqual(msgpack.unpackb(frame)[4], {'booker_first_name': "Renamed"})
+
+    def test_created_and_deleted_events_need_no_query(self):
+        [frame] = self.published_frames(lambda: reserve_slot(self.slot.id, **booking_fields()))
+        with self.assertNumQueries(0):
+            event = decode_event(frame)
+        created = Booking.objects.exclude(pk=self.booking.pk).get()
+        self.assertEqual(event.operation, 'created')
+        self.assertEqual((event.instance.pk, event.instance.booking_id, event.instance.slot_id,
+                          event.instance.booker_phone, event.instance.hold_expires_at),
+                         (created.pk, created.booking_id, self.slot.pk, created.booker_phone, None))
+
+        [frame] = self.published_frames(lambda: delete_booking(created.pk))
+        with self.assertNumQueries(0):
+            event = decode_event(frame)
+        self.assertEqual((event.operation, event.instance.booking_id, event.instance.status),
+                         ('deleted', created.booking_id, 'confirmed'))
+
+    def test_cache_decodes_each_frame_once(self):
+        booking = Booking.objects.get(pk=self.booking.pk)
+        booking.status = 'cancelled'
+        [frame] = self.published_frames(booking.save)
+        cache = EventCache(max_entries=2)
+        # One read for the fields the frame leaves out, shared by every consumer
+        with self.assertNumQueries(1):
+            events = [cache.decode(bytes(frame)) for _ in range(3)]
+        self.assertTrue(all(event is events[0] for event in events))
+        self.assertEqual((events[0].instance.status, events[0].instance.booker_first_name), ('cancelled', "Codec"))
+
+        for _ in range(2):
+            cache.decode(encode_event(SubscriptionEvent('availability_changed', [[1, True]])))
+        self.assertIsNot(cache.decode(frame), events[0])
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, SLOT_AVAILABILITY_COALESCE_WINDOW=0,
+                   SUBSCRIPTION_OUTBOX=DIRECT_PUBLISHING)
+class SlotAvailabilitySubscriptionTestCase(TransactionTestCase):
+    def setUp(self):
+        self.slot = make_slot(timezone.make_aware(datetime.datetime(2024, 2, 21, 10, 0)))
+
+    def test_booking_and_cancellation_push_deltas(self):
+        async_to_sync(self._test_booking_and_cancellation_push_deltas)()
+
+    async def _test_booking_and_cancellation_push_deltas(self):
+        slot = self.slot
+        communicator = await open_subscription(
+            'subscription { slotAvailabilityChanged(date: "2024-02-21") { slotId isBooked } }'
+        )
+        try:
+            booking = await write_in_thread(reserve_slot)(slot.id, **booking_fields())
+            message = await communicator.receive_json_from()
+            self.assertEqual(message['payload']['data'], {'slotAvailabilityChanged': [{'slotId': str(slot.id), 'isBooked': True}]})
+
+            await write_in_thread(delete_booking)(booking.pk)
+            message = await communicator.receive_json_from()
+            self.assertEqual(message['payload']['data'], {'slotAvailabilityChanged': [{'slotId': str(slot.id), 'isBooked': False}]})
+        finally:
+            await communicator.disconnect()
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS,
+                   GRAPHQL_METRICS={'MAX_OPERATIONS': 100, 'TIMING_HEADER': 'X-GraphQL-Timing'})
+class GraphQLMetricsTestCase(TestCase):
+    def setUp(self):
+        first = timezone.make_aware(datetime.datetime(2024, 2, 21, 9, 0))
+        for i in range(3):
+            slot = make_slot(first + datetime.timedelta(hours=i))
+            Booking.objects.create(slot=slot, **booking_fields())
+
+    def post(self, query, **headers):
+        response = self.client.post('/graphql/', {'query': query}, content_type='application/json', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_timing_extension_on_request(self):
+        query = 'query Bookings { allBookings { bookingId slot { startTime } } }'
+        self.assertNotIn('extensions', self.post(query))
+
+        timing = self.post(query, **{'X-GraphQL-Timing': '1'})['extensions']['timing']
+        # allBookings joined with the slots it selects
+        self.assertEqual(timing['sqlQueries'], 1)
+        self.assertGreater(timing['duration'], 0)
+        self.assertEqual(timing['resolvers']['Query.allBookings']['calls'], 1)
+        self.assertEqual(timing['resolvers']['Query.allBookings']['sqlQueries'], 1)
+        self.assertEqual(timing['resolvers']['BookingType.slot']['calls'], 3)
+        # Scalar fields are not timed
+        self.assertNotIn('BookingType.bookingId', timing['resolvers'])
+
+    def test_metrics_endpoint(self):
+        self.post('query Bookings { allBookings { slot { id } } }')
+        self.post('{ allSlots { id } }')
+
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE graphql_operation_duration_seconds histogram', body)
+        self.assertIn('graphql_operation_duration_seconds_count{operation="Bookings"} 1', body)
+        self.assertIn('graphql_operation_duration_seconds_count{operation="anonymous"} 1', body)
+        self.assertIn('graphql_operation_sql_queries_bucket{operation="Bookings",le="2"} 1', body)
+        self.assertIn('graphql_resolver_duration_seconds_count{field="BookingType.slot"} 3', body)
+        self.assertIn('graphql_resolver_sql_queries_count{field="Query.allSlots"} 1', body)
+
+    def test_operation_names_are_capped(self):
+        metrics = GraphQLMetrics(max_operations=2)
+        timing = OperationTiming()
+        for name in ('a', 'b', 'c', 'd'):
+            metrics.observe(name, timing)
+        self.assertEqual(set(metrics.operation_duration.series), {'a', 'b', OVERFLOW_LABEL})
+        self.assertEqual(metrics.operation_duration.series[OVERFLOW_LABEL].count, 2)
+
+    def test_histogram_buckets_are_cumulative(self):
+        family = HistogramFamily('h', 'help', 'label', (1, 5))
+        for value in (0, 1, 3, 7):
+            family.observe('x', value)
+        self.assertEqual(family.render()[2:], [
+            'h_bucket{label="x",le="1"} 2',
+            'h_bucket{label="x",le="5"} 3',
+            'h_bucket{label="x",le="+Inf"} 4',
+            'h_sum{label="x"} 11.0',
+            'h_count{label="x"} 4',
+        ])
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS,
+                   GRAPHQL_DOCUMENTS={'MAX_ENTRIES': 500, 'PERSISTED_QUERIES': 'persisted_queries'})
+class DocumentCacheTestCase(TestCase):
+    query = '{ allSlots { id isBooked } }'
+
+    def setUp(self):
+        make_slot(timezone.make_aware(datetime.datetime(2024, 2, 21, 10, 0)))
+        caches['persisted_queries'].clear()
+        self.documents = get_document_cache()
+        self.documents.clear()
+
+    def post(self, body):
+        return self.client.post('/graphql/', body, content_type='application/json')
+
+    def persisted(self, sha256_hash=None):
+        return {'persistedQuery': {'version': 1, 'sha256Hash': sha256_hash or query_hash(self.query)}}
+
+    def test_repeated_query_is_parsed_once(self):
+        for _ in range(3):
+            response = self.post({'query': self.query})
+            self.assertEqual(response.json(), {'data': {'allSlots': [{'id': "1", 'isBooked': False}]}})
+        self.assertEqual(self.documents.stats(), {'hits': 2, 'misses': 1, 'entries': 1})
+
+    def test_validation_errors_are_cached(self):
+        for _ in range(2):
+            response = self.post({'query': '{ allSlots { nope } }'})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('Cannot query field "nope"', response.json()['errors'][0]['message'])
+        self.assertEqual(self.documents.stats()['hits'], 1)
+
+    def test_lru_is_bounded(self):
+        documents = DocumentCache(max_entries=2)
+        for field in ('id', 'startTime', 'endTime'):
+            documents.document_from_string(schema, '{ allSlots { %s } }' % field)
+        self.assertEqual(documents.stats()['entries'], 2)
+        documents.document_from_string(schema, '{ allSlots { endTime } }')
+        self.assertEqual(documents.stats()['hits'], 1)
+
+    def test_automatic_persisted_query_flow(self):
+        response = self.post({'extensions': self.persisted()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['errors'][0]['message'], 'PersistedQueryNotFound')
+        self.assertEqual(response.json()['errors'][0]['extensions'], {'code': 'PERSISTED_QUERY_NOT_FOUND'})
+
+        response = self.post({'query': self.query, 'extensions': self.persisted()})
+        self.assertEqual(response.json()['data']['allSlots'][0]['id'], "1")
+
+        response = self.post({'extensions': self.persisted()})
+        self.assertEqual(response.json()['data']['allSlots'][0]['id'], "1")
+
+        # Another process (or an evicted LRU entry) falls back to the shared store
+        self.documents.clear()
+        response = self.client.get('/graphql/', {'extensions': json.dumps(self.persisted())},
+                                   HTTP_ACCEPT='application/json')
+        self.assertEqual(response.json()['data']['allSlots'][0]['id'], "1")
+
+    def test_hash_must_match_query(self):
+        response = self.post({'query': self.query, 'extensions': self.persisted('0' * 64)})
+        self.assertEqual(response.json()['errors'][0]['message'], 'provided sha does not match query')
+        self.assertIsNone(caches['persisted_queries'].get('apq:' + '0' * 64))
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, SLOT_AVAILABILITY_COALESCE_WINDOW=0, GRAPHQL_WORKER_THREADS=2)
+class AsgiHttpTestCase(TransactionTestCase):
+    def setUp(self):
+        self.slot = make_slot(timezone.make_aware(datetime.datetime(2024, 2, 21, 10, 0)))
+
+    def test_graphql_over_asgi_runs_on_worker_pool(self):
+        from backend.routing import application
+
+        threads = []
+        run_in_worker = views._run_in_worker
+
+        def record_thread(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return run_in_worker(*args, **kwargs)
+
+        async def post():
+            communicator = HttpCommunicator(
+                application, 'POST', '/graphql/', body=json.dumps({'query': '{ allSlots { id } }'}).encode(),
+                headers=[(b'content-type', b'application/json'), (b'host', b'testserver')],
+            )
+            return await communicator.get_response()
+
+        with mock.patch('app.views._run_in_worker', record_thread):
+            response = async_to_sync(post)()
+
+        self.assertEqual(response['status'], 200)
+        self.assertEqual(json.loads(response['body']), {'data': {'allSlots': [{'id': str(self.slot.id)}]}})
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith('graphql'))
+        self.assertEqual(views.get_graphql_executor()._max_workers, 2)
+
+
+def write_booking_ids(generator, count, path):
+    # Runs in a forked worker; each process must lease its own node id
+    with open(path, 'w') as out:
+        previous = ''
+        for _ in range(count):
+            booking_id = generator()
+            if booking_id <= previous:
+                raise AssertionError(f'{booking_id} does not sort after {previous}')
+            out.write(booking_id + '\n')
+            previous = booking_id
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class BookingIdGeneratorTestCase(TestCase):
+    def setUp(self):
+        self.lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.lock_dir)
+
+    def test_ids_are_unique_across_worker_processes(self):
+        workers, per_worker = 4, 500_000
+        generator = SnowflakeIdGenerator(lock_dir=self.lock_dir)
+        generator()  # The parent holds a process slot before forking
+        context = multiprocessing.get_context('fork')
+        paths = [os.path.join(self.lock_dir, f'ids-{i}.txt') for i in range(workers)]
+        processes = [context.Process(target=write_booking_ids, args=(generator, per_worker, path)) for path in paths]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual([process.exitcode for process in processes], [0] * workers)
+
+        # Each file is sorted, so duplicates would be adjacent in the merge
+        files = [open(path) for path in paths]
+        try:
+            previous, total = None, 0
+            for booking_id in heapq.merge(*files):
+                self.assertNotEqual(booking_id, previous)
+                previous, total = booking_id, total + 1
+        finally:
+            for file in files:
+                file.close()
+        self.assertEqual(total, workers * per_worker)
+
+    def test_sequence_overflow_and_clock_going_back_keep_ids_increasing(self):
+        now = [1_710_000_000.0]
+        generator = SnowflakeIdGenerator(node_id=5, clock=lambda: now[0])
+        ids = [generator() for _ in range(MAX_SEQUENCE + 10)]
+        now[0] -= 5
+        ids += [generator() for _ in range(10)]
+        self.assertEqual(ids, sorted(set(ids)))
+        created, node_id, sequence = parse_booking_id(ids[-1])
+        self.assertEqual(node_id, 5)
+        # The overflow borrowed the next millisecond rather than waiting for it
+        self.assertEqual(created.timestamp(), now[0] + 5 + 0.001)
+        self.assertEqual(sequence, 18)
+
+    def test_processes_on_a_host_lease_distinct_nodes(self):
+        first = SnowflakeIdGenerator(host_id=3, lock_dir=self.lock_dir)
+        second = SnowflakeIdGenerator(host_id=3, lock_dir=self.lock_dir)
+        self.assertEqual((first.node_id, second.node_id), (96, 97))
+
+    def test_new_ids_sort_after_legacy_ids(self):
+        slot = make_slot(timezone.make_aware(datetime.datetime(2024, 2, 21, 10, 0)))
+        legacy = Booking.objects.create(booking_id='BK-2402211030-9f3a', slot=slot, **booking_fields())
+        with override_settings(BOOKING_IDS={'NODE_ID': 1}):
+            booking = reserve_slot(make_slot(slot.end_time).id, **booking_fields())
+        self.assertRegex(booking.booking_id, r'^BK-[G-K][0-9A-Z]{12}$')
+        self.assertGreater(booking.booking_id, legacy.booking_id)
+        self.assertIsNone(parse_booking_id(legacy.booking_id))
+
+    @override_settings(BOOKING_IDS={'GENERATOR': 'app.booking_ids.LegacyIdGenerator'})
+    def test_generator_is_pluggable(self):
+        booking = Booking.objects.create(slot=make_slot(timezone.now()), **booking_fields())
+        self.assertRegex(booking.booking_id, r'^BK-\d{10}-[0-9a-f]{4}$')
+
+
+class DatabaseProfileTestCase(TestCase):
+    def test_sqlite_pragmas_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def journal_mode(self, path):
+        wrapper = connections['default'].__class__({**connection.settings_dict, 'NAME': path}, alias='wal_check')
+        wrapper.connect()
+        try:
+            return wrapper.cursor().execute('PRAGMA journal_mode').fetchone()[0]
+        finally:
+            wrapper.close()
+
+    def test_journal_mode_only_switched_when_configured(self):
+        path = os.path.join(tempfile.mkdtemp(), 'db.sqlite3')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        pragmas = {name: value for name, value in settings.SQLITE_PRAGMAS.items() if name != 'journal_mode'}
+        with self.settings(SQLITE_PRAGMAS=pragmas):
+            self.assertEqual(self.journal_mode(path), 'delete')
+        with self.settings(SQLITE_PRAGMAS={'journal_mode': 'WAL', **pragmas}):
+            self.assertEqual(self.journal_mode(path), 'wal')
+
+
+class FakeClock:
+    """Stands in for app.services.clock; time only moves when advanced."""
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, **kwargs):
+        self.now += datetime.timedelta(**kwargs)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, SLOT_HOLD_TTL=600)
+class SlotHoldTestCase(TestCase):
+    def setUp(self):
+        self.slot = make_slot(timezone.make_aware(datetime.datetime(2024, 2, 21, 10, 0)))
+        self.clock = FakeClock(timezone.make_aware(datetime.datetime(2024, 2, 20, 12, 0)))
+        patcher = mock.patch('app.services.clock', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def confirm(self, booking_id):
+        return Client(schema).execute('''
+            mutation ($bookingId: ID!) {
+                confirmBooking(bookingId: $bookingId, bookerFirstName: "Held", bookerLastName: "User",
+                               bookerEmail: "held@example.com", bookerPhone: "+12125552368") {
+                    booking { status holdExpiresAt bookerFirstName slot { isBooked } }
+                }
+            }
+        ''', variables={'bookingId': booking_id})
+
+    def test_hold_then_confirm(self):
+        response = Client(schema).execute('''
+            mutation ($slotId: ID!) { holdSlot(slotId: $slotId) { booking { bookingId status holdExpiresAt } } }
+        ''', variables={'slotId': str(self.slot.id)})
+        hold = response['data']['holdSlot']['booking']
+        self.assertEqual(hold['status'], "PENDING")
+        self.assertEqual(hold['holdExpiresAt'], (self.clock.now + datetime.timedelta(minutes=10)).isoformat())
+
+        # Held slots cannot be booked by anyone else
+        with self.assertRaises(SlotUnavailable):
+            reserve_slot(self.slot.id, **booking_fields())
+
+        self.clock.advance(minutes=9)
+        response = self.confirm(hold['bookingId'])
+        self.assertEqual(response['data']['confirmBooking']['booking'], {
+            'status': "CONFIRMED", 'holdExpiresAt': None, 'bookerFirstName': "Held", 'slot': {'isBooked': True},
+        })
+        self.clock.advance(hours=1)
+        self.assertEqual(release_expired_holds(), 0)
+
+    def test_sweeper_releases_expired_holds_in_expiry_order(self):
+        later_slot = make_slot(self.slot.end_time)
+        first = hold_slot(self.slot.id, ttl=60)
+        second = hold_slot(later_slot.id, ttl=120)
+
+        self.clock.advance(seconds=90)
+        self.assertEqual(next_hold_expiry(), first.hold_expires_at)
+        self.assertEqual(release_expired_holds(), 1)
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'expired')
+        self.slot.refresh_from_db()
+        self.assertFalse(self.slot.is_booked)
+        self.assertEqual(Booking.objects.get(pk=second.pk).status, 'pending')
+
+        response = self.confirm(first.booking_id)
+        self.assertIn('This hold has expired.', str(response['errors']))
+
+        self.clock.advance(seconds=60)
+        out = StringIO()
+        call_command('release_expired_holds', stdout=out)
+        self.assertIn('Released 1 expired holds', out.getvalue())
+        self.assertIsNone(next_hold_expiry())
+
+    def test_expired_hold_does_not_block_booking_before_sweep(self):
+        hold = hold_slot(self.slot.id, ttl=60)
+        self.clock.advance(seconds=61)
+        response = self.confirm(hold.booking_id)
+        self.assertIn('This hold has expired.', str(response['errors']))
+
+        booking = reserve_slot(self.slot.id, **booking_fields())
+        self.assertEqual(booking.status, 'confirmed')
+        self.assertEqual(Booking.objects.get(pk=hold.pk).status, 'expired')
+
+    def test_sweep_reads_the_expiry_index(self):
+        queryset = Booking.objects.filter(status='pending', hold_expires_at__lte=self.clock.now).order_by(
+            'hold_expires_at').values_list('pk', flat=True)
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('booking_hold_expiry_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, SLOT_AVAILABILITY_COALESCE_WINDOW=0,
+                   SUBSCRIPTION_OUTBOX=DIRECT_PUBLISHING)
+class SlotHoldSubscriptionTestCase(TransactionTestCase):
+    def setUp(self):
+        self.slot = make_slot(timezone.make_aware(datetime.datetime(2024, 2, 21, 10, 0)))
+        self.clock = FakeClock(timezone.make_aware(datetime.datetime(2024, 2, 20, 12, 0)))
+        patcher = mock.patch('app.services.clock', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_released_hold_pushes_delta(self):
+        async_to_sync(self._test_released_hold_pushes_delta)()
+
+    async def _test_released_hold_pushes_delta(self):
+        communicator = await open_subscription(
+            'subscription { slotAvailabilityChanged(date: "2024-02-21") { slotId isBooked } }'
+        )
+        try:
+            await write_in_thread(hold_slot)(self.slot.id, ttl=60)
+            message = await communicator.receive_json_from()
+            self.assertEqual(message['payload']['data'],
+                             {'slotAvailabilityChanged': [{'slotId': str(self.slot.id), 'isBooked': True}]})
+
+            self.clock.advance(minutes=2)
+            self.assertEqual(await write_in_thread(release_expired_holds)(), 1)
+            message = await communicator.receive_json_from()
+            self.assertEqual(message['payload']['data'],
+                             {'slotAvailabilityChanged': [{'slotId': str(self.slot.id), 'isBooked': False}]})
+        finally:
+            await communicator.disconnect()
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class DailyAvailabilityTestCase(TestCase):
+    def setUp(self):
+        get_availability_cache().clear()
+        self.first_day = datetime.date(2024, 2, 21)
+        self.slots = [
+            make_slot(timezone.make_aware(datetime.datetime.combine(self.first_day + datetime.timedelta(days=day),
+                                                                    datetime.time(hour))))
+            for day in range(2) for hour in (9, 10, 11)
+        ]
+
+    def assertCountsMatchSlots(self, expected):
+        counts = {row.date: (row.total_slots, row.open_slots)
+                  for row in DailyAvailability.objects.exclude(total_slots=0, open_slots=0)}
+        self.assertEqual(counts, {day: (total, open_) for day, total, open_ in count_slots_by_day()})
+        self.assertEqual(counts, expected)
+
+    def test_write_paths_keep_counts_current(self):
+        day1, day2 = self.first_day, self.first_day + datetime.timedelta(days=1)
+        self.assertCountsMatchSlots({day1: (3, 3), day2: (3, 3)})
+
+        booking = reserve_slot(self.slots[0].id, **booking_fields())
+        reserve_slots([{'slot_id': slot.id, **booking_fields()} for slot in self.slots[3:5]])
+        self.assertCountsMatchSlots({day1: (3, 2), day2: (3, 1)})
+
+        cancel_booking(booking.pk)
+        self.assertCountsMatchSlots({day1: (3, 3), day2: (3, 1)})
+
+        with mock.patch('app.services.clock', FakeClock(timezone.now())) as clock:
+            hold_slot(self.slots[1].id, ttl=60)
+            self.assertCountsMatchSlots({day1: (3, 2), day2: (3, 1)})
+            clock.advance(minutes=5)
+            release_expired_holds()
+        self.assertCountsMatchSlots({day1: (3, 3), day2: (3, 1)})
+
+        # A booked slot moved to the other day takes its booked state with it
+        moved = Slot.objects.get(pk=self.slots[3].pk)
+        moved.start_time -= datetime.timedelta(days=1, hours=4)
+        moved.end_time -= datetime.timedelta(days=1, hours=4)
+        moved.save()
+        self.assertCountsMatchSlots({day1: (4, 3), day2: (2, 1)})
+
+        moved.is_booked = False
+        moved.save()
+        Slot.objects.get(pk=self.slots[5].pk).delete()
+        self.assertCountsMatchSlots({day1: (4, 4), day2: (1, 0)})
+
+        create_missing_slots(range_slots(day1, day2 + datetime.timedelta(days=1), 9, 12))
+        self.assertCountsMatchSlots({day1: (4, 4), day2: (3, 2), day2 + datetime.timedelta(days=1): (3, 3)})
+
+    def test_inserted_slots_count_only_rows_written(self):
+        # An existing slot passed in again, as when a concurrent run inserted it first
+        day = self.first_day + datetime.timedelta(days=1)
+        slots = [Slot(start_time=start, end_time=end) for start, end in range_slots(day, day, 11, 14)]
+        self.assertEqual(insert_slots(slots), 2)
+        self.assertCountsMatchSlots({self.first_day: (3, 3), day: (5, 5)})
+
+    def test_calendar_reads_counts_in_one_query(self):
+        reserve_slot(self.slots[0].id, **booking_fields())
+        query = '''
+            query { availabilityCalendar(from: "2024-02-20", to: "2024-02-23") { days { date totalSlots openSlots } } }
+        '''
+        with self.assertNumQueries(1):
+            response = Client(schema).execute(query)
+        self.assertEqual(response['data']['availabilityCalendar']['days'], [
+            {'date': "2024-02-20", 'totalSlots': 0, 'openSlots': 0},
+            {'date': "2024-02-21", 'totalSlots': 3, 'openSlots': 2},
+            {'date': "2024-02-22", 'totalSlots': 3, 'openSlots': 3},
+            {'date': "2024-02-23", 'totalSlots': 0, 'openSlots': 0},
+        ])
+
+    def test_calendar_with_open_slots_for_a_day(self):
+        reserve_slot(self.slots[0].id, **booking_fields())
+        response = Client(schema).execute('''
+            query {
+                availabilityCalendar(from: "2024-02-21", to: "2024-02-22", day: "2024-02-21") {
+                    day days { openSlots } openSlots { id }
+                }
+            }
+        ''')
+        self.assertEqual(response['data']['availabilityCalendar'], {
+            'day': "2024-02-21",
+            'days': [{'openSlots': 2}, {'openSlots': 3}],
+            'openSlots': [{'id': str(slot.id)} for slot in self.slots[1:3]],
+        })
+
+    def test_calendar_rejects_bad_ranges(self):
+        for date_from, date_to in (("2024-02-22", "2024-02-21"), ("2024-01-01", "2025-01-01")):
+            response = Client(schema).execute('query { availabilityCalendar(from: "%s", to: "%s") { day } }'
+                                              % (date_from, date_to))
+            self.assertIsNotNone(response.get('errors'))
+
+    def test_rebuild_command_recounts_from_slots(self):
+        # Raw writes bypass the signals and leave the summary behind
+        Slot.objects.filter(pk=self.slots[0].pk).update(is_booked=True)
+        DailyAvailability.objects.filter(date=self.first_day + datetime.timedelta(days=1)).delete()
+
+        out = StringIO()
+        call_command('rebuild_daily_availability', '--from', '2024-02-21', stdout=out)
+        self.assertIn('Recounted availability for 2 days', out.getvalue())
+        self.assertCountsMatchSlots({self.first_day: (3, 2), self.first_day + datetime.timedelta(days=1): (3, 3)})
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class ArchiveTestCase(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.old_slots = [make_slot(now - datetime.timedelta(days=400, hours=i), capacity=2) for i in range(3)]
+        self.old_bookings = [reserve_slot(self.old_slots[0].id, **booking_fields(booker_first_name=name))
+                             for name in ("Ada", "Grace")]
+        self.old_bookings.append(reserve_slot(self.old_slots[2].id, **booking_fields()))
+        self.recent_slot = make_slot(now - datetime.timedelta(days=10))
+        self.recent_booking = reserve_slot(self.recent_slot.id, **booking_fields())
+        self.slotless_booking = Booking.objects.create(slot=None, **booking_fields(status='pending'))
+
+    def test_moves_old_slots_with_their_bookings(self):
+        daily_counts = list(DailyAvailability.objects.values_list('date', 'total_slots', 'open_slots'))
+        # One slot per batch, so the cursor has to carry on across transactions
+        result = archive_slots(archive_cutoff(retention_days=365), batch_size=1)
+
+        self.assertEqual((result.slots, result.bookings), (3, 3))
+        self.assertEqual(list(Slot.objects.values_list('pk', flat=True)), [self.recent_slot.pk])
+        self.assertEqual(set(Booking.objects.values_list('pk', flat=True)),
+                         {self.recent_booking.pk, self.slotless_booking.pk})
+
+        archived = ArchivedBooking.objects.get(booking_id=self.old_bookings[0].booking_id)
+        self.assertEqual((archived.pk, archived.slot_id, archived.booker_first_name),
+                         (self.old_bookings[0].pk, self.old_slots[0].pk, "Ada"))
+        self.assertEqual(ArchivedSlot.objects.get(pk=self.old_slots[0].pk).booked_count, 2)
+        # History stays on the calendar
+        self.assertEqual(list(DailyAvailability.objects.values_list('date', 'total_slots', 'open_slots')),
+                         daily_counts)
+
+        self.assertEqual(archive_slots(archive_cutoff(retention_days=365)).slots, 0)
+
+    def test_archived_bookings_query(self):
+        archive_slots(archive_cutoff(retention_days=365))
+        client = Client(schema)
+        response = client.execute('''
+            query ($bookingId: ID) {
+                archivedBookings(first: 10, bookingId: $bookingId) {
+                    edges { node { bookingId bookerFirstName slot { id capacity } } }
+                }
+            }
+        ''', variables={'bookingId': self.old_bookings[1].booking_id})
+        self.assertEqual(response['data']['archivedBookings']['edges'], [{'node': {
+            'bookingId': self.old_bookings[1].booking_id, 'bookerFirstName': "Grace",
+            'slot': {'id': str(self.old_slots[0].pk), 'capacity': 2},
+        }}])
+
+        response = client.execute('{ allBookings { bookingId } }')
+        self.assertEqual({booking['bookingId'] for booking in response['data']['allBookings']},
+                         {self.recent_booking.booking_id, self.slotless_booking.booking_id})
+
+    def test_command_uses_retention_window(self):
+        out = StringIO()
+        call_command('archive_slots', '--retention-days', '5', stdout=out)
+        self.assertIn('Archived 4 slots and 4 bookings', out.getvalue())
+        self.assertFalse(Slot.objects.exists())
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class ExportImportTestCase(TestCase):
+    def setUp(self):
+        start = timezone.make_aware(datetime.datetime(2024, 3, 1, 9))
+        self.slots = [make_slot(start + datetime.timedelta(days=day), capacity=2) for day in range(3)]
+        self.bookings = [reserve_slot(slot.id, **booking_fields(booker_first_name=f"Booker {slot.pk}"))
+                         for slot in self.slots]
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+    def export(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, response)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_export_is_filtered_by_day(self):
+        rows = [json.loads(line) for line in self.export('/exports/bookings.ndjson?dateFrom=2024-03-02').splitlines()]
+        self.assertEqual([row['booking_id'] for row in rows], [booking.booking_id for booking in self.bookings[1:]])
+        self.assertEqual(datetime.datetime.fromisoformat(rows[0]['slot_start_time']), self.slots[1].start_time)
+        self.assertEqual(rows[0]['booker_phone'], "+12125552368")
+
+    def test_csv_export(self):
+        lines = self.export('/exports/slots.csv?dateTo=2024-03-01').splitlines()
+        self.assertEqual(lines[0], 'id,start_time,end_time,capacity,booked_count,is_booked')
+        self.assertEqual(len(lines), 2)
+        pk, start_time, _, *counts = lines[1].split(',')
+        self.assertEqual((int(pk), datetime.datetime.fromisoformat(start_time)),
+                         (self.slots[0].pk, self.slots[0].start_time))
+        self.assertEqual(counts, ['2', '1', 'False'])
+
+    def test_export_needs_permission(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/exports/slots.ndjson').status_code, 403)
+        self.client.force_login(get_user_model().objects.create_superuser('other', 'other@example.com', 'pw'))
+        self.assertEqual(self.client.get('/exports/slots.xml').status_code, 404)
+        self.assertEqual(self.client.get('/exports/slots.csv?dateFrom=March').status_code, 400)
+
+    def test_import_round_trip(self):
+        slots_csv = self.export('/exports/slots.csv')
+        bookings_ndjson = self.export('/exports/bookings.ndjson')
+        Booking.objects.all().delete()
+        Slot.objects.all().delete()
+
+        with CaptureQueriesContext(connection) as queries:
+            slots = import_rows('slots', read_rows(StringIO(slots_csv), 'csv'), chunk_size=2)
+        self.assertEqual((slots.created, slots.skipped, slots.error_count), (3, 0, 0))
+        # Per chunk of two: the existing slots lookup, the insert, the day totals before and after it
+        # and the day counts
+        self.assertLessEqual(len(queries), 2 * 8)
+
+        bookings = import_rows('bookings', read_rows(StringIO(bookings_ndjson), 'ndjson'), chunk_size=2)
+        self.assertEqual((bookings.created, bookings.skipped, bookings.error_count), (3, 0, 0))
+        self.assertEqual(sorted(Booking.objects.values_list('booking_id', flat=True)),
+                         sorted(booking.booking_id for booking in self.bookings))
+        # Seats were taken again and the calendar counts the imported slots
+        self.assertEqual(list(Slot.objects.order_by('start_time').values_list('booked_count', flat=True)), [1, 1, 1])
+        self.assertEqual(list(DailyAvailability.objects.order_by('date').values_list('total_slots', 'open_slots')),
+                         [(1, 1)] * 3)
+
+        # A second run finds everything in place
+        again = import_rows('bookings', read_rows(StringIO(bookings_ndjson), 'ndjson'))
+        self.assertEqual((again.created, again.skipped), (0, 3))
+
+    def test_import_reports_bad_rows_and_full_slots(self):
+        start = self.slots[0].start_time.isoformat()
+        end = self.slots[0].end_time.isoformat()
+        lines = [
+            json.dumps({**booking_fields(), 'slot_start_time': start, 'slot_end_time': end}),
+            'not json',
+            json.dumps({**booking_fields(booker_phone="12"), 'slot_start_time': start, 'slot_end_time': end}),
+            json.dumps({**booking_fields(), 'slot_start_time': end, 'slot_end_time': start}),
+            # The slot's last seat went to the first line
+            json.dumps({**booking_fields(), 'slot_start_time': start, 'slot_end_time': end}),
+            json.dumps({**booking_fields(status='cancelled'), 'slot_start_time': start, 'slot_end_time': end}),
+        ]
+        path = os.path.join(tempfile.mkdtemp(), 'bookings.ndjson')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, 'w') as file:
+            file.write('\n'.join(lines))
+
+        out, err = StringIO(), StringIO()
+        call_command('import_data', 'bookings', path, stdout=out, stderr=err)
+        self.assertIn('Imported 2 bookings, skipped 0 existing, 4 errors', out.getvalue())
+        errors = err.getvalue().splitlines()
+        self.assertEqual([error.split(':')[0] for error in errors], ['line 2', 'line 3', 'line 4', 'line 5'])
+        self.assertIn('booker_phone', errors[1])
+        self.assertIn('has no seats left', errors[3])
+        self.slots[0].refresh_from_db()
+        self.assertEqual((self.slots[0].booked_count, self.slots[0].is_booked), (2, True))
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS,
+                   SUBSCRIPTION_OUTBOX={'ENABLED': True, 'BATCH_SIZE': 200, 'MAX_ATTEMPTS': 3, 'RETRY_DELAY': 0.5})
+class OutboxTestCase(TestCase):
+    def setUp(self):
+        start = timezone.make_aware(datetime.datetime(2024, 2, 21, 10, 0))
+        self.slots = [make_slot(start + datetime.timedelta(hours=i)) for i in range(2)]
+        self.day = Slot.local_date(start)
+        # Creating the slots recorded their own availability events
+        OutboxEvent.objects.all().delete()
+        self.layer = get_channel_layer()
+        self.channel = async_to_sync(self.layer.new_channel)()
+        for topic in (booking_topic('created'), booking_topic('deleted'), availability_topic(self.day)):
+            async_to_sync(self.layer.group_add)(topic, self.channel)
+
+    def received(self):
+        messages = []
+        while self.layer.channels.get(self.channel):
+            message = async_to_sync(self.layer.receive)(self.channel)
+            event = decode_event(message['event'])
+            messages.append((message['topic'], event.operation, event.instance))
+        return messages
+
+    def test_events_wait_in_outbox_until_dispatched(self):
+        booking = reserve_slot(self.slots[0].id, **booking_fields())
+        self.assertEqual(OutboxEvent.objects.count(), 2)
+        self.assertEqual(self.received(), [])
+
+        result = dispatch_outbox()
+        self.assertEqual((result.events, result.messages, result.batches), (2, 2, 1))
+        [(topic, operation, instance), availability] = self.received()
+        self.assertEqual((topic, operation, instance.booking_id), (booking_topic('created'), 'created', booking.booking_id))
+        self.assertEqual(availability, (availability_topic(self.day), 'availability_changed', [[self.slots[0].pk, True]]))
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_rolled_back_write_leaves_no_event(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            reserve_slot(self.slots[0].id, **booking_fields())
+            raise RuntimeError
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_events_go_out_in_order_with_availability_merged(self):
+        first = reserve_slot(self.slots[0].id, **booking_fields())
+        second = reserve_slot(self.slots[1].id, **booking_fields())
+        delete_booking(first.pk)
+
+        result = dispatch_outbox()
+        self.assertEqual((result.events, result.messages), (6, 4))
+        self.assertEqual([(topic, operation, getattr(instance, 'booking_id', instance))
+                          for topic, operation, instance in self.received()], [
+            (booking_topic('created'), 'created', first.booking_id),
+            # The batch's three availability events, each slot at its latest state
+            (availability_topic(self.day), 'availability_changed', [[self.slots[0].pk, False], [self.slots[1].pk, True]]),
+            (booking_topic('created'), 'created', second.booking_id),
+            (booking_topic('deleted'), 'deleted', first.booking_id),
+        ])
+
+    def test_failed_sends_are_retried_then_left_in_place(self):
+        reserve_slot(self.slots[0].id, **booking_fields())
+        sleeps = []
+        with mock.patch('app.subscriptions.send', side_effect=[ConnectionError, ConnectionError, None]):
+            result = dispatch_outbox(sleep=sleeps.append)
+        self.assertEqual((result.events, result.retries, sleeps), (2, 2, [0.5, 1.0]))
+        self.assertFalse(OutboxEvent.objects.exists())
+
+        reserve_slot(self.slots[1].id, **booking_fields())
+        with mock.patch('app.subscriptions.send', side_effect=ConnectionError), self.assertRaises(ConnectionError):
+            dispatch_outbox(sleep=sleeps.append)
+        # Released for the next run
+        self.assertEqual(OutboxEvent.objects.filter(claimed_by=None).count(), 2)
+
+        err = StringIO()
+        with mock.patch('app.subscriptions.send', side_effect=ConnectionError), self.assertRaises(CommandError), \
+                self.settings(SUBSCRIPTION_OUTBOX={'ENABLED': True, 'RETRY_DELAY': 0}):
+            call_command('dispatch_outbox', stderr=err)
+        out = StringIO()
+        call_command('dispatch_outbox', '--batch-size', '1', stdout=out)
+        self.assertIn('Published 2 events as 2 messages in 2 batches', out.getvalue())
+
+    def test_claimed_events_are_left_to_their_dispatcher(self):
+        reserve_slot(self.slots[0].id, **booking_fields())
+        OutboxEvent.objects.update(claimed_by='other', claimed_at=timezone.now())
+        self.assertEqual(dispatch_outbox().events, 0)
+        self.assertEqual(self.received(), [])
+
+        # That dispatcher stopped before sending them
+        OutboxEvent.objects.update(claimed_at=timezone.now() - datetime.timedelta(seconds=61))
+        self.assertEqual(dispatch_outbox().events, 2)
+        self.assertEqual(len(self.received()), 2)
+        self.assertFalse(OutboxEvent.objects.exists())
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, SLOT_AVAILABILITY_COALESCE_WINDOW=0,
+                   DATABASE_ROUTING={'REPLICA': 'replica', 'STICKY_SECONDS': 5, 'COOKIE': 'primary_reads'})
+class ReplicaRoutingTestCase(TransactionTestCase):
+    # Two separate test databases; replicate_database copies the primary over the replica
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.slot = make_slot(timezone.make_aware(datetime.datetime(2024, 2, 21, 10, 0)))
+
+    def query(self, query, client=None):
+        response = (client or self.client).post('/graphql/', {'query': query}, content_type='application/json')
+        body = response.json()
+        self.assertNotIn('errors', body)
+        return response, body['data']
+
+    def replicate(self):
+        call_command('replicate_database', stdout=StringIO())
+
+    def test_queries_read_from_the_replica(self):
+        self.assertEqual(self.query('{ allSlots { id } }')[1], {'allSlots': []})
+        self.replicate()
+        self.assertEqual(self.query('{ allSlots { id } }')[1], {'allSlots': [{'id': str(self.slot.pk)}]})
+
+    def test_writers_read_their_writes_from_the_primary(self):
+        self.replicate()
+        response, data = self.query('''
+            mutation {
+                createBooking(bookerFirstName: "Test", bookerLastName: "User", bookerEmail: "test@example.com",
+                              bookerPhone: "+12125552368", slotId: "%s", status: "confirmed") {
+                    booking { bookingId slot { isBooked } }
+                }
+            }
+        ''' % self.slot.id)
+        booking = data['createBooking']['booking']
+        self.assertEqual(booking['slot'], {'isBooked': True})
+        self.assertTrue(Booking.objects.using('default').exists())
+        self.assertFalse(Booking.objects.using('replica').exists())
+        self.assertEqual(response.cookies['primary_reads']['max-age'], 5)
+
+        # The test client sends the cookie back; another client reads the lagging replica
+        query = '{ allBookings { bookingId } }'
+        self.assertEqual(self.query(query)[1], {'allBookings': [{'bookingId': booking['bookingId']}]})
+        self.assertEqual(self.query(query, self.client_class())[1], {'allBookings': []})
+        self.replicate()
+        self.assertEqual(self.query(query, self.client_class())[1], {'allBookings': [{'bookingId': booking['bookingId']}]})
+
+    def test_available_slots_are_cached_from_the_primary(self):
+        data = self.query('{ availableSlots(date: "2024-02-21") { id } }')[1]
+        self.assertEqual(data, {'availableSlots': [{'id': str(self.slot.pk)}]})
+
+    def test_reads_after_a_write_or_in_a_transaction_use_the_primary(self):
+        with use_route(Route('replica')) as route, CaptureQueriesContext(connections['replica']) as replica:
+            route.read_from_replica()
+            Slot.objects.count()
+            with transaction.atomic():
+                Slot.objects.count()
+            make_slot(timezone.make_aware(datetime.datetime(2024, 2, 21, 11, 0)))
+            Slot.objects.count()
+        self.assertEqual(len(replica), 1)
+        # Outside a route everything stays on the primary
+        self.assertEqual(Slot.objects.count(), 2)
@@ -0,0 +1,187 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.core.signals import setting_changed
+from django.db import close_old_connections, connections
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from graphene_django.views import GraphQLView
+from graphql import GraphQLError
+from graphql.execution import ExecutionResult
+
+from .dates import parse_date
+from .db import current_route, route_request, stick_to_primary
+from .documents import get_document_cache, persisted_query_hash
+from .exports import EXPORTS, FORMATS as EXPORT_FORMATS, stream_export
+from .metrics import ANONYMOUS_OPERATION, OperationTiming, get_graphql_metrics, metrics_options
+
+
+class InstrumentedGraphQLView(GraphQLView):
+    """
+    GraphQLView that records operation and resolver metrics.
+
+    Every execution gets an OperationTiming on the request, which counts the
+    SQL sent over any database connection while it runs. Sending the
+    configured timing header adds the numbers to the response under
+    ``extensions.timing``.
+    """
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        if not query:
+            return super().execute_graphql_request(request, data, query, variables, operation_name, show_graphiql)
+
+        timing = request.graphql_timing = OperationTiming(operation_name)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timing.sql_wrapper))
+                return super().execute_graphql_request(request, data, query, variables, operation_name, show_graphiql)
+        finally:
+            timing.finish()
+            get_graphql_metrics().observe(timing.operation_name or ANONYMOUS_OPERATION, timing)
+
+    def json_encode(self, request, d, pretty=False):
+        timing = getattr(request, 'graphql_timing', None)
+        if timing is not None and request.headers.get(metrics_options()['TIMING_HEADER']):
+            d = {**d, 'extensions': {'timing': timing.as_dict()}}
+        return super().json_encode(request, d, pretty)
+
+
+class CachedGraphQLView(InstrumentedGraphQLView):
+    """
+    InstrumentedGraphQLView that reuses parsed, validated documents.
+
+    Documents come from the shared DocumentCache, and requests may use
+    automatic persisted queries: a client sends only
+    ``extensions.persistedQuery.sha256Hash``, and on PersistedQueryNotFound
+    sends the hash again together with the query text to register it.
+
+    With a replica in DATABASE_ROUTING, query operations read from it and
+    mutations use the primary; see app.db.
+    """
+
+    def get_backend(self, request):
+        # GraphQLView always fills self.backend with the uncached default backend
+        return get_document_cache()
+
+    def dispatch(self, request, *args, **kwargs):
+        with route_request(request) as route:
+            response = super().dispatch(request, *args, **kwargs)
+            stick_to_primary(response, route)
+        return response
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        try:
+            sha256_hash = persisted_query_hash(data.get('extensions') or request.GET.get('extensions'))
+            if sha256_hash is not None:
+                query = self.get_backend(request).persisted_query(self.schema, sha256_hash, query)
+        except GraphQLError as error:
+            return ExecutionResult(errors=[error])
+        route = current_route()
+        if route is not None and query and self.operation_type(request, query, operation_name) == 'query':
+            route.read_from_replica()
+        return super().execute_graphql_request(request, data, query, variables, operation_name, show_graphiql)
+
+    def operation_type(self, request, query, operation_name):
+        try:
+            # A DocumentCache hit; GraphQLView looks the document up again to execute it
+            return self.get_backend(request).document_from_string(self.schema, query).get_operation_type(operation_name)
+        except Exception:
+            # Left on the primary; GraphQLView reports the error
+            return None
+
+
+_graphql_executor = None
+
+
+def get_graphql_executor():
+    global _graphql_executor
+    if _graphql_executor is None:
+        _graphql_executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'GRAPHQL_WORKER_THREADS', 8), thread_name_prefix='graphql'
+        )
+    return _graphql_executor
+
+
+@receiver(setting_changed)
+def reset_graphql_executor(setting, **kwargs):
+    global _graphql_executor
+    if setting == 'GRAPHQL_WORKER_THREADS' and _graphql_executor is not None:
+        _graphql_executor.shutdown(wait=False)
+        _graphql_executor = None
+
+
+def offload(view):
+    """
+    Turn a sync view into an async one that runs on the GraphQL worker pool under ASGI.
+
+    GraphQL execution and its ORM-bound resolvers then stay off the event loop,
+    and GRAPHQL_WORKER_THREADS bounds how many run at once, and so how many
+    database connections a process holds. Requests arriving through WSGI or
+    the test client run in the calling thread as before.
+    """
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        if not isinstance(request, ASGIRequest):
+            return await sync_to_async(view)(request, *args, **kwargs)
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            get_graphql_executor(), partial(context.run, _run_in_worker, view, request, *args, **kwargs)
+        )
+    return async_view
+
+
+def _run_in_worker(view, request, *args, **kwargs):
+    # Worker threads outlive requests, so they manage their connections the way
+    # Django's request_started and request_finished handlers would
+    close_old_connections()
+    try:
+        return view(request, *args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def export(request, kind, format):
+    """
+    Stream every slot or booking as NDJSON or CSV, for users allowed to view them.
+
+    ``?dateFrom=YYYY-MM-DD&dateTo=YYYY-MM-DD`` limit the export to whole days
+    by slot start time, like the GraphQL dateFrom/dateTo arguments.
+    """
+    if kind not in EXPORTS or format not in EXPORT_FORMATS:
+        raise Http404(f'No {kind}.{format} export.')
+    if not request.user.has_perm(f'app.view_{EXPORTS[kind][0]._meta.model_name}'):
+        raise PermissionDenied
+    try:
+        date_from, date_to = (parse_date(request.GET[name]) if request.GET.get(name) else None
+                              for name in ('dateFrom', 'dateTo'))
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+
+    content = stream_export(kind, format, date_from, date_to)
+    if isinstance(request, ASGIRequest):
+        content = _iterate_in_thread(content)
+    response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[format])
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{format}"'
+    return response
+
+
+async def _iterate_in_thread(iterator):
+    # Under ASGI Django reads a sync iterator into memory before sending any
+    # of it; pulling one piece at a time through the thread-sensitive thread
+    # keeps memory flat and the database cursor on the connection that opened it
+    next_piece = sync_to_async(next, thread_sensitive=True)
+    while (piece := await next_piece(iterator, None)) is not None:
+        yield piece
+
+
+def metrics(request):
+    """Prometheus text exposition of this process's GraphQL metrics."""
+    return HttpResponse(get_graphql_metrics().render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,7 +1,11 @@
 """
 ASGI config for backend project.
 
-It exposes the ASGI callable as a module-level variable named ``application``.
+It exposes the ASGI callable as a module-level variable named ``application``:
+the Channels router in backend.routing, serving HTTP (including /graphql/) and
+the GraphQL subscription websocket from one process. Run it with::
+
+    daphne -b 0.0.0.0 -p 8000 backend.asgi:application
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -9,8 +13,11 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+# The router imports consumers and models, so the app registry must be ready first
+django.setup()
+
+from .routing import application  # noqa: E402,F401
@@ -1,16 +1,38 @@
 # Importing necessary modules for Channels routing and URL pattern configuration
 from channels.routing import ProtocolTypeRouter, URLRouter
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+from django.core.asgi import get_asgi_application
 from django.urls import path 
 
 # Importing the consumer for handling GraphQL subscriptions
-from graphene_subscriptions.consumers import GraphqlSubscriptionConsumer
+from app.consumers import TopicSubscriptionConsumer
+
+
+def asgi2(application):
+    """Adapt an ASGI 3 application such as Django's handler to the ASGI 2 interface Channels 2 routes to."""
+    def instance(scope):
+        async def call(receive, send):
+            await application(scope, receive, send)
+        return call
+    return instance
+
+
+# Django's own ASGI handler serves HTTP, including /graphql/; static files are
+# served too while DEBUG is on, as runserver used to
+django_application = get_asgi_application()
+if settings.DEBUG:
+    django_application = ASGIStaticFilesHandler(django_application)
 
 # Defining the main application routing
 application = ProtocolTypeRouter({
+    # Plain HTTP goes to Django, replacing the Channels 2 AsgiHandler that would otherwise be added
+    "http": asgi2(django_application),
     # Configuring WebSocket protocol to handle connections via a URL router
     "websocket": URLRouter([
-        # Linking the WebSocket URL path 'graphql/' to the GraphqlSubscriptionConsumer
-        # This consumer will handle WebSocket connections for GraphQL subscriptions
-        path('graphql/', GraphqlSubscriptionConsumer)
+        # Linking the WebSocket URL path 'graphql/' to the TopicSubscriptionConsumer
+        # This consumer will handle WebSocket connections for GraphQL subscriptions,
+        # joining one channel group per subscribed topic
+        path('graphql/', TopicSubscriptionConsumer)
     ]),
-})
\ No newline at end of file
+})
@@ -37,7 +37,30 @@ INSTALLED_APPS = [
 
 # Configuration for the Graphene framework.
 GRAPHENE = {
-    'SCHEMA': 'app.schema.schema'  # Points to the GraphQL schema defined in the app's schema module.
+    'SCHEMA': 'app.schema.schema',  # Points to the GraphQL schema defined in the app's schema module.
+    'MIDDLEWARE': ['app.metrics.TimingMiddleware'],  # Times resolvers for the /metrics/ histograms.
+}
+
+GRAPHQL_METRICS = {
+    'MAX_OPERATIONS': 100,  # Distinct operation names tracked before the rest share one series.
+    'TIMING_HEADER': 'X-GraphQL-Timing',  # Requests sending this header get extensions.timing back.
+}
+
+# Threads executing /graphql/ requests under ASGI; also bounds the database connections per process.
+GRAPHQL_WORKER_THREADS = 8
+
+# Parsed-and-validated GraphQL documents served by CachedGraphQLView.
+GRAPHQL_DOCUMENTS = {
+    'MAX_ENTRIES': 500,  # Documents kept in the in-process LRU.
+    'PERSISTED_QUERIES': 'persisted_queries',  # Alias from CACHES storing persisted query text.
+}
+
+# Booking ID generation; see app.booking_ids for the ID layout.
+BOOKING_IDS = {
+    'GENERATOR': 'app.booking_ids.SnowflakeIdGenerator',  # LegacyIdGenerator restores BK-YYMMDDHHmm-xxxx.
+    'HOST_ID': int(os.environ.get('BOOKING_ID_HOST', 0)),  # 0-31, different for every host or container.
+    'NODE_ID': None,  # Fixed 0-1023 node id; None leases a process slot per process on this host.
+    'LOCK_DIR': None,  # Where process slot lock files live; None is the system temp directory.
 }
 
 CHANNEL_LAYERS = {
@@ -49,6 +72,60 @@ CHANNEL_LAYERS = {
     },
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Shared tier for availableSlots results. Local memory stands in for Redis here;
+    # point this at django.core.cache.backends.redis.RedisCache in production.
+    'availability': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'availability',
+    },
+    # Automatic persisted queries by sha256; use a shared backend such as Redis in production
+    # so a query registered through one process is known to all of them.
+    'persisted_queries': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'persisted_queries',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+
+# Per-date availableSlots cache, invalidated by the Booking and Slot signals in the app.
+AVAILABILITY_CACHE = {
+    'MAX_ENTRIES': 256,  # Dates kept in the in-process LRU.
+    'TIMEOUT': 300,  # Seconds before an entry is refreshed even without a write.
+    'BACKEND': 'availability',  # Alias from CACHES used as the shared tier.
+}
+
+# Seconds a holdSlot reservation lasts before release_expired_holds gives the slot back.
+SLOT_HOLD_TTL = 600
+
+# Moving past slots and their bookings into the archive tables (manage.py archive_slots).
+ARCHIVE = {
+    'RETENTION_DAYS': int(os.environ.get('ARCHIVE_RETENTION_DAYS', 365)),  # Slots that ended longer ago are archived
+    'BATCH_SIZE': 500,  # Slots moved per transaction, bookings included
+}
+
+# Seconds over which slotAvailabilityChanged deltas are coalesced before being published (0 = immediately).
+SLOT_AVAILABILITY_COALESCE_WINDOW = 0.25
+
+# Decoded subscription events shared by the consumers of a process; see app.events.
+SUBSCRIPTION_EVENT_CACHE_SIZE = 1024
+
+# With SUBSCRIPTION_OUTBOX=1, subscription events are recorded in the writing transaction
+# and only published by a running `manage.py dispatch_outbox --loop`; see app.outbox.
+# The Dockerfile and docker-compose.yml enable it and start the dispatcher; elsewhere,
+# such as under runserver, events are published from on_commit hooks.
+SUBSCRIPTION_OUTBOX = {
+    'ENABLED': os.environ.get('SUBSCRIPTION_OUTBOX', '0') == '1',  # 1 requires a running dispatcher.
+    'BATCH_SIZE': 200,  # Events claimed, sent and deleted at a time.
+    'MAX_ATTEMPTS': 5,  # Sends of one batch before the dispatcher gives up until its next run.
+    'RETRY_DELAY': 0.5,  # Seconds before the first retry, doubling after each failure.
+    'CLAIM_TIMEOUT': 60,  # Seconds before a stopped dispatcher's batch is sent by another.
+}
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',  # Adds security measures to the application.
     'django.contrib.sessions.middleware.SessionMiddleware',  # Enables session support.
@@ -89,12 +166,62 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# DATABASE_PROFILE picks one of these; the sqlite profile needs no server.
+DATABASE_PROFILES = {
+    'sqlite': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': {
+            'timeout': 5,  # Seconds a writer waits for the database lock before "database is locked".
+        },
+    },
+    'postgres': {
+        'ENGINE': 'django.db.backends.postgresql',  # Needs psycopg from requirements.txt.
+        'NAME': os.environ.get('POSTGRES_DB', 'booking'),
+        'USER': os.environ.get('POSTGRES_USER', 'booking'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+    },
+}
+
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'sqlite')
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        **DATABASE_PROFILES[DATABASE_PROFILE],
+        # Seconds a connection is reused across requests (0 = one per request); threads keep their own.
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,  # Reconnect instead of failing a request on a dropped connection.
     }
 }
+# Read replica for GraphQL queries: DATABASE_REPLICA is a second SQLite file, kept up to date by
+# `manage.py replicate_database --loop`, or the host of a Postgres streaming replica. Without it
+# the alias points at the primary and is only used by the tests.
+DATABASES['replica'] = {**DATABASES['default']}
+if os.environ.get('DATABASE_REPLICA'):
+    DATABASES['replica']['HOST' if DATABASE_PROFILE == 'postgres' else 'NAME'] = os.environ['DATABASE_REPLICA']
+DATABASE_ROUTERS = ['app.db.PrimaryReplicaRouter']
+
+# Which database each GraphQL request uses; see app.db.
+DATABASE_ROUTING = {
+    'REPLICA': 'replica' if os.environ.get('DATABASE_REPLICA') else None,  # Alias query operations read from.
+    'STICKY_SECONDS': 5,  # After a write, the client's queries read from the primary this long.
+    'COOKIE': 'primary_reads',  # Cookie carrying that for the client.
+}
+
+# Applied to every new SQLite connection by app.db.
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',  # Safe with WAL; fsync at checkpoints instead of every commit.
+    'busy_timeout': 5000,  # Milliseconds to wait for a lock, matching OPTIONS['timeout'].
+    'mmap_size': 256 * 1024 * 1024,  # Read pages through a memory map instead of read() calls.
+    'temp_store': 'MEMORY',  # Sorts and temporary indexes stay off disk.
+}
+# The journal mode is stored in the database file itself, so it is only switched when asked for,
+# as the container does with WAL (readers no longer block the writer or each other), and the
+# db.sqlite3 checked in keeps its own.
+if os.environ.get('SQLITE_JOURNAL_MODE'):
+    SQLITE_PRAGMAS = {'journal_mode': os.environ['SQLITE_JOURNAL_MODE'], **SQLITE_PRAGMAS}
 
 
 # Password validation
@@ -1,10 +1,13 @@
 from django.urls import path
 from django.contrib import admin
-from graphene_django.views import GraphQLView
 from django.views.decorators.csrf import csrf_exempt
+from app.views import CachedGraphQLView, export, metrics, offload
 
 urlpatterns = [
     path('admin/', admin.site.urls),
 
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path('graphql/', offload(csrf_exempt(CachedGraphQLView.as_view(graphiql=True)))),
+    path('metrics/', metrics),
+    # Streaming NDJSON/CSV dumps, e.g. /exports/bookings.csv?dateFrom=2024-01-01
+    path('exports/<slug:kind>.<slug:format>', export),
 ]
@@ -0,0 +1,9 @@
+"""
+In-process benchmarks for the booking backend.
+
+Each module is runnable from the backend directory, e.g.::
+
+    python -m benchmarks.availability
+
+and works against a throwaway test database, never db.sqlite3.
+"""
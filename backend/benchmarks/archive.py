@@ -0,0 +1,133 @@
+"""
+Hot-path query latency before and after archiving past slots.
+
+Seeds --years of past slots (half of them booked) plus a month of upcoming
+ones into a throwaway SQLite file, times the queries live traffic makes,
+archives everything older than --retention-days with app.archive, then
+times the same queries again:
+
+  availableSlots   an upcoming day's open slots, availability cache cleared
+  bookings-page    first page of upcoming bookings
+  allBookings      every live booking with its slot
+  slot count       SELECT COUNT(*) over the live slots, as admin changelists do
+
+    python -m benchmarks.archive [--years 3] [--retention-days 30] [--repeat 50]
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+
+if __name__ == '__main__':
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    os.environ.setdefault('BENCHMARK_DATABASE',
+                          os.path.join(tempfile.mkdtemp(prefix='booking-archive-'), 'db.sqlite3'))
+
+from . import common  # noqa: E402
+
+OPENING_HOURS = range(9, 17)
+UPCOMING_DAYS = 30
+
+QUERIES = {
+    'availableSlots': 'query ($date: String!) { availableSlots(date: $date) { id startTime endTime } }',
+    'bookings-page': '''
+        query ($from: Date!) { bookings(first: 50, dateFrom: $from) { edges { node { bookingId slot { startTime } } } } }
+    ''',
+    'allBookings': '{ allBookings { bookingId status slot { startTime } } }',
+}
+
+
+def seed(years, rng):
+    from django.utils import timezone
+
+    from app.daily_availability import rebuild_day_counts
+    from app.models import Booking, Slot
+
+    today = timezone.localdate()
+    first = today - datetime.timedelta(days=365 * years)
+    slots = []
+    day = first
+    while day < today + datetime.timedelta(days=UPCOMING_DAYS):
+        for hour in OPENING_HOURS:
+            start = timezone.make_aware(datetime.datetime.combine(day, datetime.time(hour)))
+            booked = rng.random() < 0.5
+            slots.append(Slot(start_time=start, end_time=start + datetime.timedelta(hours=1),
+                              is_booked=booked, booked_count=int(booked)))
+        day += datetime.timedelta(days=1)
+    Slot.objects.bulk_create(slots, batch_size=1000)
+
+    bookings = []
+    for slot in Slot.objects.filter(is_booked=True).only('pk'):
+        booking = Booking(slot=slot, booker_first_name='Seed', booker_last_name='User',
+                          booker_email='seed@example.com', booker_phone='+12125552368')
+        booking.booking_id = booking.generate_booking_id()
+        bookings.append(booking)
+    Booking.objects.bulk_create(bookings, batch_size=1000)
+    rebuild_day_counts()
+    return len(slots), len(bookings)
+
+
+def measure_hot_path(client, repeat, rng):
+    from django.utils import timezone
+
+    from app.cache import get_availability_cache
+    from app.models import Slot
+
+    today = timezone.localdate()
+
+    def graphql(name, **variables):
+        response = client.post('/graphql/', json.dumps({'query': QUERIES[name], 'variables': variables}),
+                               content_type='application/json')
+        assert response.status_code == 200 and 'errors' not in response.json(), response.content
+
+    def available_slots():
+        get_availability_cache().clear()
+        graphql('availableSlots', date=(today + datetime.timedelta(days=rng.randrange(UPCOMING_DAYS))).isoformat())
+
+    return {
+        'availableSlots': common.measure(available_slots, repeat=repeat),
+        'bookings-page': common.measure(lambda: graphql('bookings-page', **{'from': today.isoformat()}),
+                                        repeat=repeat),
+        'allBookings': common.measure(lambda: graphql('allBookings'), repeat=max(3, repeat // 10), warmup=1),
+        'slot count': common.measure(lambda: Slot.objects.count(), repeat=repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--retention-days', type=int, default=30)
+    parser.add_argument('--batch-size', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    common.setup()
+
+    from django.test import Client
+
+    from app.archive import archive_cutoff, archive_slots
+
+    rng = random.Random(args.seed)
+    with common.benchmark_database():
+        slots, bookings = seed(args.years, rng)
+        print(f'{slots} slots, {bookings} bookings', file=sys.stderr)
+        client = Client()
+
+        before = measure_hot_path(client, args.repeat, rng)
+        result = archive_slots(archive_cutoff(args.retention_days), batch_size=args.batch_size)
+        print(f'archived {result.slots} slots and {result.bookings} bookings in {result.elapsed:.2f}s '
+              f'({result.rows_per_second:.0f} rows/s)')
+        after = measure_hot_path(client, args.repeat, rng)
+
+    print(f"{'query':<15} {'before p50 ms':>14} {'after p50 ms':>13} {'before p99 ms':>14} {'after p99 ms':>13}")
+    for name in before:
+        print(f"{name:<15} {before[name]['p50_ms']:>14.2f} {after[name]['p50_ms']:>13.2f} "
+              f"{before[name]['p99_ms']:>14.2f} {after[name]['p99_ms']:>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
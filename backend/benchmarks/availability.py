@@ -0,0 +1,74 @@
+"""
+Availability lookup latency at growing slot counts.
+
+Compares the old ``start_time__date`` filter with the half-open start_time
+range used by ``Query.resolve_available_slots``, and prints the SQLite query
+plan for each so the index usage is visible.
+
+    python -m benchmarks.availability [--sizes 10000 100000 1000000]
+"""
+import argparse
+import datetime
+import random
+
+from . import common
+
+common.setup()
+
+from django.db.models import F  # noqa: E402
+
+from app.dates import local_day_range  # noqa: E402
+from app.models import Slot  # noqa: E402
+
+SLOT_MINUTES = 30
+BATCH_SIZE = 10000
+
+
+def seed_slots(total, start):
+    rng = random.Random(total)
+    length = datetime.timedelta(minutes=SLOT_MINUTES)
+    created = Slot.objects.count()
+    while created < total:
+        batch = []
+        for i in range(created, min(total, created + BATCH_SIZE)):
+            slot_start = start + i * length
+            batch.append(Slot(start_time=slot_start, end_time=slot_start + length, is_booked=rng.random() < 0.5))
+        Slot.objects.bulk_create(batch)
+        created += len(batch)
+
+
+def query_plan(connection, queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return '; '.join(row[-1] for row in cursor.fetchall())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    # UTC arithmetic, so DST transitions do not produce overlapping slots
+    start = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    with common.benchmark_database() as connection:
+        for size in sorted(args.sizes):
+            seed_slots(size, start)
+            # Probe a day in the middle of the seeded range
+            day = (start + datetime.timedelta(minutes=SLOT_MINUTES * size // 2)).date()
+            day_start, day_end = local_day_range(day)
+            lookups = {
+                'start_time__date': Slot.objects.filter(start_time__date=day, is_booked=False),
+                'start_time range': Slot.objects.filter(
+                    is_booked=False, booked_count__lt=F('capacity'), start_time__gte=day_start, start_time__lt=day_end
+                ).order_by('start_time'),
+            }
+            for name, queryset in lookups.items():
+                stats = common.measure(lambda: list(queryset.all()), repeat=args.repeat)
+                print(f"slots={size:<8} {name:<17} {common.format_stats(stats)}")
+                print(f"{'':15}plan: {query_plan(connection, queryset)}")
+
+
+if __name__ == '__main__':
+    main()
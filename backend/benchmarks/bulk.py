@@ -0,0 +1,142 @@
+"""
+Throughput and peak memory of the bulk import command and the export endpoints.
+
+Writes --rows hourly slots and one booking per slot as NDJSON, then runs
+each phase in its own interpreter against one throwaway SQLite file, so
+every phase's peak RSS is its own:
+
+  import slots        app.imports from slots.ndjson
+  import bookings     app.imports from bookings.ndjson, taking a seat per booking
+  export slots        GET /exports/slots.ndjson, streamed and discarded
+  export bookings     GET /exports/bookings.csv, streamed and discarded
+
+"baseline MB" is the interpreter's RSS after Django setup; a streaming
+phase should stay close to it however large --rows is. SQLite's memory map
+is turned off so database pages it reads do not count as the phase's RSS.
+
+    python -m benchmarks.bulk [--rows 1000000] [--chunk-size 1000]
+"""
+import argparse
+import datetime
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+FIRST_SLOT = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+
+PHASES = {
+    'import slots': ('import', 'slots'),
+    'import bookings': ('import', 'bookings'),
+    'export slots': ('export', '/exports/slots.ndjson'),
+    'export bookings': ('export', '/exports/bookings.csv'),
+}
+
+
+def write_input(directory, rows):
+    """Write the slots and bookings files, one line at a time."""
+    booker = {'booker_first_name': 'Bulk', 'booker_last_name': 'Import',
+              'booker_email': 'bulk@example.com', 'booker_phone': '+12125552368'}
+    with open(os.path.join(directory, 'slots.ndjson'), 'w') as slots, \
+            open(os.path.join(directory, 'bookings.ndjson'), 'w') as bookings:
+        for hour in range(rows):
+            start = (FIRST_SLOT + datetime.timedelta(hours=hour)).isoformat()
+            end = (FIRST_SLOT + datetime.timedelta(hours=hour + 1)).isoformat()
+            slots.write(json.dumps({'start_time': start, 'end_time': end, 'capacity': 1}) + '\n')
+            bookings.write(json.dumps({**booker, 'slot_start_time': start, 'slot_end_time': end}) + '\n')
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_phase(phase, directory, chunk_size):
+    """Body of the per-phase interpreter; prints one JSON line."""
+    from . import common
+
+    common.setup()
+
+    from django.conf import settings
+    from django.core.management import call_command
+
+    # Pages read through SQLite's memory map count towards RSS, which would
+    # hide whether the phase itself holds rows in memory
+    settings.SQLITE_PRAGMAS = {**settings.SQLITE_PRAGMAS, 'mmap_size': 0}
+    if phase == 'migrate':
+        call_command('migrate', verbosity=0)
+        return
+
+    action, target = PHASES[phase]
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    if action == 'import':
+        from app.imports import import_rows, read_rows
+
+        with open(os.path.join(directory, f'{target}.ndjson'), encoding='utf-8') as lines:
+            result = import_rows(target, read_rows(lines, 'ndjson'), chunk_size=chunk_size)
+        assert not result.error_count, result.errors[:5]
+        rows, size = result.rows, os.path.getsize(os.path.join(directory, f'{target}.ndjson'))
+    else:
+        from django.contrib.auth import get_user_model
+        from django.test import Client
+
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(get_user_model().objects.get_or_create(username='bulk', is_superuser=True)[0])
+        started = time.perf_counter()
+        response = client.get(target)
+        assert response.status_code == 200, response
+        lines = size = 0
+        for piece in response.streaming_content:
+            lines += piece.count(b'\n')
+            size += len(piece)
+        # CSV starts with a header line
+        rows = lines - target.endswith('.csv')
+    elapsed = time.perf_counter() - started
+    print(json.dumps({'rows': rows, 'seconds': elapsed, 'mb': size / 2 ** 20,
+                      'baseline_mb': baseline, 'peak_mb': peak_rss_mb()}), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--chunk-size', type=int, default=1000, help='import rows per transaction')
+    parser.add_argument('--phase', choices=['migrate', *PHASES], help=argparse.SUPPRESS)
+    parser.add_argument('--directory', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase:
+        run_phase(args.phase, args.directory, args.chunk_size)
+        return
+
+    directory = tempfile.mkdtemp(prefix='booking-bulk-')
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'benchmarks.settings',
+           'BENCHMARK_DATABASE': os.path.join(directory, 'db.sqlite3')}
+    try:
+        write_input(directory, args.rows)
+        print(f"{'phase':<16} {'rows':>9} {'seconds':>8} {'rows/s':>8} {'MB':>7} {'baseline MB':>12} "
+              f"{'peak RSS MB':>12}")
+        for phase in ['migrate', *PHASES]:
+            child = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bulk', '--phase', phase, '--directory', directory,
+                 '--chunk-size', str(args.chunk_size)],
+                env=env, capture_output=True, text=True,
+            )
+            if child.returncode:
+                sys.exit(f'{phase} failed:\n{child.stderr}')
+            if phase == 'migrate':
+                continue
+            result = json.loads(child.stdout)
+            print(f"{phase:<16} {result['rows']:>9} {result['seconds']:>8.1f} "
+                  f"{result['rows'] / result['seconds']:>8.0f} {result['mb']:>7.1f} "
+                  f"{result['baseline_mb']:>12.1f} {result['peak_mb']:>12.1f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+
+def setup():
+    """Configure Django for a benchmark run with the in-memory channel layer instead of Redis, without the outbox."""
+    from django.conf import settings
+
+    django.setup()
+    settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+    # No outbox dispatcher runs next to a benchmark, so publish from on_commit hooks
+    settings.SUBSCRIPTION_OUTBOX = {**settings.SUBSCRIPTION_OUTBOX, 'ENABLED': False}
+
+
+@contextmanager
+def benchmark_database():
+    """Create a migrated throwaway database for the duration of the block."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(fn, repeat=50, warmup=3):
+    """Call fn repeatedly and return latency percentiles in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return percentiles(samples)
+
+
+def percentiles(samples):
+    """p50, p95, p99 and mean of latency samples in milliseconds."""
+    samples = sorted(samples)
+    if not samples:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'mean_ms': None}
+    return {
+        'p50_ms': statistics.median(samples),
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        'mean_ms': statistics.fmean(samples),
+    }
+
+
+def format_stats(stats):
+    return ' '.join(f"{key}={value:.3f}" for key, value in stats.items())
@@ -0,0 +1,141 @@
+"""
+Booking write throughput under concurrent writers, per database profile.
+
+Each profile runs in its own interpreter with benchmarks.settings. Writer
+processes reserve distinct slots through app.services.reserve_slot, so
+bookings only contend on the database, and close their connections between
+bookings the way request boundaries do, so CONN_MAX_AGE counts too. Lock
+timeouts are reported as errors rather than retried.
+
+    python -m benchmarks.contention [--profiles sqlite-untuned sqlite postgres] [--writers 1 4 8]
+
+"sqlite-untuned" is the SQLite setup from before the database profiles
+(rollback journal, a connection per request); "postgres" needs a server
+reachable with the POSTGRES_* variables and is skipped otherwise.
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROFILES = {
+    'sqlite-untuned': {'DATABASE_PROFILE': 'sqlite', 'BENCHMARK_SQLITE_UNTUNED': '1'},
+    'sqlite': {'DATABASE_PROFILE': 'sqlite'},
+    'postgres': {'DATABASE_PROFILE': 'postgres'},
+}
+
+FIRST_SLOT = datetime.datetime(2024, 3, 1, 9, tzinfo=datetime.timezone.utc)
+
+
+def write_bookings(slot_ids, start, results):
+    from django.db import OperationalError, close_old_connections
+
+    from app.services import reserve_slot
+
+    latencies, errors = [], 0
+    start.wait()
+    for slot_id in slot_ids:
+        close_old_connections()
+        started = time.perf_counter()
+        try:
+            reserve_slot(slot_id, booker_first_name='Load', booker_last_name='Test',
+                         booker_email='load@example.com', booker_phone='+12125552368')
+        except OperationalError:
+            errors += 1
+        else:
+            latencies.append((time.perf_counter() - started) * 1000)
+        close_old_connections()
+    results.put((latencies, errors))
+
+
+def run_profile(writer_counts, bookings):
+    """Body of the per-profile interpreter; prints one JSON line per writer count."""
+    from . import common
+
+    common.setup()
+
+    from django.conf import settings
+    from django.db import connections
+
+    from app.models import Slot
+
+    # Publish availability events straight away instead of from timer threads
+    settings.SLOT_AVAILABILITY_COALESCE_WINDOW = 0
+    context = multiprocessing.get_context('fork')
+    with common.benchmark_database():
+        for run, writers in enumerate(writer_counts):
+            first = FIRST_SLOT + datetime.timedelta(days=run * 1000)
+            Slot.objects.bulk_create([
+                Slot(start_time=first + datetime.timedelta(hours=i), end_time=first + datetime.timedelta(hours=i + 1))
+                for i in range(writers * bookings)
+            ])
+            slot_ids = list(Slot.objects.filter(start_time__gte=first, is_booked=False)
+                            .order_by('start_time').values_list('pk', flat=True))
+            # Forked writers must not share the parent's connection
+            connections.close_all()
+
+            start, results = context.Barrier(writers + 1), context.Queue()
+            processes = [
+                context.Process(target=write_bookings, args=(slot_ids[i::writers], start, results))
+                for i in range(writers)
+            ]
+            for process in processes:
+                process.start()
+            start.wait()
+            started = time.perf_counter()
+            outcomes = [results.get() for _ in processes]
+            elapsed = time.perf_counter() - started
+            for process in processes:
+                process.join()
+
+            latencies = sorted(latency for samples, _ in outcomes for latency in samples)
+            print(json.dumps({
+                'writers': writers,
+                'bookings_per_s': len(latencies) / elapsed,
+                'p50_ms': statistics.median(latencies) if latencies else None,
+                'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else None,
+                'errors': sum(errors for _, errors in outcomes),
+            }), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', nargs='+', choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument('--writers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--bookings', type=int, default=200, help='bookings per writer')
+    parser.add_argument('--run-profile', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_profile:
+        run_profile(args.writers, args.bookings)
+        return
+
+    print(f"{'profile':<15} {'writers':>7} {'bookings/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for profile in args.profiles:
+        database = os.path.join(tempfile.mkdtemp(prefix='booking-contention-'), 'db.sqlite3')
+        env = {**os.environ, **PROFILES[profile], 'DJANGO_SETTINGS_MODULE': 'benchmarks.settings',
+               'BENCHMARK_DATABASE': database}
+        child = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.contention', '--run-profile', '--bookings', str(args.bookings),
+             '--writers', *map(str, args.writers)],
+            env=env, capture_output=True, text=True,
+        )
+        shutil.rmtree(os.path.dirname(database), ignore_errors=True)
+        if child.returncode:
+            print(f'{profile:<15} skipped: {child.stderr.strip().splitlines()[-1]}')
+            continue
+        for line in child.stdout.splitlines():
+            result = json.loads(line)
+            print(f"{profile:<15} {result['writers']:>7} {result['bookings_per_s']:>10.0f} "
+                  f"{result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['errors']:>6}")
+
+
+if __name__ == '__main__':
+    main()
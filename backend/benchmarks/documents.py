@@ -0,0 +1,112 @@
+"""
+Per-request parse and validate cost of the GraphQL endpoint.
+
+Compares graphql-core's default backend, which parses and validates every
+request, with the DocumentCache behind CachedGraphQLView, first on parse and
+validate alone and then on whole requests through the views, including
+automatic persisted queries sent as a bare hash.
+
+    python -m benchmarks.documents [--repeat 500]
+"""
+import argparse
+import datetime
+import json
+
+from . import common
+
+common.setup()
+
+from django.test import RequestFactory  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from graphql.backend import GraphQLCoreBackend  # noqa: E402
+from graphql.language.base import parse  # noqa: E402
+from graphql.validation import validate  # noqa: E402
+
+from app.documents import DocumentCache, query_hash  # noqa: E402
+from app.models import Slot  # noqa: E402
+from app.schema import schema  # noqa: E402
+from app.views import CachedGraphQLView, InstrumentedGraphQLView  # noqa: E402
+
+DAY = datetime.date(2024, 2, 21)
+
+# What the booking widget sends on every page view
+WIDGET_QUERIES = {
+    'availableSlots': '''
+        query AvailableSlots($date: String!) {
+            availableSlots(date: $date) { id startTime endTime isBooked }
+        }
+    ''',
+    'bookingById': '''
+        query BookingById($bookingId: ID!) {
+            bookingById(bookingId: $bookingId) {
+                bookingId bookerFirstName bookerLastName bookerEmail status
+                slot { id startTime endTime }
+            }
+        }
+    ''',
+    'createBooking': '''
+        mutation CreateBooking($firstName: String!, $lastName: String!, $email: String!, $phone: String!,
+                               $slotId: ID!) {
+            createBooking(bookerFirstName: $firstName, bookerLastName: $lastName, bookerEmail: $email,
+                          bookerPhone: $phone, slotId: $slotId, status: "confirmed") {
+                booking { bookingId status slot { id isBooked } }
+            }
+        }
+    ''',
+}
+
+
+def seed_day():
+    for hour in range(9, 17):
+        start = timezone.make_aware(datetime.datetime.combine(DAY, datetime.time(hour)))
+        Slot.objects.create(start_time=start, end_time=start + datetime.timedelta(hours=1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    print('parse + validate')
+    documents = DocumentCache()
+    for name, query in WIDGET_QUERIES.items():
+        uncached = common.measure(lambda: validate(schema, parse(query)), repeat=args.repeat)
+        cached = common.measure(lambda: documents.document_from_string(schema, query), repeat=args.repeat)
+        print(f"  {name:<14} uncached {common.format_stats(uncached)}")
+        print(f"  {name:<14} cached   {common.format_stats(cached)}"
+              f"  ({uncached['p50_ms'] / cached['p50_ms']:.0f}x at p50)")
+
+    factory = RequestFactory()
+    query = WIDGET_QUERIES['availableSlots']
+    variables = {'date': DAY.isoformat()}
+    bodies = {
+        'uncached': {'query': query, 'variables': variables},
+        'cached': {'query': query, 'variables': variables},
+        'persisted hash': {
+            'variables': variables,
+            'extensions': {'persistedQuery': {'version': 1, 'sha256Hash': query_hash(query)}},
+        },
+    }
+    views = {
+        # Same instrumentation, graphql-core's default backend
+        'uncached': InstrumentedGraphQLView.as_view(backend=GraphQLCoreBackend()),
+        'cached': CachedGraphQLView.as_view(),
+        'persisted hash': CachedGraphQLView.as_view(),
+    }
+
+    print(f'\navailableSlots request through the view ({len(query)} byte query)')
+    with common.benchmark_database():
+        seed_day()
+        for name, view in views.items():
+            payload = json.dumps(bodies[name])
+
+            def request():
+                response = view(factory.post('/graphql/', payload, content_type='application/json'))
+                assert response.status_code == 200, response.content
+
+            stats = common.measure(request, repeat=args.repeat)
+            print(f"  {name:<14} {common.format_stats(stats)}  request bytes={len(payload)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Bytes per event and events/s of booking subscription events, old format against compact.
+
+Each event goes through an InMemoryChannelLayer group with --subscribers
+members, and is packed and unpacked with msgpack the way channels_redis does
+on the wire, so the numbers include what Redis would cost without needing a
+server. Events cycle through created, updated (status only) and deleted:
+
+  json, pure msgpack   ModelSubscriptionEvent.to_dict(), the whole instance as
+                       Django JSON, each subscriber deserializing it, under
+                       MSGPACK_PUREPYTHON=1 as the Docker image used to set
+  json                 the same with msgpack's C extension
+  compact              app.events frames: label, pk, operation and changed
+                       fields, decoded once per process through EventCache
+
+    python -m benchmarks.events [--events 3000] [--subscribers 1 10 100]
+"""
+import argparse
+import asyncio
+import datetime
+import time
+
+import msgpack
+import msgpack.fallback
+
+from . import common
+
+OPERATIONS = ('created', 'updated', 'deleted')
+
+CODECS = {
+    'json, pure msgpack': (msgpack.fallback.Packer(use_bin_type=True).pack,
+                           lambda data: msgpack.fallback.unpackb(data, raw=False)),
+    'json': (msgpack.Packer(use_bin_type=True).pack, lambda data: msgpack.unpackb(data, raw=False)),
+    'compact': (msgpack.Packer(use_bin_type=True).pack, lambda data: msgpack.unpackb(data, raw=False)),
+}
+
+
+def seed(count):
+    from app.models import Booking, Slot
+
+    first = datetime.datetime(2024, 3, 1, 9, tzinfo=datetime.timezone.utc)
+    slot = Slot.objects.create(start_time=first, end_time=first + datetime.timedelta(hours=1), capacity=count)
+    Booking.objects.bulk_create([
+        Booking(booking_id=f'BK-BENCH-{n:06d}', booker_first_name='Bench', booker_last_name='User',
+                booker_email='bench@example.com', booker_phone='+12125552368', slot=slot)
+        for n in range(count)
+    ])
+    return list(Booking.objects.select_related('slot').order_by('pk'))
+
+
+def make_event(path, operation, booking):
+    from graphene_subscriptions.events import ModelSubscriptionEvent
+
+    from app.events import ModelChangeEvent, encode_event
+
+    if path != 'compact':
+        return ModelSubscriptionEvent(operation, booking).to_dict()
+    if operation == 'updated':
+        booking.status = 'cancelled' if booking.status == 'confirmed' else 'confirmed'
+    return encode_event(ModelChangeEvent(operation, booking, changed=['status'] if operation == 'updated' else None))
+
+
+async def run(path, bookings, events, subscribers):
+    from asgiref.sync import sync_to_async
+    from channels.layers import InMemoryChannelLayer
+    from graphene_subscriptions.events import SubscriptionEvent
+
+    from app.events import get_event_cache
+
+    pack, unpack = CODECS[path]
+    cache = get_event_cache()
+    cache.clear()
+
+    layer = InMemoryChannelLayer(capacity=events + 1)
+    channels = [await layer.new_channel() for _ in range(subscribers)]
+    for channel in channels:
+        await layer.group_add('bookings', channel)
+
+    def decode(messages):
+        # What each subscriber's consumer does with its copy of the event
+        for message in messages:
+            wire = unpack(pack(message))
+            if path == 'compact':
+                instance = cache.decode(wire['event']).instance
+            else:
+                instance = SubscriptionEvent.from_dict(wire['event']).instance
+            assert instance.booking_id
+
+    # Updated events read the database, which has to happen off the event loop
+    decode = sync_to_async(decode, thread_sensitive=True)
+    make = sync_to_async(make_event, thread_sensitive=True)
+
+    sizes = []
+    started = time.perf_counter()
+    for n in range(events):
+        event = await make(path, OPERATIONS[n % len(OPERATIONS)], bookings[n % len(bookings)])
+        message = {'type': 'topic.event', 'topic': 'bookings', 'event': event}
+        sizes.append(len(pack(message)))
+        await layer.group_send('bookings', message)
+        await decode([await layer.receive(channel) for channel in channels])
+    elapsed = time.perf_counter() - started
+    return sum(sizes) / len(sizes), events / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=3000)
+    parser.add_argument('--subscribers', type=int, nargs='+', default=[1, 10, 100])
+    args = parser.parse_args()
+
+    common.setup()
+
+    with common.benchmark_database():
+        bookings = seed(100)
+        print(f"{'path':<20} {'subscribers':>11} {'bytes/event':>12} {'events/s':>9}")
+        for subscribers in args.subscribers:
+            for path in CODECS:
+                size, rate = asyncio.run(run(path, bookings, args.events, subscribers))
+                print(f"{path:<20} {subscribers:>11} {size:>12.0f} {rate:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
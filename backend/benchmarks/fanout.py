@@ -0,0 +1,102 @@
+"""
+Subscription fan-out cost with simulated subscribers.
+
+Subscribers are spread over a month of slot dates. The "broadcast" mode is
+the stock graphene_subscriptions path: every connection sits in one group,
+receives every event and runs its filter on it. The "topic" mode is
+TopicSubscriptionConsumer: each connection joins the group for its date,
+only receives events published there, and decodes app.events frames through
+the shared event cache.
+
+    python -m benchmarks.fanout [--subscribers 1000 10000] [--events 20]
+"""
+import argparse
+import asyncio
+import datetime
+import time
+
+from . import common
+
+common.setup()
+
+from channels.layers import InMemoryChannelLayer  # noqa: E402
+from graphene_subscriptions.events import CREATED, ModelSubscriptionEvent, SubscriptionEvent  # noqa: E402
+
+from app.events import encode_event, get_event_cache  # noqa: E402
+from app.models import Booking, Slot  # noqa: E402
+from app.subscriptions import booking_topic, booking_topics  # noqa: E402
+
+DAYS = 30
+
+
+def make_event(day):
+    start_time = datetime.datetime(2024, 3, 1, 9, tzinfo=datetime.timezone.utc) + datetime.timedelta(days=day)
+    slot = Slot(pk=day + 1, start_time=start_time, end_time=start_time + datetime.timedelta(hours=1), is_booked=True)
+    booking = Booking(
+        pk=day + 1, booking_id=f'BK-BENCH-{day:04d}', booker_first_name='Bench', booker_last_name='User',
+        booker_email='bench@example.com', booker_phone='+12125552368', slot=slot, status='confirmed',
+    )
+    return ModelSubscriptionEvent(CREATED, booking), booking, Slot.local_date(start_time)
+
+
+async def run(mode, subscribers, events):
+    # Room for every event on every channel, so nothing is dropped while measuring
+    layer = InMemoryChannelLayer(capacity=events + 1)
+    # The in-memory layer sweeps every channel for expired messages on each call,
+    # which would swamp the measurement at 10k channels; Redis has no such cost.
+    layer._clean_expired = lambda: None
+    dates = [datetime.date(2024, 3, 1) + datetime.timedelta(days=day) for day in range(DAYS)]
+    members = {}
+    for i in range(subscribers):
+        channel = await layer.new_channel()
+        date = dates[i % DAYS]
+        group = 'subscriptions' if mode == 'broadcast' else booking_topic(CREATED, date=date)
+        await layer.group_add(group, channel)
+        members.setdefault(group, []).append((channel, date))
+
+    deliveries = 0
+    started = time.perf_counter()
+    for n in range(events):
+        event, booking, date = make_event(n % DAYS)
+        if mode == 'broadcast':
+            message = {'type': 'signal.fired', 'event': event.to_dict()}
+        else:
+            message = {'type': 'topic.event', 'event': encode_event(event)}
+        if mode == 'broadcast':
+            groups = ['subscriptions']
+        else:
+            groups = booking_topics(CREATED, booking, date)
+        for group in groups:
+            await layer.group_send(group, message)
+            for channel, subscribed_date in members.get(group, []):
+                received = await layer.receive(channel)
+                if mode == 'broadcast':
+                    instance = SubscriptionEvent.from_dict(received['event']).instance
+                else:
+                    instance = get_event_cache().decode(received['event']).instance
+                # The stock resolvers filter every event in Python
+                if mode == 'broadcast' and not (isinstance(instance, Booking) and subscribed_date == date):
+                    continue
+                deliveries += 1
+    elapsed = time.perf_counter() - started
+    return elapsed, deliveries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subscribers', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--events', type=int, default=20)
+    args = parser.parse_args()
+
+    for subscribers in args.subscribers:
+        for mode in ('broadcast', 'topic'):
+            elapsed, deliveries = asyncio.run(run(mode, subscribers, args.events))
+            print(
+                f"subscribers={subscribers:<6} mode={mode:<9} "
+                f"per_event_ms={elapsed / args.events * 1000:.2f} events_per_s={args.events / elapsed:.1f} "
+                f"deliveries={deliveries}"
+            )
+
+
+if __name__ == '__main__':
+    main()
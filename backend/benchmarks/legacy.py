@@ -0,0 +1,20 @@
+"""
+The previous serving setup, kept as the load test baseline.
+
+HTTP went through the AsgiHandler Channels 2 adds when the router has no
+"http" entry, and /graphql/ was a plain sync view.
+"""
+from channels.routing import ProtocolTypeRouter, URLRouter
+from django.urls import path
+from django.views.decorators.csrf import csrf_exempt
+
+from app.consumers import TopicSubscriptionConsumer
+from app.views import CachedGraphQLView
+
+urlpatterns = [
+    path('graphql/', csrf_exempt(CachedGraphQLView.as_view())),
+]
+
+application = ProtocolTypeRouter({
+    "websocket": URLRouter([path('graphql/', TopicSubscriptionConsumer)]),
+})
@@ -0,0 +1,187 @@
+"""
+HTTP load test of /graphql/: the old runserver setup against daphne.
+
+Seeds a throwaway SQLite file, then for each server starts it in a
+subprocess and drives it from client threads with keep-alive connections,
+reporting requests/s, p50 and p99 per workload and concurrency level.
+
+    python -m benchmarks.load [--concurrency 1 8 32] [--duration 5]
+
+"runserver" is ``manage.py runserver`` with the routing and URLconf from
+before the ASGI router served HTTP (benchmarks.legacy); "daphne" is
+``daphne backend.asgi:application`` as in the Dockerfile.
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+DATABASE = os.path.join(tempfile.mkdtemp(prefix='booking-load-'), 'db.sqlite3')
+os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+os.environ['BENCHMARK_DATABASE'] = DATABASE
+
+from . import common  # noqa: E402
+
+common.setup()
+
+from django.core.management import call_command  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from app.models import Booking, Slot  # noqa: E402
+
+DAYS = 30
+FIRST_DAY = datetime.date(2024, 2, 1)
+
+WORKLOADS = {
+    'availableSlots': lambda rng: {
+        'query': 'query AvailableSlots($date: String!) { availableSlots(date: $date) { id startTime endTime } }',
+        'variables': {'date': (FIRST_DAY + datetime.timedelta(days=rng.randrange(DAYS))).isoformat()},
+    },
+    'allBookings': lambda rng: {
+        'query': 'query AllBookings { allBookings { bookingId status slot { startTime endTime } } }',
+    },
+}
+
+SERVERS = {
+    'runserver': (
+        [sys.executable, 'manage.py', 'runserver', '--noreload', '--skip-checks', '127.0.0.1:{port}'],
+        {'BENCHMARK_SERVING': 'legacy'},
+    ),
+    'daphne': (
+        # daphne 2 has no __main__ module, so call its console entry point directly
+        [sys.executable, '-c', 'from daphne.cli import CommandLineInterface; CommandLineInterface.entrypoint()',
+         '-b', '127.0.0.1', '-p', '{port}', 'backend.asgi:application'],
+        {},
+    ),
+}
+
+
+def seed():
+    call_command('migrate', verbosity=0)
+    slots = []
+    for day in range(DAYS):
+        for hour in range(9, 17):
+            start = timezone.make_aware(datetime.datetime.combine(
+                FIRST_DAY + datetime.timedelta(days=day), datetime.time(hour)))
+            booked = hour % 3 == 0
+            slots.append(Slot(start_time=start, end_time=start + datetime.timedelta(hours=1),
+                              is_booked=booked, booked_count=int(booked)))
+    Slot.objects.bulk_create(slots)
+    Booking.objects.bulk_create([
+        Booking(booking_id=f'BK-LOAD-{slot.pk:06d}', booker_first_name='Load', booker_last_name='Test',
+                booker_email='load@example.com', booker_phone='+12125552368', slot=slot)
+        for slot in Slot.objects.filter(is_booked=True)
+    ])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(name):
+    command, env = SERVERS[name]
+    port = free_port()
+    process = subprocess.Popen(
+        [part.format(port=port) for part in command],
+        env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process, port
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f'{name} did not start listening on port {port}')
+
+
+def run_load(port, workload, concurrency, duration):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        samples = []
+        while time.monotonic() < deadline:
+            body = json.dumps(WORKLOADS[workload](rng))
+            started = time.perf_counter()
+            try:
+                connection.request('POST', '/graphql/', body, {'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    raise RuntimeError(f'HTTP {response.status}')
+            except Exception as exc:
+                with lock:
+                    errors.append(exc)
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            samples.append((time.perf_counter() - started) * 1000)
+        connection.close()
+        with lock:
+            latencies.extend(samples)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) if latencies else float('nan'),
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else float('nan'),
+        'errors': len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument('--workloads', nargs='+', choices=list(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args()
+
+    seed()
+    print(f"{'server':<10} {'workload':<15} {'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    try:
+        for name in args.servers:
+            process, port = start_server(name)
+            try:
+                for workload in args.workloads:
+                    # Warm the document and availability caches before measuring
+                    run_load(port, workload, 1, 0.5)
+                    for concurrency in args.concurrency:
+                        result = run_load(port, workload, concurrency, args.duration)
+                        print(f"{name:<10} {workload:<15} {concurrency:>7} {result['rps']:>8.0f} "
+                              f"{result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['errors']:>6}")
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+    finally:
+        os.remove(DATABASE)
+        os.rmdir(os.path.dirname(DATABASE))
+
+
+if __name__ == '__main__':
+    main()
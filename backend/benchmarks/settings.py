@@ -0,0 +1,35 @@
+"""
+Settings for servers and processes started by the load and contention benchmarks.
+
+The database follows DATABASE_PROFILE; with SQLite it is the throwaway file
+named by BENCHMARK_DATABASE, and BENCHMARK_SQLITE_UNTUNED=1 drops the
+pragmas and persistent connections. BENCHMARK_SERVING=legacy swaps in the
+serving setup from before /graphql/ moved to the ASGI router (see
+benchmarks.legacy).
+"""
+import os
+
+from backend.settings import *  # noqa: F401,F403
+
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':  # noqa: F405
+    DATABASES['default']['NAME'] = os.environ['BENCHMARK_DATABASE']  # noqa: F405
+    # Used as is by common.benchmark_database() instead of an in-memory database
+    DATABASES['default']['TEST'] = {'NAME': os.environ['BENCHMARK_DATABASE']}  # noqa: F405
+    # The throwaway file runs in WAL mode, as the deployed database does
+    SQLITE_PRAGMAS = {'journal_mode': 'WAL', **SQLITE_PRAGMAS}  # noqa: F405
+
+if os.environ.get('BENCHMARK_SQLITE_UNTUNED'):
+    # SQLite as configured before the database profiles: no pragmas, a connection per request
+    SQLITE_PRAGMAS = {}
+    DATABASES['default']['CONN_MAX_AGE'] = 0  # noqa: F405
+
+CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+# No outbox dispatcher runs next to the benchmark servers
+SUBSCRIPTION_OUTBOX = {**SUBSCRIPTION_OUTBOX, 'ENABLED': False}  # noqa: F405
+
+if os.environ.get('BENCHMARK_SERVING') == 'legacy':
+    ROOT_URLCONF = 'benchmarks.legacy'
+    ASGI_APPLICATION = 'benchmarks.legacy.application'
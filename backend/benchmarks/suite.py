@@ -0,0 +1,396 @@
+"""
+Booking API benchmark suite with machine-readable results.
+
+Seeds months of slots with bookings at each requested fill rate into a
+throwaway SQLite file, then drives /graphql/ in-process through the Django
+test client, so requests pass the real view, middleware, caches and
+database settings:
+
+  availableSlots           one day's open slots, availability cache on
+  availableSlots-uncached  the same with the availability cache cleared first
+  month-availableSlots     a 30-day calendar built from availableSlots, cache cleared first
+  availabilityCalendar     the same month's per-day counts from availabilityCalendar
+  allBookings              every booking with its nested slot
+  bookings-page            first page of the keyset-paginated bookings
+  createBooking-hot        concurrent clients racing for a few hot slots
+  fanout                   one createBooking delivered to N subscribers
+
+Each scenario reports throughput, p50/p95/p99 latency, SQL queries per
+operation and errors. Results are written as JSON, and --compare prints the
+change between two result files.
+
+    python -m benchmarks.suite [--days 90] [--fill 0.3 0.8] [--output results.json]
+    python -m benchmarks.suite --compare before.json after.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+if __name__ == '__main__' and '--compare' not in sys.argv:
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    os.environ.setdefault('BENCHMARK_DATABASE',
+                          os.path.join(tempfile.mkdtemp(prefix='booking-suite-'), 'db.sqlite3'))
+
+SCENARIOS = ['availableSlots', 'availableSlots-uncached', 'month-availableSlots', 'availabilityCalendar',
+             'allBookings', 'bookings-page', 'createBooking-hot', 'fanout']
+
+FIRST_DAY = datetime.date(2024, 3, 1)
+OPENING_HOURS = range(9, 17)
+SLOT_MINUTES = 30
+
+QUERIES = {
+    'availableSlots': 'query AvailableSlots($date: String!) { availableSlots(date: $date) { id startTime endTime } }',
+    'availabilityCalendar': '''
+        query AvailabilityCalendar($from: Date!, $to: Date!) {
+            availabilityCalendar(from: $from, to: $to) { days { date totalSlots openSlots } }
+        }
+    ''',
+    'allBookings': 'query AllBookings { allBookings { bookingId status slot { startTime endTime } } }',
+    'bookings-page': '''
+        query BookingsPage($from: Date!) {
+            bookings(first: 50, dateFrom: $from) { edges { node { bookingId status slot { startTime } } } }
+        }
+    ''',
+    'createBooking': '''
+        mutation CreateBooking($slotId: ID!, $firstName: String!) {
+            createBooking(bookerFirstName: $firstName, bookerLastName: "Bench", bookerEmail: "bench@example.com",
+                          bookerPhone: "+12125552368", slotId: $slotId, status: "confirmed") {
+                booking { bookingId }
+            }
+        }
+    ''',
+    'fanout': 'subscription { bookingCreated(date: "%s") { bookingId status } }',
+}
+
+
+def seed(days, fill, rng):
+    """Slots every SLOT_MINUTES through opening hours, a fill fraction of them booked."""
+    from django.utils import timezone
+
+    from app.daily_availability import rebuild_day_counts
+    from app.models import Booking, Slot
+
+    length = datetime.timedelta(minutes=SLOT_MINUTES)
+    slots = []
+    for day in range(days):
+        date = FIRST_DAY + datetime.timedelta(days=day)
+        start = timezone.make_aware(datetime.datetime.combine(date, datetime.time(OPENING_HOURS[0])))
+        for i in range(len(OPENING_HOURS) * 60 // SLOT_MINUTES):
+            booked = rng.random() < fill
+            slots.append(Slot(start_time=start + i * length, end_time=start + (i + 1) * length,
+                              is_booked=booked, booked_count=int(booked)))
+    Slot.objects.bulk_create(slots, batch_size=1000)
+
+    bookings = []
+    for slot in Slot.objects.only('pk', 'is_booked'):
+        # Booked slots hold a confirmed booking; some open ones keep a cancelled one from earlier
+        if slot.is_booked or rng.random() < 0.1:
+            booking = Booking(slot=slot, status='confirmed' if slot.is_booked else 'cancelled',
+                              booker_first_name='Seed', booker_last_name='User',
+                              booker_email='seed@example.com', booker_phone='+12125552368')
+            booking.booking_id = booking.generate_booking_id()
+            bookings.append(booking)
+    Booking.objects.bulk_create(bookings, batch_size=1000)
+    # bulk_create skips the signals that keep the daily counts
+    rebuild_day_counts()
+    return len(slots), len(bookings)
+
+
+def graphql(client, query, variables=None):
+    response = client.post('/graphql/', json.dumps({'query': query, 'variables': variables or {}}),
+                           content_type='application/json')
+    return response.status_code == 200 and not response.json().get('errors')
+
+
+def summarize(samples, elapsed, queries, errors, **extra):
+    from . import common
+
+    return {
+        'operations': len(samples),
+        'throughput_per_s': len(samples) / elapsed if elapsed else None,
+        **common.percentiles(samples),
+        'queries_per_op': sum(queries) / len(queries) if queries else None,
+        'errors': errors,
+        **extra,
+    }
+
+
+def run_serial(request, repeat, warmup=5):
+    """Time request() one call at a time, counting the SQL each call sends."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    for _ in range(warmup):
+        request()
+    samples, queries, errors = [], [], 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            call_started = time.perf_counter()
+            ok = request()
+            samples.append((time.perf_counter() - call_started) * 1000)
+        queries.append(len(captured))
+        errors += not ok
+    return summarize(samples, time.perf_counter() - started, queries, errors)
+
+
+def run_hot_slots(days, clients, rounds, hot_slots):
+    """Each round, every client tries to book one of a few fresh slots at the same moment."""
+    from django.db import close_old_connections, connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from django.utils import timezone
+
+    from app.models import Slot
+
+    samples, queries, lock = [], [], threading.Lock()
+    outcomes = {'booked': 0, 'rejected': 0, 'errors': 0}
+    start = threading.Barrier(clients)
+    targets = []
+
+    def client_thread(index):
+        client, rng = Client(), random.Random(index)
+        for slot_ids in targets:
+            start.wait()
+            close_old_connections()
+            with CaptureQueriesContext(connection) as captured:
+                call_started = time.perf_counter()
+                response = client.post('/graphql/', json.dumps({
+                    'query': QUERIES['createBooking'],
+                    'variables': {'slotId': rng.choice(slot_ids), 'firstName': f'Client{index}'},
+                }), content_type='application/json')
+                elapsed = (time.perf_counter() - call_started) * 1000
+            errors = response.json().get('errors') if response.status_code == 200 else [{'message': 'HTTP error'}]
+            outcome = ('booked' if not errors
+                       else 'rejected' if 'already booked' in errors[0]['message'] else 'errors')
+            with lock:
+                samples.append(elapsed)
+                queries.append(len(captured))
+                outcomes[outcome] += 1
+        close_old_connections()
+        connection.close()
+
+    # Fresh slots after the seeded range, so every round starts with open hot slots
+    first = timezone.make_aware(datetime.datetime.combine(
+        FIRST_DAY + datetime.timedelta(days=days + 1), datetime.time(OPENING_HOURS[0])))
+    length = datetime.timedelta(minutes=SLOT_MINUTES)
+    for round_index in range(rounds):
+        slots = [Slot(start_time=first + (round_index * hot_slots + i) * length,
+                      end_time=first + (round_index * hot_slots + i + 1) * length) for i in range(hot_slots)]
+        targets.append([slot.pk for slot in Slot.objects.bulk_create(slots)])
+
+    threads = [threading.Thread(target=client_thread, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(samples, time.perf_counter() - started, queries, outcomes['errors'],
+                     clients=clients, hot_slots=hot_slots, booked=outcomes['booked'],
+                     rejected=outcomes['rejected'])
+
+
+async def run_fanout(subscribers, events):
+    """Time from a createBooking call until every subscriber to its date has the event."""
+    from asgiref.sync import sync_to_async
+    from channels.testing import WebsocketCommunicator
+    from django.db import close_old_connections, connection
+    from django.test.utils import CaptureQueriesContext
+
+    from app.consumers import TopicSubscriptionConsumer
+    from app.dates import local_day_range
+    from app.models import Slot
+    from app.services import reserve_slot
+
+    date = FIRST_DAY + datetime.timedelta(days=1)
+    communicators = []
+    for _ in range(subscribers):
+        communicator = WebsocketCommunicator(TopicSubscriptionConsumer, '/graphql/')
+        connected, _ = await communicator.connect()
+        assert connected
+        await communicator.send_json_to({'id': '1', 'type': 'start',
+                                         'payload': {'query': QUERIES['fanout'] % date.isoformat()}})
+        communicators.append(communicator)
+    # Let every consumer join its topic group
+    await asyncio.sleep(0.5)
+
+    def book(slot_id):
+        close_old_connections()
+        with CaptureQueriesContext(connection) as captured:
+            reserve_slot(slot_id, booker_first_name='Fan', booker_last_name='Out',
+                         booker_email='fanout@example.com', booker_phone='+12125552368')
+        return len(captured)
+
+    day_start, day_end = local_day_range(date)
+    open_slots = await sync_to_async(lambda: list(Slot.objects.filter(
+        is_booked=False, start_time__gte=day_start, start_time__lt=day_end).values_list('pk', flat=True)[:events]))()
+    samples, queries, errors = [], [], 0
+    started = time.perf_counter()
+    for slot_id in open_slots:
+        event_started = time.perf_counter()
+        queries.append(await sync_to_async(book, thread_sensitive=False)(slot_id))
+        for communicator in communicators:
+            try:
+                await communicator.receive_json_from(timeout=5)
+            except asyncio.TimeoutError:
+                errors += 1
+        samples.append((time.perf_counter() - event_started) * 1000)
+    elapsed = time.perf_counter() - started
+    for communicator in communicators:
+        await communicator.disconnect()
+    return summarize(samples, elapsed, queries, errors, subscribers=subscribers,
+                     deliveries_per_s=len(samples) * subscribers / elapsed if elapsed else None)
+
+
+def run_suite(args):
+    from . import common
+
+    common.setup()
+
+    from asgiref.sync import async_to_sync
+    from django.conf import settings
+    from django.db import connection
+    from django.test import Client
+
+    from app.cache import get_availability_cache
+
+    # Publish availability events straight away instead of from timer threads
+    settings.SLOT_AVAILABILITY_COALESCE_WINDOW = 0
+    # graphql-core logs a traceback for every rejected createBooking in the hot-slot race
+    logging.getLogger('graphql').setLevel(logging.CRITICAL)
+    report = {
+        'started': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        'cpus': os.cpu_count(),
+        'arguments': {key: value for key, value in vars(args).items() if key != 'compare'},
+        'runs': [],
+    }
+    for fill in args.fill:
+        rng = random.Random(args.seed)
+        with common.benchmark_database():
+            slots, bookings = seed(args.days, fill, rng)
+            print(f'fill={fill}: {slots} slots, {bookings} bookings', file=sys.stderr)
+            client = Client()
+            cache = get_availability_cache()
+
+            def random_date():
+                return (FIRST_DAY + datetime.timedelta(days=rng.randrange(args.days))).isoformat()
+
+            def uncached_available_slots():
+                cache.clear()
+                return graphql(client, QUERIES['availableSlots'], {'date': random_date()})
+
+            def random_month():
+                first = FIRST_DAY + datetime.timedelta(days=rng.randrange(max(1, args.days - 29)))
+                return [first + datetime.timedelta(days=day) for day in range(30)]
+
+            def month_from_available_slots():
+                cache.clear()
+                return all([graphql(client, QUERIES['availableSlots'], {'date': day.isoformat()})
+                            for day in random_month()])
+
+            def month_from_calendar():
+                month = random_month()
+                return graphql(client, QUERIES['availabilityCalendar'],
+                               {'from': month[0].isoformat(), 'to': month[-1].isoformat()})
+
+            scenarios = {
+                'availableSlots': lambda: run_serial(
+                    lambda: graphql(client, QUERIES['availableSlots'], {'date': random_date()}), args.repeat),
+                'availableSlots-uncached': lambda: run_serial(uncached_available_slots, args.repeat),
+                'month-availableSlots': lambda: run_serial(month_from_available_slots, max(5, args.repeat // 20),
+                                                           warmup=1),
+                'availabilityCalendar': lambda: run_serial(month_from_calendar, args.repeat),
+                'allBookings': lambda: run_serial(
+                    lambda: graphql(client, QUERIES['allBookings']), max(5, args.repeat // 20), warmup=1),
+                'bookings-page': lambda: run_serial(
+                    lambda: graphql(client, QUERIES['bookings-page'], {'from': random_date()}), args.repeat),
+                'createBooking-hot': lambda: run_hot_slots(args.days, args.clients, args.rounds, args.hot_slots),
+                'fanout': lambda: async_to_sync(run_fanout)(args.subscribers, args.events),
+            }
+            results = {}
+            for name in args.scenarios:
+                results[name] = scenarios[name]()
+                print(f'  {name:<24} {_format(results[name])}', file=sys.stderr)
+            report['runs'].append({'fill': fill, 'slots': slots, 'bookings': bookings, 'scenarios': results})
+    return report
+
+
+def compare(before_path, after_path):
+    with open(before_path) as before_file, open(after_path) as after_file:
+        before, after = json.load(before_file), json.load(after_file)
+    print(f"{'fill':<5} {'scenario':<24} {'metric':<17} {'before':>10} {'after':>10} {'change':>8}")
+    for old_run, new_run in zip(before['runs'], after['runs']):
+        for name, new in new_run['scenarios'].items():
+            old = old_run['scenarios'].get(name)
+            if old is None:
+                continue
+            for metric in ('throughput_per_s', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_per_op'):
+                if old.get(metric) is None or new.get(metric) is None:
+                    continue
+                change = f"{(new[metric] - old[metric]) / old[metric] * 100:+.1f}%" if old[metric] else ''
+                print(f"{new_run['fill']:<5} {name:<24} {metric:<17} {old[metric]:>10.2f} {new[metric]:>10.2f} "
+                      f"{change:>8}")
+
+
+def _format(result):
+    return (f"{result['throughput_per_s']:.1f} ops/s p50={result['p50_ms']:.2f} p95={result['p95_ms']:.2f} "
+            f"p99={result['p99_ms']:.2f} ms queries/op={result['queries_per_op']:.1f} errors={result['errors']}")
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=90, help='days of slots to seed')
+    parser.add_argument('--fill', type=float, nargs='+', default=[0.3, 0.8], help='fractions of slots booked')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--repeat', type=int, default=200, help='requests per serial scenario')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients in createBooking-hot')
+    parser.add_argument('--rounds', type=int, default=20, help='races per client in createBooking-hot')
+    parser.add_argument('--hot-slots', type=int, default=2, help='slots the clients race for in each round')
+    parser.add_argument('--subscribers', type=int, default=200, help='subscribers in fanout')
+    parser.add_argument('--events', type=int, default=10, help='bookings published in fanout')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    try:
+        report = run_suite(args)
+    finally:
+        database = os.environ['BENCHMARK_DATABASE']
+        if os.path.basename(os.path.dirname(database)).startswith('booking-suite-'):
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(database + suffix):
+                    os.remove(database + suffix)
+            os.rmdir(os.path.dirname(database))
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    print(f'wrote {args.output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()